@@ -0,0 +1,5 @@
+from .benchmark import SliceBenchmark
+from .main import main
+from .synthetic import SyntheticBagConfig, generate_synthetic_bag
+
+__all__ = ["main", "SliceBenchmark", "SyntheticBagConfig", "generate_synthetic_bag"]
@@ -0,0 +1,412 @@
+import datetime
+import json
+import os
+import shutil
+
+from ..common.data_config import DataConfig
+from ..common.pcd_codec import DEFAULT_ZSTD_LEVEL, PCD_COMPRESSION_LIST
+from ..export.sus import ExportToSUS
+from ..load.sus import LoadFromSUS
+from ..merge.merge_cml import Merge
+from ..nuscenes.nuscenes_info import NuscenesInfo
+from ..nuscenes.profiler import StageProfiler
+from .codec import (
+    CODEC_METRIC_DICT,
+    CodecBenchmark,
+    build_codec_list,
+    load_fusion_point_cloud_list,
+)
+from .synthetic import (
+    SyntheticBagConfig,
+    generate_synthetic_bag,
+    generate_synthetic_sus_labels,
+)
+
+# 基准测试的各个阶段, 按照实际的数据处理流程排列: 切片 -> 导出标注 -> 导入标注 -> 合并,
+# codec 对比切片输出(或 codec_source 中)的融合点云在不同 pcd 压缩方式下的读写速度和大小
+BENCHMARK_STAGE_LIST = ["slice", "export", "load", "merge", "codec"]
+
+# 合成场景的名称, 需要满足 scene_id_car_id 的命名规则
+BENCHMARK_SCENE_NAME = "0001-0_BENCH01-N1-0001"
+
+# 与基线对比时参与比较的指标, True 表示越大越好
+BENCHMARK_METRIC_DICT = {
+    "frames_per_second": True,
+    "output_mb_per_second": True,
+    "peak_rss_bytes": False,
+    "output_bytes": False,
+}
+
+
+def get_path_size(path):
+    """文件或文件夹的总大小(bytes), 不存在时为 0"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total_size = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            total_size += os.path.getsize(os.path.join(dirpath, filename))
+    return total_size
+
+
+class SliceBenchmark:
+    """基于合成 bag 的端到端基准测试
+
+    1. 根据 SyntheticBagConfig 生成合成的 bag
+    2. 依次运行 slice, export, load, merge 各个阶段, 每个阶段在当前进程中串行执行,
+        保证峰值内存统计的是该阶段本身
+    3. 记录每个阶段的耗时, 吞吐量(frames/s, MB/s), 峰值内存以及输出大小, 保存为 json 基线
+
+    不依赖实车数据和网络, 可以在 CI 环境中运行, 用于发现 fusion_lidar_points, save_camera
+    等热点路径的性能回退
+
+    Args:
+        config (DataConfig): 切片配置
+        bag_config (SyntheticBagConfig): 合成 bag 的参数
+        work_path (str): 工作目录, 保存合成的 bag 以及各个阶段的输出
+        stage_list (list): 需要运行的阶段, 默认运行所有阶段, 后面的阶段依赖前面阶段的输出
+        label_object_num (int): load 阶段每一帧合成的标注目标数量
+        codec_source (str): codec 阶段读取融合点云的场景目录, 默认为 slice 阶段的输出,
+            使用实车切片的场景可以得到真实点云上的压缩率
+        codec_list (list): codec 阶段对比的编码, build_codec_list 的返回值, 默认对比所有压缩方式
+        codec_worker_num (int): codec 阶段的线程数
+        codec_frame_num (int): codec 阶段最多使用的帧数, 0 表示全部
+    """
+
+    def __init__(
+        self,
+        config: DataConfig,
+        bag_config: SyntheticBagConfig,
+        work_path: str,
+        stage_list: list = None,
+        label_object_num: int = 20,
+        codec_source: str = None,
+        codec_list: list = None,
+        codec_worker_num: int = 4,
+        codec_frame_num: int = 0,
+    ):
+        self.config = config
+        self.bag_config = bag_config
+        self.work_path = os.path.abspath(work_path)
+        self.stage_list = list(stage_list) if stage_list else list(BENCHMARK_STAGE_LIST)
+        self.label_object_num = label_object_num
+        self.codec_source = os.path.abspath(codec_source) if codec_source else None
+        self.codec_list = codec_list
+        self.codec_worker_num = codec_worker_num
+        self.codec_frame_num = codec_frame_num
+
+        for stage in self.stage_list:
+            if stage not in BENCHMARK_STAGE_LIST:
+                raise ValueError(
+                    f"stage should be one of {BENCHMARK_STAGE_LIST}, but got {stage}"
+                )
+        # 按照流程顺序执行, 与传入的顺序无关
+        self.stage_list = [
+            stage for stage in BENCHMARK_STAGE_LIST if stage in self.stage_list
+        ]
+        if self.stage_list == ["codec"] and self.codec_source is None:
+            raise ValueError("codec stage needs the slice stage or a codec_source")
+
+        self.bag_path = os.path.join(self.work_path, "synthetic.bag")
+        self.scene_path = os.path.join(self.work_path, "scenes", BENCHMARK_SCENE_NAME)
+        self.sus_path = os.path.join(self.work_path, "scenes", "sus")
+        self.nuscenes_path = os.path.join(self.work_path, "nuscenes")
+
+        self.frame_num = 0
+        self.key_frame_num = 0
+
+    def run(self):
+        """运行基准测试
+
+        Returns:
+            dict: 基准测试报告
+        """
+        # 每次运行都从空的工作目录开始, 避免上次的输出影响结果
+        if os.path.exists(self.work_path):
+            shutil.rmtree(self.work_path)
+        os.makedirs(self.work_path)
+
+        # 只对已有场景做 codec 测试时不需要合成 bag
+        bag_info = {}
+        if self.stage_list != ["codec"]:
+            print(f"generate synthetic bag : {self.bag_path}")
+            bag_info = generate_synthetic_bag(self.bag_path, self.bag_config, self.config)
+            print(f"    {bag_info['bag_size'] / 1024 / 1024:.1f} MB")
+
+        stage_report_dict = {}
+        for stage in self.stage_list:
+            print(f"benchmark stage : {stage}")
+            stage_report_dict[stage] = getattr(self, f"run_{stage}")()
+
+        return {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "bag_config": self.bag_config.to_dict(),
+            "slice_config": {
+                "sample_interval": self.config.sample_interval,
+                "save_sweep_data_flag": self.config.save_sweep_data_flag,
+                "writer_worker_num": self.config.writer_worker_num,
+                "writer_queue_size": self.config.writer_queue_size,
+                "camera_passthrough_flag": self.config.camera_passthrough_flag,
+                "lidar_file_format": self.config.lidar_file_format,
+                "pcd_compression": self.config.pcd_compression,
+                "pcd_zstd_level": self.config.pcd_zstd_level,
+                "car_brand": self.config.car_brand,
+                "lidar_range": self.config.lidar_range,
+                "lidar_voxel": self.config.get_voxel_info(),
+            },
+            "bag": bag_info,
+            "stages": stage_report_dict,
+        }
+
+    @staticmethod
+    def build_stage_report(
+        stage_profiler, stage, frame_num, input_bytes, output_bytes, extra=None
+    ):
+        """根据阶段的统计结果计算吞吐量"""
+        stat = stage_profiler.stage_dict[stage]
+        wall_seconds = stat["wall_seconds"]
+        report = {
+            "frame_num": frame_num,
+            "wall_seconds": wall_seconds,
+            "cpu_seconds": stat["cpu_seconds"],
+            "frames_per_second": frame_num / wall_seconds if wall_seconds > 0 else 0.0,
+            "input_bytes": input_bytes,
+            "input_mb_per_second": input_bytes / 1024 / 1024 / wall_seconds
+            if wall_seconds > 0
+            else 0.0,
+            "output_bytes": output_bytes,
+            "output_mb_per_second": output_bytes / 1024 / 1024 / wall_seconds
+            if wall_seconds > 0
+            else 0.0,
+            "peak_rss_bytes": stage_profiler.get_peak_rss(),
+        }
+        if extra:
+            report.update(extra)
+        return report
+
+    def run_slice(self):
+        # 开启统计, 从切片的报告中获取各个子阶段的耗时以及写入线程的吞吐量
+        self.config.profile_flag = True
+        stage_profiler = StageProfiler(enabled=True)
+        with stage_profiler.stage("slice"):
+            nuscenes_info = NuscenesInfo(
+                data_config=self.config,
+                scene_name=BENCHMARK_SCENE_NAME,
+                scene_bag_file=self.bag_path,
+                nuscenes_folder_path=self.scene_path,
+                map_name="suzhou",
+                date_captured=datetime.date.today().isoformat(),
+                description="synthetic benchmark scene",
+            )
+            slice_report_list = nuscenes_info.slice()
+        if not slice_report_list:
+            raise RuntimeError(f"slice {self.bag_path} failed, no scene generated")
+
+        slice_report = slice_report_list[0]
+        self.frame_num = slice_report["info"].get("frame_num", 0)
+        with open(os.path.join(self.scene_path, "v1.0-all", "sample.json"), "r") as f:
+            self.key_frame_num = len(json.load(f))
+
+        return self.build_stage_report(
+            stage_profiler,
+            "slice",
+            frame_num=self.frame_num,
+            input_bytes=get_path_size(self.bag_path),
+            output_bytes=get_path_size(self.scene_path),
+            extra={
+                "key_frame_num": self.key_frame_num,
+                "sub_stages": slice_report["stages"],
+                "throughput": slice_report["info"].get("throughput", {}),
+            },
+        )
+
+    def run_export(self):
+        stage_profiler = StageProfiler(enabled=True)
+        with stage_profiler.stage("export"):
+            ExportToSUS(self.scene_path, self.sus_path).export()
+
+        return self.build_stage_report(
+            stage_profiler,
+            "export",
+            frame_num=self.key_frame_num,
+            input_bytes=get_path_size(self.scene_path),
+            output_bytes=get_path_size(self.sus_path),
+        )
+
+    def run_load(self):
+        # 合成的标注不计入该阶段的耗时
+        label_num = generate_synthetic_sus_labels(
+            self.sus_path, self.label_object_num, self.bag_config.seed
+        )
+        label_path = os.path.join(self.sus_path, "label")
+        output_file_list = [
+            os.path.join(self.scene_path, "v1.0-all", filename)
+            for filename in ["instance.json", "sample_annotation.json"]
+        ]
+
+        stage_profiler = StageProfiler(enabled=True)
+        with stage_profiler.stage("load"):
+            LoadFromSUS(self.sus_path, self.scene_path).load()
+
+        return self.build_stage_report(
+            stage_profiler,
+            "load",
+            frame_num=label_num,
+            input_bytes=get_path_size(label_path),
+            output_bytes=sum(get_path_size(path) for path in output_file_list),
+        )
+
+    def run_merge(self):
+        # 合并的目标需要是一个 nuscenes 的目录结构
+        for folder in ["maps", "samples", "sweeps", "v1.0-trainval", "v1.0-test"]:
+            os.makedirs(os.path.join(self.nuscenes_path, folder), exist_ok=True)
+
+        # 单进程合并, 保证峰值内存统计的是合并本身
+        merge = Merge(
+            source_scene_path_list=[self.scene_path],
+            target_nuscenes_path=self.nuscenes_path,
+            target_type="v1.0-trainval",
+            main_channel=self.config.main_channel,
+            max_workers=1,
+            json_indent=self.config.json_indent,
+            json_backend=self.config.json_backend,
+        )
+        stage_profiler = StageProfiler(enabled=True)
+        with stage_profiler.stage("merge"):
+            merge.merge()
+
+        return self.build_stage_report(
+            stage_profiler,
+            "merge",
+            frame_num=self.frame_num,
+            input_bytes=get_path_size(self.scene_path),
+            output_bytes=get_path_size(self.nuscenes_path),
+        )
+
+    def run_codec(self):
+        scene_path = self.codec_source or self.scene_path
+        point_cloud_list = load_fusion_point_cloud_list(
+            scene_path,
+            channel=self.config.main_channel,
+            dims=self.config.save_pcd_dims,
+            max_frame_num=self.codec_frame_num,
+        )
+        codec_list = self.codec_list or build_codec_list(PCD_COMPRESSION_LIST, [DEFAULT_ZSTD_LEVEL])
+        codec_benchmark = CodecBenchmark(
+            point_cloud_list,
+            codec_list,
+            output_path=os.path.join(self.work_path, "codec"),
+            worker_num=self.codec_worker_num,
+        )
+
+        stage_profiler = StageProfiler(enabled=True)
+        with stage_profiler.stage("codec"):
+            codec_report_dict = codec_benchmark.run()
+
+        return self.build_stage_report(
+            stage_profiler,
+            "codec",
+            frame_num=len(point_cloud_list) * len(codec_list),
+            input_bytes=codec_benchmark.raw_bytes * len(codec_list),
+            output_bytes=sum(report["output_bytes"] for report in codec_report_dict.values()),
+            extra={"source": scene_path, "codecs": codec_report_dict},
+        )
+
+    @staticmethod
+    def save_report(report, file_path):
+        dir_path = os.path.dirname(file_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        with open(file_path, "w") as f:
+            json.dump(report, f, indent=4)
+
+    @staticmethod
+    def compare_with_baseline(report, baseline, tolerance=0.2):
+        """与基线对比, 找出性能回退的指标
+
+        Args:
+            report (dict): 本次的基准测试报告
+            baseline (dict): 基线报告
+            tolerance (float): 允许的相对变化, 例如 0.2 表示吞吐量下降或内存增长超过 20% 才算回退
+
+        Returns:
+            list: 回退的描述列表, 为空表示没有回退
+        """
+        if report["bag_config"] != baseline["bag_config"]:
+            raise ValueError(
+                "bag config of the report is different from the baseline, can not compare"
+            )
+
+        regression_list = []
+        for stage, stage_report in report["stages"].items():
+            if stage not in baseline["stages"]:
+                continue
+            baseline_stage_report = baseline["stages"][stage]
+            regression_list.extend(
+                SliceBenchmark.compare_metrics(
+                    stage,
+                    stage_report,
+                    baseline_stage_report,
+                    BENCHMARK_METRIC_DICT,
+                    tolerance,
+                )
+            )
+            # codec 阶段按照每个 codec 分别对比
+            baseline_codec_dict = baseline_stage_report.get("codecs", {})
+            for codec_name, codec_report in stage_report.get("codecs", {}).items():
+                if codec_name not in baseline_codec_dict:
+                    continue
+                regression_list.extend(
+                    SliceBenchmark.compare_metrics(
+                        f"{stage}.{codec_name}",
+                        codec_report,
+                        baseline_codec_dict[codec_name],
+                        CODEC_METRIC_DICT,
+                        tolerance,
+                    )
+                )
+        return regression_list
+
+    @staticmethod
+    def compare_metrics(name, report, baseline_report, metric_dict, tolerance):
+        regression_list = []
+        for metric, higher_is_better in metric_dict.items():
+            value = report.get(metric)
+            baseline_value = baseline_report.get(metric)
+            if not value or not baseline_value:
+                continue
+            ratio = value / baseline_value
+            if higher_is_better and ratio < 1 - tolerance:
+                regression_list.append(
+                    f"{name}.{metric} : {value:.2f} < baseline {baseline_value:.2f} ({ratio:.2f}x)"
+                )
+            elif not higher_is_better and ratio > 1 + tolerance:
+                regression_list.append(
+                    f"{name}.{metric} : {value:.0f} > baseline {baseline_value:.0f} ({ratio:.2f}x)"
+                )
+        return regression_list
+
+    @staticmethod
+    def print_report(report):
+        print("benchmark result:")
+        for stage, stage_report in report["stages"].items():
+            peak_rss = stage_report["peak_rss_bytes"] or 0
+            print(
+                f"    {stage:<8} : {stage_report['wall_seconds']:>8.3f} s, "
+                f"{stage_report['frames_per_second']:>8.2f} frames/s, "
+                f"{stage_report['output_mb_per_second']:>8.2f} MB/s, "
+                f"peak rss {peak_rss / 1024 / 1024:>8.1f} MB, "
+                f"output {stage_report['output_bytes'] / 1024 / 1024:>8.1f} MB"
+            )
+            for name, stat in stage_report.get("throughput", {}).items():
+                seconds = stat["seconds"]
+                throughput = stat["count"] / seconds if seconds > 0 else 0.0
+                print(f"        {name:<12} : {throughput:>8.2f} items/s")
+            for codec_name, codec_report in stage_report.get("codecs", {}).items():
+                print(
+                    f"        {codec_name:<17} : "
+                    f"write {codec_report['write_mb_per_second']:>8.2f} MB/s, "
+                    f"read {codec_report['read_mb_per_second']:>8.2f} MB/s, "
+                    f"ratio {codec_report['compression_ratio']:>5.2f}, "
+                    f"output {codec_report['output_bytes'] / 1024 / 1024:>8.1f} MB"
+                )
@@ -0,0 +1,172 @@
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ..common.pcd_codec import PCD_COMPRESSION_LIST, load_pcd, save_pcd
+from ..nuscenes.packed import PackedPointCloudReader, get_packed_scene_name_list
+from ..nuscenes.utils import FUSION_POINT_DTYPE, point_cloud_from_structured_array
+
+# 与基线对比时参与比较的编码指标, True 表示越大越好
+CODEC_METRIC_DICT = {
+    "write_mb_per_second": True,
+    "read_mb_per_second": True,
+    "output_bytes": False,
+}
+
+
+def get_codec_name(compression, zstd_level):
+    return f"zstd-{zstd_level}" if compression == "zstd" else compression
+
+
+def build_codec_list(compression_list, zstd_level_list):
+    """展开压缩方式和 zstd 压缩级别, 没有安装 zstandard 时跳过 zstd
+
+    Returns:
+        list: 每个元素为 (codec_name, compression, zstd_level)
+    """
+    codec_list = []
+    for compression in compression_list:
+        if compression not in PCD_COMPRESSION_LIST:
+            raise ValueError(
+                f"pcd compression should be one of {PCD_COMPRESSION_LIST}, but got {compression}"
+            )
+        if compression != "zstd":
+            codec_list.append((compression, compression, None))
+            continue
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            print("zstandard is not installed, skip zstd codec")
+            continue
+        for zstd_level in zstd_level_list:
+            codec_list.append((get_codec_name(compression, zstd_level), compression, zstd_level))
+    return codec_list
+
+
+def load_fusion_point_cloud_list(scene_path, channel="lidar-fusion", dims=4, max_frame_num=0):
+    """读取场景中融合后的点云, 用作编码基准测试的输入
+
+    支持切片时的所有保存格式: .pcd (任意压缩方式), .pcd.zst, .pcd.bin 以及打包的点云,
+    .bin 格式的点云只保留前 4 维 (x, y, z, intensity)
+
+    Args:
+        scene_path (str): 场景根目录
+        channel (str): 点云的 channel
+        dims (int): .bin 文件每个点的维度, 打包的点云从索引中读取
+        max_frame_num (int): 最多读取的帧数, 0 表示全部读取
+
+    Returns:
+        list: pypcd.PointCloud 列表, 按时间顺序排列
+    """
+    array_list = []
+    for scene_name in get_packed_scene_name_list(scene_path, channel):
+        reader = PackedPointCloudReader(scene_path, scene_name, channel)
+        for token in reader.get_token_list():
+            array_list.append(np.asarray(reader.get(token)))
+
+    file_path_list = []
+    for folder in ["samples", "sweeps"]:
+        channel_path = os.path.join(scene_path, folder, channel)
+        if os.path.exists(channel_path):
+            file_path_list.extend(
+                os.path.join(channel_path, filename) for filename in os.listdir(channel_path)
+            )
+    # 文件名以时间戳结尾, 按文件名排序即为时间顺序
+    for file_path in sorted(file_path_list, key=os.path.basename):
+        if file_path.endswith(".bin"):
+            array_list.append(np.fromfile(file_path, dtype=np.float32).reshape(-1, dims))
+        else:
+            array_list.append(load_pcd(file_path).pc_data)
+
+    if max_frame_num > 0:
+        array_list = array_list[:max_frame_num]
+
+    point_cloud_list = []
+    for array in array_list:
+        if array.dtype.names is None:
+            points = np.zeros(array.shape[0], dtype=FUSION_POINT_DTYPE)
+            for i, name in enumerate(FUSION_POINT_DTYPE.names[: array.shape[1]]):
+                points[name] = array[:, i]
+            array = points
+        point_cloud_list.append(point_cloud_from_structured_array(array))
+    return point_cloud_list
+
+
+class CodecBenchmark:
+    """对比不同 pcd 压缩方式的写入速度, 读取速度以及文件大小
+
+    写入和读取都在线程池中进行, 与切片时写入线程的使用方式一致, 可以通过不同的 worker_num
+    对比各个 codec 随线程数的扩展情况(zstd 在压缩和解压时释放 GIL)
+
+    Args:
+        point_cloud_list (list): 输入的点云, 通常来自 load_fusion_point_cloud_list
+        codec_list (list): build_codec_list 的返回值
+        output_path (str): 编码结果的临时目录, 每个 codec 测试结束后删除
+        worker_num (int): 线程数
+    """
+
+    def __init__(self, point_cloud_list, codec_list, output_path, worker_num=4):
+        if not point_cloud_list:
+            raise ValueError("no point cloud to benchmark")
+        self.point_cloud_list = point_cloud_list
+        self.codec_list = codec_list
+        self.output_path = output_path
+        self.worker_num = max(worker_num, 1)
+        self.raw_bytes = sum(pc.pc_data.nbytes for pc in point_cloud_list)
+
+    def run(self):
+        """
+        Returns:
+            dict: 以 codec_name 为 key, value 为该 codec 的指标
+        """
+        return {
+            codec_name: self.run_codec(codec_name, compression, zstd_level)
+            for codec_name, compression, zstd_level in self.codec_list
+        }
+
+    def run_codec(self, codec_name, compression, zstd_level):
+        codec_path = os.path.join(self.output_path, codec_name)
+        if os.path.exists(codec_path):
+            shutil.rmtree(codec_path)
+        os.makedirs(codec_path)
+        file_path_list = [
+            os.path.join(codec_path, f"{i:06d}.pcd")
+            for i in range(len(self.point_cloud_list))
+        ]
+        save_args = (compression,) if zstd_level is None else (compression, zstd_level)
+        raw_mb = self.raw_bytes / 1024 / 1024
+        frame_num = len(self.point_cloud_list)
+
+        with ThreadPoolExecutor(max_workers=self.worker_num) as executor:
+            start = time.time()
+            output_bytes = sum(
+                executor.map(
+                    lambda job: save_pcd(job[0], job[1], *save_args),
+                    zip(self.point_cloud_list, file_path_list),
+                )
+            )
+            write_seconds = time.time() - start
+
+            start = time.time()
+            decoded_list = list(executor.map(load_pcd, file_path_list))
+            read_seconds = time.time() - start
+
+        for pc, decoded in zip(self.point_cloud_list, decoded_list):
+            if pc.pc_data.tobytes() != decoded.pc_data.tobytes():
+                raise RuntimeError(f"{codec_name} decoded point cloud is different from the input")
+        shutil.rmtree(codec_path)
+
+        return {
+            "frame_num": frame_num,
+            "raw_bytes": self.raw_bytes,
+            "output_bytes": output_bytes,
+            "compression_ratio": self.raw_bytes / output_bytes if output_bytes else 0.0,
+            "write_seconds": write_seconds,
+            "write_mb_per_second": raw_mb / write_seconds if write_seconds > 0 else 0.0,
+            "read_seconds": read_seconds,
+            "read_mb_per_second": raw_mb / read_seconds if read_seconds > 0 else 0.0,
+            "worker_num": self.worker_num,
+        }
@@ -0,0 +1,159 @@
+import json
+import os
+from argparse import ArgumentParser
+
+from ..common.data_config import LIDAR_FILE_FORMAT_LIST, DataConfig
+from ..common.pcd_codec import (
+    DEFAULT_PCD_COMPRESSION,
+    DEFAULT_ZSTD_LEVEL,
+    PCD_COMPRESSION_LIST,
+)
+from .benchmark import BENCHMARK_STAGE_LIST, SliceBenchmark
+from .codec import build_codec_list
+from .synthetic import SyntheticBagConfig
+
+
+def main(args, unknown):
+    # parse unknown args
+    # -w/--work_path : work folder for the synthetic bag and the outputs of each stage
+    # -o/--output : benchmark report path, default is ${work_path}/benchmark.json
+    # --baseline : compare with a baseline report, raise if any metric regresses
+    # --tolerance : relative tolerance when comparing with the baseline
+    # --stages : stages to run, subset of slice export load merge codec
+    # --samples_only : slice key frames only, same as slice --samples_only
+    # --lidar_file_format : same as slice --lidar_file_format
+    # --pcd_compression --pcd_zstd_level : same as slice, pcd codec of the slice stage
+    # --sweep_voxel_size --voxel_key_frame : same as slice, voxel downsampling of the slice stage
+    # codec stage args :
+    #   --codec_source : sliced scene whose fused clouds are benchmarked, default is the slice output
+    #   --codecs : pcd compressions to compare
+    #   --zstd_levels : zstd levels to compare
+    #   --codec_worker_num : codec threads
+    #   --codec_frame_num : max frames used, 0 means all
+    # synthetic bag args : --duration --lidar_num --lidar_point_num --camera_num
+    #   --camera_width --camera_height --pose_rate --jitter_ms --drop_rate --seed
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument("-w", "--work_path", type=str, required=True)
+    parser.add_argument("-o", "--output", type=str, default="")
+    parser.add_argument("--baseline", type=str, default="")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--stages",
+        type=str,
+        nargs="+",
+        default=BENCHMARK_STAGE_LIST,
+        choices=BENCHMARK_STAGE_LIST,
+    )
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--lidar_num", type=int, default=5)
+    parser.add_argument("--lidar_point_num", type=int, default=10000)
+    parser.add_argument("--camera_num", type=int, default=4)
+    parser.add_argument("--camera_width", type=int, default=1280)
+    parser.add_argument("--camera_height", type=int, default=720)
+    parser.add_argument("--pose_rate", type=float, default=50)
+    parser.add_argument("--jitter_ms", type=float, default=0)
+    parser.add_argument("--drop_rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample_interval", type=int, default=500)
+    parser.add_argument("--writer_worker_num", type=int, default=4)
+    parser.add_argument("--samples_only", action="store_true")
+    parser.add_argument(
+        "--lidar_file_format", type=str, default="pcd", choices=LIDAR_FILE_FORMAT_LIST
+    )
+    parser.add_argument(
+        "--pcd_compression",
+        type=str,
+        default=DEFAULT_PCD_COMPRESSION,
+        choices=PCD_COMPRESSION_LIST,
+    )
+    parser.add_argument("--pcd_zstd_level", type=int, default=DEFAULT_ZSTD_LEVEL)
+    parser.add_argument("--sweep_voxel_size", type=float, default=0)
+    parser.add_argument("--voxel_key_frame", action="store_true")
+    parser.add_argument("--codec_source", type=str, default="")
+    parser.add_argument(
+        "--codecs",
+        type=str,
+        nargs="+",
+        default=PCD_COMPRESSION_LIST,
+        choices=PCD_COMPRESSION_LIST,
+    )
+    parser.add_argument("--zstd_levels", type=int, nargs="+", default=[1, 3, 9])
+    parser.add_argument("--codec_worker_num", type=int, default=4)
+    parser.add_argument("--codec_frame_num", type=int, default=0)
+    args, unknown = parser.parse_known_args(unknown)
+
+    # sample_interval 与 slice 命令一致, 单位为 ms, 转换为 100ms 的倍数
+    if args.sample_interval < 100:
+        raise Exception("sample_interval should be greater than 100ms.")
+    if args.tolerance < 0:
+        raise Exception("tolerance should not be negative.")
+    if args.codec_source and not os.path.exists(args.codec_source):
+        raise Exception(f"{args.codec_source} not exists.")
+
+    baseline = None
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            raise Exception(f"{args.baseline} not exists.")
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+    config = DataConfig(
+        lidar_file_format=args.lidar_file_format,
+        pcd_compression=args.pcd_compression,
+        pcd_zstd_level=args.pcd_zstd_level,
+        sweep_voxel_size=args.sweep_voxel_size or None,
+        voxel_key_frame_flag=args.voxel_key_frame,
+        sample_interval=int(args.sample_interval / 100),
+        save_sweep_data_flag=not args.samples_only,
+        writer_worker_num=args.writer_worker_num,
+    )
+    bag_config = SyntheticBagConfig(
+        duration=args.duration,
+        lidar_num=args.lidar_num,
+        lidar_point_num=args.lidar_point_num,
+        camera_num=args.camera_num,
+        camera_width=args.camera_width,
+        camera_height=args.camera_height,
+        pose_rate=args.pose_rate,
+        jitter_ms=args.jitter_ms,
+        drop_rate=args.drop_rate,
+        seed=args.seed,
+    )
+
+    print("----------------------")
+    print("----  benchmark   ----")
+    print("----------------------")
+    benchmark = SliceBenchmark(
+        config=config,
+        bag_config=bag_config,
+        work_path=args.work_path,
+        stage_list=args.stages,
+        codec_source=args.codec_source or None,
+        codec_list=build_codec_list(args.codecs, args.zstd_levels),
+        codec_worker_num=args.codec_worker_num,
+        codec_frame_num=args.codec_frame_num,
+    )
+    report = benchmark.run()
+    SliceBenchmark.print_report(report)
+
+    # 报告保存在工作目录之外时, 工作目录可以在每次运行时被清空
+    output = args.output or os.path.join(args.work_path, "benchmark.json")
+    SliceBenchmark.save_report(report, output)
+    print(f"benchmark report saved to {output}")
+
+    if baseline is not None:
+        regression_list = SliceBenchmark.compare_with_baseline(
+            report, baseline, args.tolerance
+        )
+        if regression_list:
+            for regression in regression_list:
+                print(f"    regression : {regression}")
+            raise Exception(
+                f"{len(regression_list)} metrics regressed compared with {args.baseline}"
+            )
+        print(f"no regression compared with {args.baseline}")
+
+
+# roscenes benchmark -w /tmp/roscenes_benchmark -o ./benchmark.json
+# roscenes benchmark -w /tmp/roscenes_benchmark --baseline ./benchmark.json --stages slice
+# roscenes benchmark -w /tmp/roscenes_codec --stages codec --codec_source /data/scenes/0001-0_YC200B01-M1-0007
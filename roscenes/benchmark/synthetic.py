@@ -0,0 +1,420 @@
+import heapq
+import json
+import math
+import os
+
+import cv2
+import genpy
+import numpy as np
+import rosbag
+from geometry_msgs.msg import PoseStamped, TransformStamped
+from sensor_msgs.msg import CompressedImage, PointCloud2, PointField
+
+from ..common.data_config import DataConfig
+
+# 合成点云的数据格式, 与常见的 lidar 驱动输出一致: xyz + intensity + ring + 每个点的时间戳
+SYNTHETIC_POINT_DTYPE = np.dtype(
+    {
+        "names": ["x", "y", "z", "intensity", "ring", "timestamp"],
+        "formats": [
+            np.float32,
+            np.float32,
+            np.float32,
+            np.float32,
+            np.uint16,
+            np.float64,
+        ],
+        "offsets": [0, 4, 8, 12, 16, 24],
+        "itemsize": 32,
+    }
+)
+
+SYNTHETIC_POINT_FIELD_LIST = [
+    PointField(name="x", offset=0, datatype=PointField.FLOAT32, count=1),
+    PointField(name="y", offset=4, datatype=PointField.FLOAT32, count=1),
+    PointField(name="z", offset=8, datatype=PointField.FLOAT32, count=1),
+    PointField(name="intensity", offset=12, datatype=PointField.FLOAT32, count=1),
+    PointField(name="ring", offset=16, datatype=PointField.UINT16, count=1),
+    PointField(name="timestamp", offset=24, datatype=PointField.FLOAT64, count=1),
+]
+
+# 合成标注使用的目标类型, 均可以映射到 nuscenes 的 category
+SYNTHETIC_OBJ_TYPE_LIST = ["car", "truck", "bus", "pedestrian"]
+
+
+class SyntheticBagConfig:
+    """合成 bag 的参数
+
+    topic 名称取自 DataConfig, 保证切片时可以直接识别
+
+    Args:
+        duration (float): bag 时长(s)
+        lidar_num (int): lidar 数量, 主 lidar (DataConfig.main_topic) 总是包含在内
+        lidar_point_num (int): 每个 lidar 每一帧的点数
+        lidar_rate (float): lidar 频率(Hz)
+        camera_num (int): camera 数量
+        camera_width (int): 图片宽度
+        camera_height (int): 图片高度
+        camera_rate (float): camera 频率(Hz)
+        pose_rate (float): 定位频率(Hz)
+        jitter_ms (float): lidar 和 camera 时间戳的最大随机抖动(ms)
+        drop_rate (float): lidar 和 camera 每一帧被丢弃的概率
+        nan_rate (float): 点云中 nan 点的比例
+        seed (int): 随机种子, 相同的参数和种子生成相同的 bag
+    """
+
+    def __init__(
+        self,
+        duration: float = 10,
+        lidar_num: int = 5,
+        lidar_point_num: int = 10000,
+        lidar_rate: float = 10,
+        camera_num: int = 4,
+        camera_width: int = 1280,
+        camera_height: int = 720,
+        camera_rate: float = 10,
+        pose_rate: float = 50,
+        jitter_ms: float = 0,
+        drop_rate: float = 0.0,
+        nan_rate: float = 0.01,
+        seed: int = 0,
+    ):
+        if duration <= 0:
+            raise ValueError(f"duration should be positive, but got {duration}")
+        if lidar_num < 1:
+            raise ValueError(f"lidar_num should be at least 1, but got {lidar_num}")
+        if lidar_point_num < 1:
+            raise ValueError(
+                f"lidar_point_num should be positive, but got {lidar_point_num}"
+            )
+        if camera_num < 0:
+            raise ValueError(f"camera_num should not be negative, but got {camera_num}")
+        if camera_width < 1 or camera_height < 1:
+            raise ValueError(
+                f"camera resolution should be positive, but got {camera_width}x{camera_height}"
+            )
+        for name, rate in [
+            ("lidar_rate", lidar_rate),
+            ("camera_rate", camera_rate),
+            ("pose_rate", pose_rate),
+        ]:
+            if rate <= 0:
+                raise ValueError(f"{name} should be positive, but got {rate}")
+        if jitter_ms < 0:
+            raise ValueError(f"jitter_ms should not be negative, but got {jitter_ms}")
+        if not 0 <= drop_rate < 1:
+            raise ValueError(f"drop_rate should be in [0, 1), but got {drop_rate}")
+        if not 0 <= nan_rate < 1:
+            raise ValueError(f"nan_rate should be in [0, 1), but got {nan_rate}")
+
+        self.duration = duration
+        self.lidar_num = lidar_num
+        self.lidar_point_num = lidar_point_num
+        self.lidar_rate = lidar_rate
+        self.camera_num = camera_num
+        self.camera_width = camera_width
+        self.camera_height = camera_height
+        self.camera_rate = camera_rate
+        self.pose_rate = pose_rate
+        self.jitter_ms = jitter_ms
+        self.drop_rate = drop_rate
+        self.nan_rate = nan_rate
+        self.seed = seed
+
+        # bag 的起始时间(s), 固定值保证生成的文件名和 token 可以复现
+        self.start_time = 1700000000
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class SyntheticBagGenerator:
+    """根据 SyntheticBagConfig 生成合成的 rosbag, 用于在没有实车数据的环境中测试切片的性能
+
+    - lidar : PointCloud2, 按照 ring 扫描的模式生成点, 每个 lidar 的时间戳有固定的错开
+    - camera : CompressedImage(jpeg), 每个 camera 只编码一次, 之后每一帧复用
+    - ego pose : PoseStamped, 匀速圆周运动
+    - /tf_static : 每个 lidar 到融合坐标系的外参
+
+    所有消息按照时间顺序逐条生成并写入, 内存占用与 bag 的时长无关
+
+    Args:
+        bag_config (SyntheticBagConfig): 合成参数
+        data_config (DataConfig): 提供 topic 名称, 为 None 时使用已经创建的 DataConfig
+    """
+
+    def __init__(self, bag_config: SyntheticBagConfig, data_config: DataConfig = None):
+        self.bag_config = bag_config
+        self.data_config = data_config if data_config is not None else DataConfig()
+        self.rng = np.random.default_rng(bag_config.seed)
+
+        self.lidar_topic_list = self.get_lidar_topic_list()
+        self.camera_topic_list = self.get_camera_topic_list()
+        self.pose_topic = list(self.data_config.pose_topic_channel_dict.keys())[0]
+
+        self.camera_data_dict = {}
+        self.message_count_dict = {}
+
+    def get_lidar_topic_list(self):
+        """主 lidar 排在第一位, 其余按照 DataConfig 中的顺序选取"""
+        main_topic = self.data_config.main_topic
+        topic_list = [main_topic] + [
+            topic
+            for topic in self.data_config.lidar_topic_channel_dict
+            if topic != main_topic
+        ]
+        if self.bag_config.lidar_num > len(topic_list):
+            raise ValueError(
+                f"lidar_num should be at most {len(topic_list)}, but got {self.bag_config.lidar_num}"
+            )
+        return topic_list[: self.bag_config.lidar_num]
+
+    def get_camera_topic_list(self):
+        topic_list = list(self.data_config.camera_topic_channel_dict.keys())
+        if self.bag_config.camera_num > len(topic_list):
+            raise ValueError(
+                f"camera_num should be at most {len(topic_list)}, but got {self.bag_config.camera_num}"
+            )
+        return topic_list[: self.bag_config.camera_num]
+
+    def generate(self, bag_path):
+        """生成 bag
+
+        Args:
+            bag_path (str): 输出的 bag 路径
+
+        Returns:
+            dict: 生成信息, 包括每个 topic 的消息数量以及 bag 的大小
+        """
+        dir_path = os.path.dirname(bag_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+
+        self.message_count_dict = {}
+        start_ns = self.bag_config.start_time * 10**9
+        with rosbag.Bag(bag_path, "w") as bag:
+            for topic, msg in self.generate_tf_static_msg_list():
+                self.write(bag, topic, msg, genpy.Time(self.bag_config.start_time, 0))
+
+            for stamp_ns, kind, topic, index in self.iter_schedule(start_ns):
+                if kind == "lidar":
+                    msg = self.generate_lidar_msg(topic, stamp_ns)
+                elif kind == "camera":
+                    msg = self.generate_camera_msg(topic, stamp_ns)
+                else:
+                    msg = self.generate_pose_msg(stamp_ns, index)
+                if msg is None:
+                    continue
+                self.write(bag, topic, msg, msg.header.stamp)
+
+        return {
+            "bag_path": bag_path,
+            "bag_size": os.path.getsize(bag_path),
+            "message_count": dict(self.message_count_dict),
+        }
+
+    def write(self, bag, topic, msg, stamp):
+        bag.write(topic, msg, stamp)
+        self.message_count_dict[topic] = self.message_count_dict.get(topic, 0) + 1
+
+    def iter_schedule(self, start_ns):
+        """按照时间顺序返回每一条消息的 (名义时间戳(ns), 类型, topic, 序号)
+
+        每个 lidar 相对主 lidar 错开 3ms, 每个 camera 相对主 lidar 错开 (7 + 序号)ms,
+        与实车中各传感器不完全同步的情况类似
+        """
+        bag_config = self.bag_config
+        stream_list = []
+        for i, topic in enumerate(self.lidar_topic_list):
+            stream_list.append(("lidar", topic, bag_config.lidar_rate, i * 3))
+        for i, topic in enumerate(self.camera_topic_list):
+            stream_list.append(("camera", topic, bag_config.camera_rate, 7 + i))
+        stream_list.append(("pose", self.pose_topic, bag_config.pose_rate, 0))
+
+        def iter_stream(kind, topic, rate, offset_ms):
+            # 第一帧从 100ms 开始, 保证第一帧的抖动不会早于 bag 的起始时间
+            count = int(math.floor(bag_config.duration * rate))
+            for index in range(count):
+                stamp_ns = start_ns + int((0.1 + index / rate) * 1e9) + offset_ms * 10**6
+                yield stamp_ns, kind, topic, index
+
+        return heapq.merge(*[iter_stream(*stream) for stream in stream_list])
+
+    def apply_jitter(self, stamp_ns):
+        jitter_ms = self.bag_config.jitter_ms
+        if jitter_ms > 0:
+            stamp_ns += int(self.rng.uniform(-jitter_ms, jitter_ms) * 10**6)
+        return genpy.Time(stamp_ns // 10**9, stamp_ns % 10**9)
+
+    def is_dropped(self):
+        return self.bag_config.drop_rate > 0 and self.rng.random() < self.bag_config.drop_rate
+
+    def generate_tf_static_msg_list(self):
+        """每个 lidar 均匀分布在车顶一圈, 朝向与车辆一致"""
+        msg_list = []
+        for i, topic in enumerate(self.lidar_topic_list):
+            angle = 2 * math.pi * i / len(self.lidar_topic_list)
+            msg = TransformStamped()
+            msg.child_frame_id = topic
+            msg.transform.translation.x = 0.0 if i == 0 else 1.5 * math.cos(angle)
+            msg.transform.translation.y = 0.0 if i == 0 else 1.5 * math.sin(angle)
+            msg.transform.translation.z = 1.8
+            msg.transform.rotation.w = 1.0
+            msg_list.append(("/tf_static", msg))
+        return msg_list
+
+    def generate_points(self, stamp_ns):
+        """按照 ring 扫描的模式生成一帧点云, 距离随机, 部分点为 nan"""
+        bag_config = self.bag_config
+        point_num = bag_config.lidar_point_num
+        ring_num = 32
+
+        ring = np.arange(point_num) % ring_num
+        azimuth = np.linspace(0, 2 * np.pi, point_num, endpoint=False)
+        elevation = np.deg2rad(-25 + ring * (40 / ring_num))
+        distance = self.rng.uniform(1.0, 80.0, point_num)
+
+        points = np.zeros(point_num, dtype=SYNTHETIC_POINT_DTYPE)
+        points["x"] = distance * np.cos(elevation) * np.cos(azimuth)
+        points["y"] = distance * np.cos(elevation) * np.sin(azimuth)
+        points["z"] = distance * np.sin(elevation)
+        points["intensity"] = self.rng.integers(0, 256, point_num)
+        points["ring"] = ring
+        points["timestamp"] = stamp_ns / 1e9 + azimuth / (2 * np.pi) / bag_config.lidar_rate
+
+        nan_num = int(point_num * bag_config.nan_rate)
+        if nan_num > 0:
+            nan_index = self.rng.choice(point_num, nan_num, replace=False)
+            points["x"][nan_index] = np.nan
+        return points
+
+    def generate_lidar_msg(self, topic, stamp_ns):
+        if self.is_dropped():
+            return None
+        stamp = self.apply_jitter(stamp_ns)
+        points = self.generate_points(stamp.to_nsec())
+        msg = PointCloud2(
+            height=1,
+            width=len(points),
+            fields=SYNTHETIC_POINT_FIELD_LIST,
+            is_bigendian=False,
+            point_step=points.dtype.itemsize,
+            row_step=points.nbytes,
+            data=points.tobytes(),
+            is_dense=False,
+        )
+        msg.header.stamp = stamp
+        msg.header.frame_id = topic
+        return msg
+
+    def get_camera_data(self, topic):
+        """每个 camera 的 jpeg 数据只编码一次, 渐变背景加噪声, 压缩率与真实图片接近"""
+        if topic not in self.camera_data_dict:
+            width = self.bag_config.camera_width
+            height = self.bag_config.camera_height
+            gradient = np.linspace(0, 255, width, dtype=np.float32)
+            img = np.empty((height, width, 3), dtype=np.float32)
+            img[:, :, 0] = gradient
+            img[:, :, 1] = gradient[::-1]
+            img[:, :, 2] = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+            img += self.rng.normal(0, 8, img.shape)
+            img = np.clip(img, 0, 255).astype(np.uint8)
+            ret, data = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+            if not ret:
+                raise RuntimeError(f"failed to encode synthetic image for {topic}")
+            self.camera_data_dict[topic] = data.tobytes()
+        return self.camera_data_dict[topic]
+
+    def generate_camera_msg(self, topic, stamp_ns):
+        if self.is_dropped():
+            return None
+        msg = CompressedImage()
+        msg.header.stamp = self.apply_jitter(stamp_ns)
+        msg.header.frame_id = topic
+        msg.format = "jpeg"
+        msg.data = self.get_camera_data(topic)
+        return msg
+
+    def generate_pose_msg(self, stamp_ns, index):
+        """半径 100m, 速度 10m/s 的匀速圆周运动"""
+        radius = 100.0
+        angle = 10.0 * index / self.bag_config.pose_rate / radius
+        msg = PoseStamped()
+        msg.header.stamp = genpy.Time(stamp_ns // 10**9, stamp_ns % 10**9)
+        msg.header.frame_id = "map"
+        msg.pose.position.x = radius * math.sin(angle)
+        msg.pose.position.y = radius * (1 - math.cos(angle))
+        msg.pose.position.z = 0.0
+        # 绕 z 轴旋转 angle
+        msg.pose.orientation.w = math.cos(angle / 2)
+        msg.pose.orientation.x = 0.0
+        msg.pose.orientation.y = 0.0
+        msg.pose.orientation.z = math.sin(angle / 2)
+        return msg
+
+
+def generate_synthetic_bag(bag_path, bag_config: SyntheticBagConfig, data_config=None):
+    """生成合成的 rosbag
+
+    Args:
+        bag_path (str): 输出的 bag 路径
+        bag_config (SyntheticBagConfig): 合成参数
+        data_config (DataConfig): 提供 topic 名称, 为 None 时使用已经创建的 DataConfig
+
+    Returns:
+        dict: 生成信息, 包括每个 topic 的消息数量以及 bag 的大小
+    """
+    return SyntheticBagGenerator(bag_config, data_config).generate(bag_path)
+
+
+def generate_synthetic_sus_labels(sus_path, object_num=20, seed=0):
+    """为导出的 sus 数据生成合成的标注结果, 用于测试标注结果的导入
+
+    每个 sus/lidar 下的点云文件对应一个 sus/label 下的同名 json 文件
+
+    Args:
+        sus_path (str): sus 数据路径
+        object_num (int): 每一帧的目标数量
+        seed (int): 随机种子
+
+    Returns:
+        int: 生成的标注文件数量
+    """
+    rng = np.random.default_rng(seed)
+    lidar_path = os.path.join(sus_path, "lidar")
+    label_path = os.path.join(sus_path, "label")
+    os.makedirs(label_path, exist_ok=True)
+
+    filename_list = sorted(os.listdir(lidar_path))
+    for filename in filename_list:
+        object_list = []
+        for i in range(object_num):
+            object_list.append(
+                {
+                    "obj_id": str(i),
+                    "obj_type": SYNTHETIC_OBJ_TYPE_LIST[i % len(SYNTHETIC_OBJ_TYPE_LIST)],
+                    "psr": {
+                        "position": {
+                            "x": float(rng.uniform(-50, 50)),
+                            "y": float(rng.uniform(-50, 50)),
+                            "z": float(rng.uniform(-1, 1)),
+                        },
+                        "scale": {
+                            "x": float(rng.uniform(1, 10)),
+                            "y": float(rng.uniform(0.5, 3)),
+                            "z": float(rng.uniform(1, 4)),
+                        },
+                        "rotation": {
+                            "x": 0.0,
+                            "y": 0.0,
+                            "z": float(rng.uniform(-math.pi, math.pi)),
+                        },
+                    },
+                    "num_lidar_pts": int(rng.integers(1, 500)),
+                }
+            )
+        label_file = os.path.join(label_path, filename.split(".")[0] + ".json")
+        with open(label_file, "w") as f:
+            json.dump(object_list, f)
+
+    return len(filename_list)
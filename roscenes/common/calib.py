@@ -1,4 +1,5 @@
 import json
+from types import MappingProxyType
 
 import numpy as np
 import quaternion
@@ -49,14 +50,13 @@ class CalibInfo:
                 self._camera_info_check()
                 self.camera_intrinsic = self.get_camera_intrinsic(self.camera_info)
 
-    def get_transform_matrix(self):
-        """获取transform matrix
-        Returns:
-            np.ndarray: 4x4的transform matrix
-        """
+        # 变换矩阵只在构建时计算一次, 之后只读
+        self.transform_matrix = self._build_transform_matrix()
+
+    def _build_transform_matrix(self):
         transform_matrix = np.eye(4)
 
-        translation = np.array(self.translation).reshape(3, 1)
+        translation = np.array(self.translation, dtype=float).reshape(3, 1)
         rotation = quaternion.from_float_array(self.rotation)
         rotation_matrix = quaternion.as_rotation_matrix(rotation)
 
@@ -64,13 +64,19 @@ class CalibInfo:
         transform_matrix[:3, :3] = rotation_matrix
         transform_matrix[:3, 3] = translation.flatten()
 
-        transform_matrix = np.array(
-            [[format(val, ".6f") for val in row] for row in transform_matrix],
-            dtype=float,
-        )
+        # 保留6位小数, 避免 1.0 变成 0.9999999999999998 之类的结果
+        transform_matrix = np.round(transform_matrix, 6)
+        transform_matrix.flags.writeable = False
 
         return transform_matrix
 
+    def get_transform_matrix(self):
+        """获取transform matrix
+        Returns:
+            np.ndarray: 4x4的transform matrix (只读)
+        """
+        return self.transform_matrix
+
     def _camera_info_check(self):
         """check camera intrinsic"""
         if self.camera_info is None:
@@ -193,11 +199,117 @@ class CalibInfo:
         return camera_intrinsic
 
 
+class CalibRegistry:
+    """不可变的标定信息注册表, 每个 scene 只构建一次
+
+    - 每个 channel 的 float32 旋转矩阵和平移向量
+    - 每个 lidar 到融合坐标系的复合变换 (float32), 供点云融合的热循环直接使用
+
+    Args:
+        calib_info_dict (dict): 以 channel 为 key, value 为 CalibInfo
+        fusion_channel (str): 融合坐标系对应的 channel
+    """
+
+    def __init__(self, calib_info_dict, fusion_channel="lidar-fusion"):
+        self.fusion_channel = fusion_channel
+
+        calib_info_dict = dict(calib_info_dict)
+        rotation_dict = {}
+        translation_dict = {}
+        for channel, calib_info in calib_info_dict.items():
+            transform_matrix = calib_info.get_transform_matrix()
+            rotation_dict[channel] = self._readonly(
+                transform_matrix[:3, :3].astype(np.float32)
+            )
+            translation_dict[channel] = self._readonly(
+                transform_matrix[:3, 3].astype(np.float32)
+            )
+
+        # lidar 到融合坐标系的复合变换: T_fusion^-1 * T_lidar
+        # 只有 lidar 才有这个变换, 判断依据是没有内参
+        fusion_to_vehicle = None
+        if fusion_channel in calib_info_dict:
+            fusion_to_vehicle = np.linalg.inv(
+                calib_info_dict[fusion_channel].get_transform_matrix()
+            )
+        lidar_to_fusion_dict = {}
+        for channel, calib_info in calib_info_dict.items():
+            if calib_info.camera_intrinsic is not None:
+                continue
+            transform_matrix = calib_info.get_transform_matrix()
+            if fusion_to_vehicle is not None:
+                transform_matrix = np.dot(fusion_to_vehicle, transform_matrix)
+            lidar_to_fusion_dict[channel] = (
+                self._readonly(transform_matrix[:3, :3].astype(np.float32)),
+                self._readonly(transform_matrix[:3, 3].astype(np.float32)),
+            )
+
+        self._calib_info_dict = MappingProxyType(calib_info_dict)
+        self._rotation_dict = MappingProxyType(rotation_dict)
+        self._translation_dict = MappingProxyType(translation_dict)
+        self._lidar_to_fusion_dict = MappingProxyType(lidar_to_fusion_dict)
+
+    @staticmethod
+    def _readonly(array):
+        array = np.ascontiguousarray(array)
+        array.flags.writeable = False
+        return array
+
+    def _check_channel(self, channel):
+        if channel not in self._calib_info_dict:
+            raise ValueError(f"channel {channel} not in calib info dict")
+
+    def __contains__(self, channel):
+        return channel in self._calib_info_dict
+
+    def get_channel_list(self):
+        return list(self._calib_info_dict.keys())
+
+    def get_calib_info(self, channel):
+        """获取指定channel的calib info
+        Args:
+            channel (str): frame_id
+        Returns:
+            CalibInfo: calib info
+        """
+        self._check_channel(channel)
+        return self._calib_info_dict[channel]
+
+    def get_rotation(self, channel):
+        """获取指定channel的 float32 旋转矩阵, shape (3, 3)"""
+        self._check_channel(channel)
+        return self._rotation_dict[channel]
+
+    def get_translation(self, channel):
+        """获取指定channel的 float32 平移向量, shape (3,)"""
+        self._check_channel(channel)
+        return self._translation_dict[channel]
+
+    def get_extrinsic(self, channel):
+        """获取指定channel的外参矩阵, shape (4, 4)"""
+        return self.get_calib_info(channel).get_extrinsic()
+
+    def get_intrinsic(self, channel):
+        """获取指定channel的内参矩阵, shape (3, 3), 没有内参时为 None"""
+        return self.get_calib_info(channel).get_intrinsic()
+
+    def get_lidar_to_fusion(self, channel):
+        """获取指定 lidar 到融合坐标系的变换
+
+        Returns:
+            tuple: (rotation, translation), float32 的 (3, 3) 旋转矩阵和 (3,) 平移向量
+        """
+        if channel not in self._lidar_to_fusion_dict:
+            raise ValueError(f"channel {channel} is not a lidar channel")
+        return self._lidar_to_fusion_dict[channel]
+
+
 class NuscenesCalibratedSensor:
     def __init__(self, path):
         self.path = path
 
         self.calib_info_dict = self.parse()
+        self.calib_registry = CalibRegistry(self.calib_info_dict)
 
     def parse(self):
         """解析calibrated_sensor.json文件
@@ -240,7 +352,4 @@ class NuscenesCalibratedSensor:
         Returns:
             CalibInfo: calib info
         """
-        if channel not in self.calib_info_dict:
-            raise ValueError(f"channel {channel} not in calib info dict")
-
-        return self.calib_info_dict[channel]
+        return self.calib_registry.get_calib_info(channel)
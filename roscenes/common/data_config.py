@@ -3,6 +3,28 @@ import os
 
 
 from .calib import CalibInfo
+from .json_writer import DEFAULT_JSON_BACKEND, DEFAULT_JSON_INDENT
+from .pcd_codec import (
+    DEFAULT_PCD_COMPRESSION,
+    DEFAULT_ZSTD_LEVEL,
+    PCD_COMPRESSION_LIST,
+    PCD_COMPRESSION_SUFFIX_DICT,
+    import_zstandard,
+)
+
+# 融合点云的保存格式以及对应的文件后缀
+# - pcd : pcd 文件, 压缩方式由 DataConfig.pcd_compression 决定, 见 pcd_codec.PCD_COMPRESSION_SUFFIX_DICT
+# - bin : float32 的 .bin 文件, 每个点 save_pcd_dims 个 float32, 可以直接被 mmdet3d 读取,
+#   后缀与 merge 时由 pcd 转换得到的文件一致
+# - packed : 切片时与 bin 相同, 场景切片完成后每个 channel 的所有帧打包为一个 float32 blob,
+#   通过 nuscenes.packed.PackedPointCloudReader 按 sample_data token 读取
+LIDAR_FILE_SUFFIX_DICT = {"pcd": ".pcd", "bin": ".pcd.bin", "packed": ".pcd.bin"}
+LIDAR_FILE_FORMAT_LIST = list(LIDAR_FILE_SUFFIX_DICT.keys())
+
+# 融合点云体素降采样时体素内点的合并方式
+# - max : 保留 intensity 最大的点
+# - mean : x, y, z, intensity 取平均
+VOXEL_REDUCTION_LIST = ["max", "mean"]
 
 
 class Singleton(type):
@@ -18,19 +40,72 @@ class DataConfig(metaclass=Singleton):
     def __init__(
         self,
         save_pcd_dims: int = 4,
+        lidar_file_format: str = "pcd",
+        pcd_compression: str = DEFAULT_PCD_COMPRESSION,
+        pcd_zstd_level: int = DEFAULT_ZSTD_LEVEL,
+        car_brand: str = None,
+        lidar_range: list = None,
+        sweep_voxel_size: float = None,
+        voxel_key_frame_flag: bool = False,
+        voxel_reduction: str = "max",
+        camera_passthrough_flag: bool = False,
         sample_interval: int = 5,
         save_sweep_data_flag: bool = True,
+        writer_worker_num: int = 4,
+        writer_queue_size: int = 64,
+        resume_flag: bool = False,
+        json_indent=DEFAULT_JSON_INDENT,
+        json_backend: str = DEFAULT_JSON_BACKEND,
+        profile_flag: bool = False,
+        memory_budget: int = None,
+        memory_history_path: str = None,
     ):
+        if lidar_file_format not in LIDAR_FILE_FORMAT_LIST:
+            raise ValueError(
+                f"lidar_file_format should be one of {LIDAR_FILE_FORMAT_LIST}, but got {lidar_file_format}"
+            )
+        if pcd_compression not in PCD_COMPRESSION_LIST:
+            raise ValueError(
+                f"pcd_compression should be one of {PCD_COMPRESSION_LIST}, but got {pcd_compression}"
+            )
+        # zstd 需要可选依赖 zstandard, 在这里检查, 而不是在写入线程中写第一帧时才失败
+        if lidar_file_format == "pcd" and pcd_compression == "zstd":
+            import_zstandard()
+        if voxel_reduction not in VOXEL_REDUCTION_LIST:
+            raise ValueError(
+                f"voxel_reduction should be one of {VOXEL_REDUCTION_LIST}, but got {voxel_reduction}"
+            )
+        if sweep_voxel_size is not None and sweep_voxel_size <= 0:
+            raise ValueError(f"sweep_voxel_size should be positive, but got {sweep_voxel_size}")
+        if save_pcd_dims < 3:
+            raise ValueError(f"save_pcd_dims should be at least 3, but got {save_pcd_dims}")
 
-        self.save_pcd_dims = save_pcd_dims  # 保存点云的维度
+        self.save_pcd_dims = save_pcd_dims  # 保存点云的维度, 只对 .bin 格式生效
+        self.lidar_file_format = lidar_file_format  # 融合点云的保存格式, pcd, bin 或 packed
+        self.pcd_compression = pcd_compression  # pcd 的压缩方式, 只对 pcd 格式生效
+        self.pcd_zstd_level = pcd_zstd_level  # zstd 的压缩级别, 只对 zstd 压缩生效
+        self.car_brand = car_brand  # 车型, 融合时使用 FusionLidarFilterRangeMap 中该车型的车身排除框
+        self.lidar_range = lidar_range  # 融合坐标系下的裁剪范围 [x_min, y_min, z_min, x_max, y_max, z_max]
+        self.sweep_voxel_size = sweep_voxel_size  # sweep 点云体素降采样的体素边长(m), None 表示不降采样
+        self.voxel_key_frame_flag = voxel_key_frame_flag  # 关键帧是否也进行体素降采样
+        self.voxel_reduction = voxel_reduction  # 体素内点的合并方式, max 或 mean
         self.sample_interval = sample_interval  # 采样间隔
         self.save_sweep_data_flag = save_sweep_data_flag  # 是否保存sweep数据
         self.min_bag_duration = 20  # 设置每个bag包的最小时间长度
+        self.writer_worker_num = writer_worker_num  # 写入线程数, 0 表示在帧循环中同步写入
+        self.writer_queue_size = writer_queue_size  # 写入队列的最大长度, 用于限制内存占用
+        self.resume_flag = resume_flag  # 是否从上次中断的位置继续切片
+        self.json_indent = json_indent  # json 表的缩进, None 表示紧凑格式
+        self.json_backend = json_backend  # json 表的序列化后端, json 或 orjson
+        self.profile_flag = profile_flag  # 是否统计各阶段的耗时和内存并保存报告
+        self.memory_budget = memory_budget  # 并行切片的内存预算(bytes), None 表示可用内存的 80%
+        self.memory_history_path = memory_history_path  # 切片峰值内存的历史记录, 用于修正内存估计
 
         self.main_topic = "/lidar_points/top"  # 时间同步的基础topic
         self.main_channel = "lidar-fusion"
         self.lidar_fusion_flag = True  # 是否融合lidar数据
         self.transform_lidar_flag = False  # 是否转换lidar数据
+        self.camera_passthrough_flag = camera_passthrough_flag  # 是否直接写入原始的jpeg/png数据, 不做解码和重新编码
 
         self.time_diff_threshold = 50  # 时间同步阈值(ms)
 
@@ -56,6 +131,64 @@ class DataConfig(metaclass=Singleton):
             "/localization_result": "ego-pose",
         }
 
+    def get_lidar_file_suffix(self):
+        """融合点云文件的后缀, pcd 格式的后缀由压缩方式决定"""
+        if self.lidar_file_format == "pcd":
+            return PCD_COMPRESSION_SUFFIX_DICT[self.pcd_compression]
+        return LIDAR_FILE_SUFFIX_DICT[self.lidar_file_format]
+
+    def get_voxel_size(self, is_key_frame):
+        """融合点云的体素边长, 不降采样时返回 None"""
+        if is_key_frame and not self.voxel_key_frame_flag:
+            return None
+        return self.sweep_voxel_size
+
+    def get_voxel_info(self):
+        """记录在 scene 表中的降采样参数, 不降采样时返回 None"""
+        if not self.sweep_voxel_size:
+            return None
+        return {
+            "voxel_size": self.sweep_voxel_size,
+            "key_frame": self.voxel_key_frame_flag,
+            "reduction": self.voxel_reduction,
+        }
+
+    def get_slice_topic_list(self):
+        """获取切片所需的 topic 白名单, 其余 topic (例如诊断, CAN 等) 在读取 bag 时直接跳过
+
+        Returns:
+            list: camera, lidar, pose topic 以及 /tf_static
+        """
+        topic_list = []
+        topic_list.extend(self.camera_topic_channel_dict.keys())
+        topic_list.extend(self.lidar_topic_channel_dict.keys())
+        topic_list.extend(self.pose_topic_channel_dict.keys())
+        topic_list.append("/tf_static")
+        return topic_list
+
+    def get_slice_config_dict(self):
+        """获取会影响切片结果的配置, 用于断点续切时判断配置是否发生了变化
+
+        Note : 写入线程数等运行时参数不影响切片结果, 不包含在内.
+            json 表在每次切片结束时都会重新生成, 所以 json 的格式也不包含在内
+
+        Returns:
+            dict: 配置字典
+        """
+        runtime_key_list = [
+            "writer_worker_num",
+            "writer_queue_size",
+            "resume_flag",
+            "json_indent",
+            "json_backend",
+            "profile_flag",
+            "memory_budget",
+            "memory_history_path",
+        ]
+        return {
+            key: value for key, value in vars(self).items() if key not in runtime_key_list
+        }
+
     # 读取标定信息
     @staticmethod
     def parse_calib(calib_path, topic_channel_dict):
@@ -0,0 +1,136 @@
+import io
+import os
+import struct
+from functools import lru_cache
+
+import cv2
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SOI = b"\xff\xd8"
+
+# JPEG 中 SOF0 ~ SOF15 标记包含图片的宽高, 其中 DHT(0xC4), JPG(0xC8), DAC(0xCC) 不是 SOF
+JPEG_SOF_MARKERS = {
+    marker for marker in range(0xC0, 0xD0) if marker not in (0xC4, 0xC8, 0xCC)
+}
+# 没有长度字段的独立标记: TEM, RST0 ~ RST7, SOI
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+
+
+def get_image_format(data):
+    """根据文件头的魔数判断图片格式
+
+    Args:
+        data (bytes): 图片数据, 至少包含文件头
+
+    Returns:
+        str: "jpeg" , "png" , 无法识别时返回 None
+    """
+    if data[:2] == JPEG_SOI:
+        return "jpeg"
+    if data[:8] == PNG_SIGNATURE:
+        return "png"
+    return None
+
+
+def get_image_size(path):
+    """只读取文件头获取图片文件的宽高, 结果按照文件路径缓存
+
+    Note : 缓存的 key 包含文件的修改时间和大小, 所以文件被重新写入后不会读到旧的结果
+
+    Args:
+        path (str): 图片文件路径
+
+    Returns:
+        tuple: (width, height)
+    """
+    stat = os.stat(path)
+    return _get_image_size_cached(path, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=4096)
+def _get_image_size_cached(path, mtime_ns, size):
+    try:
+        with open(path, "rb") as f:
+            return get_image_size_from_stream(f)
+    except ValueError:
+        # 非 jpeg/png 格式的图片, 退回到完整解码
+        img = cv2.imread(path)
+        if img is None:
+            raise ValueError(f"failed to read image {path}")
+        return (img.shape[1], img.shape[0])
+
+
+def get_image_size_from_bytes(data):
+    """只解析文件头获取图片的宽高, 不进行解码
+
+    Args:
+        data (bytes): 完整的 jpeg/png 图片数据
+
+    Returns:
+        tuple: (width, height)
+    """
+    return get_image_size_from_stream(io.BytesIO(data))
+
+
+def get_image_size_from_stream(stream):
+    """从文件对象中只读取文件头获取图片的宽高
+
+    - png : 宽高位于 IHDR 块中, 固定在文件头的第 16 ~ 24 字节
+    - jpeg : 逐个跳过标记段, 直到遇到 SOF 标记段
+
+    Args:
+        stream (io.BufferedIOBase): 以二进制模式打开的文件对象
+
+    Returns:
+        tuple: (width, height)
+    """
+    header = stream.read(2)
+    if header == JPEG_SOI:
+        return _parse_jpeg_size(stream)
+
+    header += stream.read(22)
+    if header[:8] == PNG_SIGNATURE and header[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", header[16:24])
+        return (width, height)
+
+    raise ValueError("unsupported image format, only jpeg and png are supported")
+
+
+def _parse_jpeg_size(stream):
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            break
+        if byte != b"\xff":
+            continue
+
+        # 标记前可能有多个填充的 0xFF
+        marker = stream.read(1)
+        while marker == b"\xff":
+            marker = stream.read(1)
+        if not marker:
+            break
+        marker = ord(marker)
+
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        # 到达 EOI 或 SOS 仍未找到 SOF, 说明文件不完整
+        if marker in (0xD9, 0xDA):
+            break
+
+        length_bytes = stream.read(2)
+        if len(length_bytes) != 2:
+            break
+        (length,) = struct.unpack(">H", length_bytes)
+
+        if marker in JPEG_SOF_MARKERS:
+            # SOF 段: precision(1) height(2) width(2)
+            sof = stream.read(5)
+            if len(sof) != 5:
+                break
+            _, height, width = struct.unpack(">BHH", sof)
+            return (width, height)
+
+        stream.seek(length - 2, io.SEEK_CUR)
+
+    raise ValueError("invalid jpeg data, SOF marker not found")
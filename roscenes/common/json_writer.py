@@ -0,0 +1,146 @@
+import json
+import os
+
+DEFAULT_JSON_INDENT = 4
+DEFAULT_JSON_BACKEND = "json"
+JSON_BACKEND_LIST = ["json", "orjson"]
+
+
+class JsonTableWriter:
+    """流式写入 nuscenes 的 json 表, 表的内容为一个由 dict 组成的 list
+
+    每条记录单独序列化后立即写入文件, 不需要先在内存中拼出完整的 list, 也不需要一次性序列化整个表
+
+    - indent 为整数时, 输出与 json.dump(data, f, indent=indent, ensure_ascii=ensure_ascii)
+        逐字节一致
+    - indent 为 None 时, 输出紧凑格式, 没有缩进和多余的空格, 文件体积和解析时间都更小
+
+    两种格式都是标准的 json, nuscenes devkit 可以直接读取
+
+    Args:
+        file_path (str): 输出文件路径
+        indent (int): 缩进的空格数, None 表示紧凑格式
+        backend (str): 序列化后端, "json" 或 "orjson", orjson 只支持紧凑格式,
+            缩进格式下会使用 json 以保证与原有输出一致, 并打印提示
+        ensure_ascii (bool): 是否将非 ascii 字符转义, 与 json.dump 的同名参数一致,
+            orjson 不支持转义, 此时会使用 json 并打印提示
+    """
+
+    def __init__(
+        self,
+        file_path,
+        indent=DEFAULT_JSON_INDENT,
+        backend=DEFAULT_JSON_BACKEND,
+        ensure_ascii=False,
+    ):
+        if backend not in JSON_BACKEND_LIST:
+            raise ValueError(
+                f"json backend should be one of {JSON_BACKEND_LIST}, but got {backend}"
+            )
+        if indent is not None and indent < 0:
+            raise ValueError(f"json indent should be None or >= 0, but got {indent}")
+
+        self.file_path = file_path
+        self.indent = indent
+        self.backend = backend
+        self.ensure_ascii = ensure_ascii
+        self.record_num = 0
+
+        self._dumps = self._build_dumps()
+        self._file = None
+
+    def _build_dumps(self):
+        """构建单条记录的序列化函数, 返回 utf-8 编码的 bytes"""
+        if self.backend == "orjson" and (
+            self.indent is not None or self.ensure_ascii
+        ):
+            print(
+                f"orjson backend does not support indent={self.indent} or "
+                f"ensure_ascii={self.ensure_ascii}, fall back to json backend "
+                f"for {self.file_path}"
+            )
+        if self.indent is None and self.backend == "orjson" and not self.ensure_ascii:
+            try:
+                import orjson
+            except ImportError:
+                raise ImportError(
+                    "orjson is not installed, please install it by `pip install orjson` "
+                    "or use the default json backend"
+                )
+            option = orjson.OPT_SERIALIZE_NUMPY
+            return lambda record: orjson.dumps(record, option=option)
+
+        if self.indent is None:
+            encoder = json.JSONEncoder(
+                ensure_ascii=self.ensure_ascii, separators=(",", ":")
+            )
+            return lambda record: encoder.encode(record).encode("utf-8")
+
+        # json.dump 的缩进格式中, list 中的每个元素都会多缩进一层
+        encoder = json.JSONEncoder(ensure_ascii=self.ensure_ascii, indent=self.indent)
+        prefix = " " * self.indent
+
+        def dumps(record):
+            lines = encoder.encode(record).split("\n")
+            return ("\n".join(prefix + line for line in lines)).encode("utf-8")
+
+        return dumps
+
+    def open(self):
+        dir_path = os.path.dirname(self.file_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        self._file = open(self.file_path, "wb")
+        self._file.write(b"[")
+        self.record_num = 0
+
+    def write(self, record):
+        if self.record_num == 0:
+            if self.indent is not None:
+                self._file.write(b"\n")
+        else:
+            self._file.write(b"," if self.indent is None else b",\n")
+        self._file.write(self._dumps(record))
+        self.record_num += 1
+
+    def write_all(self, record_iter):
+        for record in record_iter:
+            self.write(record)
+
+    def close(self):
+        if self._file is None:
+            return
+        if self.indent is not None and self.record_num > 0:
+            self._file.write(b"\n")
+        self._file.write(b"]")
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def save_json_table(
+    record_iter,
+    file_path,
+    indent=DEFAULT_JSON_INDENT,
+    backend=DEFAULT_JSON_BACKEND,
+    ensure_ascii=False,
+):
+    """将一个 json 表流式写入文件
+
+    Args:
+        record_iter (iterable): 表中的记录, 可以是 list 也可以是生成器
+        file_path (str): 输出文件路径
+        indent (int): 缩进的空格数, None 表示紧凑格式
+        backend (str): 序列化后端, json 或 orjson
+        ensure_ascii (bool): 是否将非 ascii 字符转义
+    """
+    with JsonTableWriter(
+        file_path, indent=indent, backend=backend, ensure_ascii=ensure_ascii
+    ) as writer:
+        writer.write_all(record_iter)
@@ -0,0 +1,104 @@
+import numpy as np
+
+from .constant import FusionLidarFilterRangeMap
+
+
+class LidarCropFilter:
+    """点云融合时的裁剪, 每个 scene 只构建一次
+
+    - 排除框: 每个 lidar 若干个带朝向的框, 定义在该 lidar 自身的坐标系下(融合变换之前),
+        框内的点被过滤, 用于去除打在车身上的点. 框的格式与 FusionLidarFilterRangeMap 一致:
+        {"x", "y", "z": 中心, "l", "w", "h": 沿 x, y, z 的尺寸, "yaw": 绕 z 轴的朝向(rad)}
+    - 范围裁剪: 融合坐标系下的轴对齐范围 [x_min, y_min, z_min, x_max, y_max, z_max], 范围外的点被过滤
+
+    所有条件合并为每个 lidar 的一个 mask, 与 nan 过滤一起在拼接之前完成, 被过滤的点不会被拷贝和变换
+
+    Args:
+        exclusion_box_dict (dict): 以 lidar channel 为 key, value 为一个框或者框的列表
+        lidar_range (list): 融合坐标系下的范围, None 表示不裁剪
+    """
+
+    def __init__(self, exclusion_box_dict=None, lidar_range=None):
+        # 每个框预先计算为 (中心, cos(yaw), sin(yaw), 半尺寸), 热循环中只做逐元素运算
+        self.exclusion_box_dict = {}
+        for channel, box_list in (exclusion_box_dict or {}).items():
+            if isinstance(box_list, dict):
+                box_list = [box_list]
+            self.exclusion_box_dict[channel] = [
+                (
+                    np.array([box["x"], box["y"], box["z"]], dtype=np.float32),
+                    np.float32(np.cos(box["yaw"])),
+                    np.float32(np.sin(box["yaw"])),
+                    np.array([box["l"], box["w"], box["h"]], dtype=np.float32) / 2,
+                )
+                for box in box_list
+            ]
+
+        self.lidar_range = None
+        if lidar_range is not None:
+            if len(lidar_range) != 6:
+                raise ValueError(
+                    f"lidar_range should be [x_min, y_min, z_min, x_max, y_max, z_max], but got {lidar_range}"
+                )
+            self.lidar_range = np.array(lidar_range, dtype=np.float32)
+
+    @classmethod
+    def from_data_config(cls, data_config):
+        """根据 DataConfig.car_brand 和 DataConfig.lidar_range 构建, 都没有配置时返回 None"""
+        exclusion_box_dict = None
+        if data_config.car_brand:
+            exclusion_box_dict = FusionLidarFilterRangeMap.get_filter_range_by_car_brand(
+                data_config.car_brand
+            )
+        if not exclusion_box_dict and data_config.lidar_range is None:
+            return None
+        return cls(exclusion_box_dict, data_config.lidar_range)
+
+    def has_filter(self, channel):
+        return channel in self.exclusion_box_dict or self.lidar_range is not None
+
+    def get_keep_mask(self, channel, view, rotation=None, translation=None):
+        """计算一个 lidar 中需要保留的点
+
+        Args:
+            channel (str): lidar channel
+            view (np.ndarray): 结构化的点云数组, 包含 x, y, z
+            rotation (np.ndarray): lidar 到融合坐标系的旋转, None 表示点云已经在融合坐标系下
+            translation (np.ndarray): lidar 到融合坐标系的平移
+
+        Returns:
+            np.ndarray: bool mask, 该 lidar 没有需要应用的过滤时返回 None
+        """
+        if not self.has_filter(channel):
+            return None
+
+        x = view["x"]
+        y = view["y"]
+        z = view["z"]
+        keep_mask = np.ones(view.shape[0], dtype=bool)
+
+        # 1. 排除框, 将点旋转到框的坐标系下判断是否在框内
+        for center, cos_yaw, sin_yaw, half_size in self.exclusion_box_dict.get(channel, []):
+            dx = x - center[0]
+            dy = y - center[1]
+            inside = np.abs(z - center[2]) <= half_size[2]
+            inside &= np.abs(dx * cos_yaw + dy * sin_yaw) <= half_size[0]
+            inside &= np.abs(dy * cos_yaw - dx * sin_yaw) <= half_size[1]
+            keep_mask &= ~inside
+
+        # 2. 融合坐标系下的范围裁剪, 只计算每个轴变换后的坐标, 不需要完整的变换结果
+        if self.lidar_range is not None:
+            for axis in range(3):
+                if rotation is None:
+                    value = (x, y, z)[axis]
+                else:
+                    value = (
+                        rotation[axis, 0] * x
+                        + rotation[axis, 1] * y
+                        + rotation[axis, 2] * z
+                        + translation[axis]
+                    )
+                keep_mask &= value >= self.lidar_range[axis]
+                keep_mask &= value <= self.lidar_range[axis + 3]
+
+        return keep_mask
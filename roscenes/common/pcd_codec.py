@@ -0,0 +1,166 @@
+import io
+import struct
+import threading
+
+import lzf
+import numpy as np
+from pypcd import pypcd
+
+# pcd 点云的压缩方式以及对应的文件后缀
+# - binary : 不压缩, 写入最快, 读取时不需要解压
+# - binary_compressed : pcd 标准的 lzf 按列压缩, 与 pcl 以及原有的输出一致
+# - zstd : 整个 binary 格式的 pcd 文件经 zstd 压缩, 压缩率和解压速度都优于 lzf,
+#   需要安装 zstandard, 读取时需要先解压, 后缀为 .pcd.zst
+PCD_COMPRESSION_SUFFIX_DICT = {
+    "binary": ".pcd",
+    "binary_compressed": ".pcd",
+    "zstd": ".pcd.zst",
+}
+PCD_COMPRESSION_LIST = list(PCD_COMPRESSION_SUFFIX_DICT.keys())
+DEFAULT_PCD_COMPRESSION = "binary_compressed"
+DEFAULT_ZSTD_LEVEL = 3
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# ZstdCompressor 不能被多个线程同时使用, 每个写入线程持有自己的实例
+_zstd_local = threading.local()
+
+
+def import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "zstandard is not installed, please install it by `pip install zstandard` "
+            "(or the zstd extra of this package) "
+            "or use binary / binary_compressed pcd compression"
+        )
+    return zstandard
+
+
+def get_zstd_compressor(level=DEFAULT_ZSTD_LEVEL):
+    compressor_dict = getattr(_zstd_local, "compressor_dict", None)
+    if compressor_dict is None:
+        compressor_dict = _zstd_local.compressor_dict = {}
+    if level not in compressor_dict:
+        compressor_dict[level] = import_zstandard().ZstdCompressor(level=level)
+    return compressor_dict[level]
+
+
+def get_zstd_decompressor():
+    decompressor = getattr(_zstd_local, "decompressor", None)
+    if decompressor is None:
+        decompressor = _zstd_local.decompressor = import_zstandard().ZstdDecompressor()
+    return decompressor
+
+
+def encode_pcd(pc, compression=DEFAULT_PCD_COMPRESSION, zstd_level=DEFAULT_ZSTD_LEVEL):
+    """将点云编码为 pcd 文件的内容
+
+    Note : lzf 压缩后不比原数据小时返回 None, pypcd 此时会写入未压缩的数据但仍然标记为
+        binary_compressed, 读取时会解压失败. 这里退回 binary 格式, 保证文件始终可以被读取
+
+    Args:
+        pc (pypcd.PointCloud): 点云
+        compression (str): 压缩方式, PCD_COMPRESSION_LIST 之一
+        zstd_level (int): zstd 的压缩级别, 只对 zstd 生效
+
+    Returns:
+        bytes: 文件内容
+    """
+    if compression not in PCD_COMPRESSION_LIST:
+        raise ValueError(
+            f"pcd compression should be one of {PCD_COMPRESSION_LIST}, but got {compression}"
+        )
+    if compression == "zstd":
+        return get_zstd_compressor(zstd_level).compress(encode_pcd(pc, "binary"))
+
+    metadata = pc.get_metadata()
+    pc_data = pc.pc_data
+    if compression == "binary_compressed":
+        # binary_compressed 按列存储后压缩
+        uncompressed = b"".join(
+            np.ascontiguousarray(pc_data[name]).tobytes() for name in pc_data.dtype.names
+        )
+        compressed = lzf.compress(uncompressed)
+        if compressed is not None:
+            metadata["data"] = "binary_compressed"
+            header = pypcd.write_header(metadata).encode("utf-8")
+            size = struct.pack("II", len(compressed), len(uncompressed))
+            return b"".join([header, size, compressed])
+
+    metadata["data"] = "binary"
+    header = pypcd.write_header(metadata).encode("utf-8")
+    return header + np.ascontiguousarray(pc_data).tobytes()
+
+
+def decode_pcd(data):
+    """解码 pcd 文件的内容, 支持 PCD_COMPRESSION_LIST 中的所有压缩方式
+
+    Args:
+        data (bytes): 文件内容
+
+    Returns:
+        pypcd.PointCloud: 点云
+    """
+    if data[:4] == ZSTD_MAGIC:
+        data = get_zstd_decompressor().decompress(data)
+    return pypcd.PointCloud.from_fileobj(io.BytesIO(data))
+
+
+def save_pcd(pc, file_path, compression=DEFAULT_PCD_COMPRESSION, zstd_level=DEFAULT_ZSTD_LEVEL):
+    data = encode_pcd(pc, compression, zstd_level)
+    with open(file_path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def load_pcd(file_path):
+    """读取 .pcd 或 .pcd.zst 文件"""
+    with open(file_path, "rb") as f:
+        return decode_pcd(f.read())
+
+
+def is_pcd_file(filename):
+    return filename.endswith(".pcd") or filename.endswith(".pcd.zst")
+
+
+# float32 .bin 点云的前 4 维, 与 save_lidar_bin 写入的格式一致
+BIN_POINT_FIELD_LIST = ["x", "y", "z", "intensity"]
+
+
+def load_bin(file_path, dims=4):
+    """读取 float32 的 .bin 点云(例如 .pcd.bin), 只保留前 4 维 (x, y, z, intensity)
+
+    Args:
+        file_path (str): 文件路径
+        dims (int): 每个点的维度
+
+    Returns:
+        pypcd.PointCloud: 点云
+    """
+    data = np.fromfile(file_path, dtype=np.float32)
+    if data.shape[0] % dims != 0:
+        raise ValueError(f"{file_path} size is not a multiple of {dims} float32")
+    data = data.reshape(-1, dims)
+
+    field_list = BIN_POINT_FIELD_LIST[: min(dims, len(BIN_POINT_FIELD_LIST))]
+    points = np.zeros(data.shape[0], dtype=[(name, np.float32) for name in field_list])
+    for i, name in enumerate(field_list):
+        points[name] = data[:, i]
+    return pypcd.PointCloud.from_array(points)
+
+
+def load_point_cloud(file_path, dims=4):
+    """根据文件后缀读取 .pcd, .pcd.zst 或 float32 的 .bin 点云
+
+    Args:
+        file_path (str): 文件路径
+        dims (int): .bin 文件每个点的维度
+
+    Returns:
+        pypcd.PointCloud: 点云
+    """
+    if file_path.endswith(".bin"):
+        return load_bin(file_path, dims)
+    return load_pcd(file_path)
@@ -4,17 +4,19 @@ from datetime import date
 
 import numpy as np
 import quaternion
-from pypcd import pypcd
 
+from .pcd_codec import load_point_cloud
 
-def get_points_num(filepath, size, position, rotation):
+
+def get_points_num(filepath, size, position, rotation, dims=4):
     """获取当前box中点的数量
 
     Args:
-        filepath (str): pointcloud file path (.pcd, .bin)
+        filepath (str): pointcloud file path (.pcd, .pcd.zst, .pcd.bin)
         size (list): box size [x, y, z]
         position (list): box position [x, y, z]
         rotation (list): box rotation [w, x, y, z]
+        dims (int): .bin 文件每个点的维度
     Returns:
         int: box points number
     """
@@ -23,8 +25,8 @@ def get_points_num(filepath, size, position, rotation):
     if not os.path.exists(filepath):
         return 0
 
-    # load point cloud
-    pc = pypcd.PointCloud.from_path(filepath)
+    # load point cloud, 根据后缀选择解码方式
+    pc = load_point_cloud(filepath, dims)
     point_cloud = pc.to_array()
     point_cloud = point_cloud.reshape(-1, 4)
 
@@ -74,6 +76,7 @@ def get_points_num_dict(
     position_list: list,
     rotation_list: list,
     fake_mode: bool = False,
+    dims: int = 4,
 ):
     """get each box's points number
 
@@ -83,6 +86,7 @@ def get_points_num_dict(
         size_list: list, box size list
         position_list: list, box position list
         rotation_list: list, box rotation list
+        dims: int, .bin 文件每个点的维度
 
     Returns:
         dict: box id and points number dict
@@ -99,8 +103,8 @@ def get_points_num_dict(
             points_num_dict[id_list[i]] = np.random.randint(100, 1000)
         return points_num_dict
 
-    # load point cloud
-    pc = pypcd.PointCloud.from_path(filepath)
+    # load point cloud, 根据后缀选择解码方式
+    pc = load_point_cloud(filepath, dims)
     raw_point_cloud = pc.to_array()
     raw_point_cloud = raw_point_cloud.reshape(-1, 4)
 
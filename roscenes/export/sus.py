@@ -2,12 +2,18 @@ import json
 import os
 import shutil
 
-import cv2
 import numpy as np
 import quaternion
 
 from ..common.calib import NuscenesCalibratedSensor
 from ..common.data_config import DataConfig
+from ..common.image_meta import get_image_size
+from ..common.pcd_codec import load_bin, load_pcd, save_pcd
+from ..nuscenes.packed import (
+    PackedPointCloudReader,
+    export_packed_point_clouds,
+    get_packed_scene_name_list,
+)
 from ..nuscenes.rule import parse_filename
 
 
@@ -93,6 +99,8 @@ class ExportToSUS:
         ]
 
         self.lidar_target_name = "lidar"
+        # .pcd.bin 点云每个点的维度
+        self.lidar_bin_dims = self.config.save_pcd_dims
 
     def export(self):
         # 1. check source valid
@@ -120,6 +128,22 @@ class ExportToSUS:
         )
         ego_pose_path = os.path.join(self.nuscenes_path, "v1.0-all", "ego_pose.json")
 
+        # 点云打包保存时(DataConfig.lidar_file_format 为 packed), 先将关键帧展开为单个文件
+        if not os.path.exists(main_channel_path):
+            for scene_name in get_packed_scene_name_list(
+                self.nuscenes_path, self.main_channel
+            ):
+                # 展开后的 .pcd.bin 的维度以打包时的索引为准
+                self.lidar_bin_dims = PackedPointCloudReader(
+                    self.nuscenes_path, scene_name, self.main_channel
+                ).dims
+                export_packed_point_clouds(
+                    self.nuscenes_path,
+                    scene_name,
+                    self.main_channel,
+                    key_frame_only=True,
+                )
+
         assert os.path.exists(main_channel_path)
         assert os.path.exists(calibrated_sensor_path)
         assert os.path.exists(ego_pose_path)
@@ -193,6 +217,27 @@ class ExportToSUS:
         )
         for filename in os.listdir(lidar_folder_path):
             source_file_path = os.path.join(lidar_folder_path, filename)
+            # 标注工具不能读取 zstd 压缩的 pcd, 解压为 binary 格式的 .pcd
+            if filename.endswith(".pcd.zst"):
+                target_file_path = os.path.join(
+                    target_lidar_folder_path, filename[: -len(".zst")]
+                )
+                if not os.path.exists(target_file_path):
+                    save_pcd(load_pcd(source_file_path), target_file_path, "binary")
+                continue
+            # 标注工具也不能读取 float32 的 .pcd.bin (lidar_file_format 为 bin 或 packed),
+            # 同样转换为 binary 格式的 .pcd
+            if filename.endswith(".pcd.bin"):
+                target_file_path = os.path.join(
+                    target_lidar_folder_path, filename[: -len(".bin")]
+                )
+                if not os.path.exists(target_file_path):
+                    save_pcd(
+                        load_bin(source_file_path, self.lidar_bin_dims),
+                        target_file_path,
+                        "binary",
+                    )
+                continue
             target_file_path = os.path.join(target_lidar_folder_path, filename)
             if os.path.exists(target_file_path):
                 continue
@@ -206,14 +251,10 @@ class ExportToSUS:
         )
         if not os.path.exists(target_calib_folder_path):
             os.makedirs(target_calib_folder_path)
-        nuscenes_calibrated_sensor = NuscenesCalibratedSensor(calibrated_sensor_path)
+        calib_registry = NuscenesCalibratedSensor(calibrated_sensor_path).calib_registry
         for camera_channel in self.camera_channel_list:
-            camera_calib_info = nuscenes_calibrated_sensor.get_calib_info(
-                camera_channel
-            )
-
-            extrinsic = camera_calib_info.get_extrinsic().flatten().tolist()
-            intrinsic = camera_calib_info.get_intrinsic().flatten().tolist()
+            extrinsic = calib_registry.get_extrinsic(camera_channel).flatten().tolist()
+            intrinsic = calib_registry.get_intrinsic(camera_channel).flatten().tolist()
 
             json_dict = {
                 "extrinsic": extrinsic,
@@ -415,7 +456,7 @@ def generate_camera_config(
         image_folder_path = rename_image_folder_path_list[i]
         image_file_path_list = os.listdir(image_folder_path)
         first_image_file_path = os.path.join(image_folder_path, image_file_path_list[0])
-        (image_height, image_width, _) = cv2.imread(first_image_file_path).shape
+        (image_width, image_height) = get_image_size(first_image_file_path)
 
         camera["height"] = image_height
         camera["width"] = image_width
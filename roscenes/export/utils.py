@@ -4,7 +4,6 @@ import os
 import shutil
 from functools import partial
 
-import cv2
 import numpy as np
 import yaml
 
@@ -13,6 +12,7 @@ import yaml
 from rich.progress import track
 from scipy.spatial.transform import Rotation as R
 
+from ..common.image_meta import get_image_size
 from ..nuscenes.rule import parse_filename
 
 
@@ -291,7 +291,7 @@ def export_scene_to_x(
         first_image_folder_path, first_image_file_path_list[0]
     )
 
-    (image_height, image_width, _) = cv2.imread(first_image_file_path).shape
+    (image_width, image_height) = get_image_size(first_image_file_path)
     # generate camera config template
     camera_config_list = generate_camera_config(
         calibrated_sensor_path,
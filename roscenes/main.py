@@ -57,6 +57,14 @@ def main():
     merge_parser = subparsers.add_parser("merge", help="merge to nuscenes format")
     merge_parser.set_defaults(func=merge_main)
 
+    # benchmark
+    from .benchmark import main as benchmark_main
+
+    benchmark_parser = subparsers.add_parser(
+        "benchmark", help="benchmark slice pipeline with synthetic bag"
+    )
+    benchmark_parser.set_defaults(func=benchmark_main)
+
 
     args, unknown = parser.parse_known_args()
 
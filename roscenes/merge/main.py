@@ -1,6 +1,8 @@
 from .merge_cml import Merge
 from argparse import ArgumentParser, Action
 
+from ..common.json_writer import DEFAULT_JSON_INDENT
+
 
 class ParseList(Action):
     def __call__(self, parser, namespace, values, option_string=None):
@@ -22,6 +24,7 @@ def main(args, unknown):
     parser.add_argument("-o", "--target_nuscenes_path", type=str, required=True)
     parser.add_argument("-t", "--target_type", type=str, required=True)
     parser.add_argument("-c", "--main_channel", type=str, required=True)
+    parser.add_argument("--compact_json", action="store_true")
     args, unknown = parser.parse_known_args(unknown)
 
     # debug
@@ -36,5 +39,6 @@ def main(args, unknown):
         target_nuscenes_path=args.target_nuscenes_path,
         target_type=args.target_type,
         main_channel=args.main_channel,
+        json_indent=None if args.compact_json else DEFAULT_JSON_INDENT,
     )
     merge.merge()
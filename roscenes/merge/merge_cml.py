@@ -3,11 +3,17 @@ import os
 import subprocess
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from pypcd import pypcd
 from rich.progress import track
 
+from ..common.json_writer import DEFAULT_JSON_INDENT, save_json_table
 from ..common.nuscenes_check import nuscenes_check
+from ..common.pcd_codec import is_pcd_file, load_pcd
 from ..common.scene_check import scene_check
+from ..nuscenes.packed import PACKED_FOLDER
+
+# 合并后的 json 表与原有的 json.dump(data, f, indent=4) 保持一致, 非 ascii 字符会被转义,
+# 与切片时的输出(ensure_ascii=False)不同. orjson 不支持转义, 所以合并时只使用 json 序列化
+MERGE_JSON_ENSURE_ASCII = True
 
 # def scene_check(scene_path):
 #     # 1. check scene_path should be valid
@@ -31,6 +37,13 @@ from ..common.scene_check import scene_check
 #     return True
 
 
+def get_bin_filename(pcd_filename):
+    """pcd 文件转换为 .bin 后的文件名, xxx.pcd 和 xxx.pcd.zst 都转换为 xxx.pcd.bin"""
+    if pcd_filename.endswith(".zst"):
+        pcd_filename = pcd_filename[: -len(".zst")]
+    return pcd_filename + ".bin"
+
+
 class Merge:
     """数据融合"""
 
@@ -41,12 +54,15 @@ class Merge:
         target_type: str,
         main_channel: str,
         max_workers: int = 8,
+        json_indent=DEFAULT_JSON_INDENT,
     ):
         self.source_scene_path_list = source_scene_path_list
         self.target_nuscenes_path = target_nuscenes_path
         self.target_type = target_type
         self.main_channel = main_channel  # used to convert pcd to bin
         self.max_workers = max_workers
+        # 合并后的 json 表的缩进, None 表示紧凑格式
+        self.json_indent = json_indent
 
         # target type should be v1.0-trainval or v1.0-test
         if self.target_type not in ["v1.0-trainval", "v1.0-test"]:
@@ -104,8 +120,15 @@ class Merge:
         # Note : 因为 mmdet3d 等平台仅支持 .bin 文件
         # 所以需要将 .pcd 文件改写为 .bin 文件
         # 同时也同步改写 sample_data.json 中的点云文件名称
+        # 切片时已经保存为 .bin 格式(DataConfig.lidar_file_format)的场景不需要转换
         print("3. convert pcd to bin")
-        self.pcd2bin()
+        if any(
+            self.has_pcd_file(scene_path, self.main_channel)
+            for scene_path in self.source_scene_path_list
+        ):
+            self.pcd2bin()
+        else:
+            print("     all scenes are saved as .bin, skip")
 
     def valid_check(self):
         # 1. check all source_scene_path_list should be valid
@@ -149,6 +172,10 @@ class Merge:
         if os.path.exists(os.path.join(input_path, "sweeps")):
             cmd = f"rsync -r {input_path}/sweeps/ {output_path}/sweeps/"
             subprocess.run(cmd, shell=True)
+        # 打包的点云(DataConfig.lidar_file_format 为 packed), 文件名带有场景名称, 直接合并到同一个文件夹
+        if os.path.exists(os.path.join(input_path, PACKED_FOLDER)):
+            cmd = f"rsync -r {input_path}/{PACKED_FOLDER}/ {output_path}/{PACKED_FOLDER}/"
+            subprocess.run(cmd, shell=True)
 
     def merge_all_jsons(
         self,
@@ -190,11 +217,19 @@ class Merge:
         for filename in track(input_json_file_dict):
             input_file_list = input_json_file_dict[filename]
             output_file = os.path.join(output_path, merge_type, filename)
-            self.merge_nuscenes_jsons(input_file_list, output_file)
+            self.merge_nuscenes_jsons(
+                input_file_list,
+                output_file,
+                indent=self.json_indent,
+            )
 
         # 4. merge map.json
         map_json_output_file = os.path.join(output_path, merge_type, "map.json")
-        self.merge_map_jsons(map_json_file_list, map_json_output_file)
+        self.merge_map_jsons(
+            map_json_file_list,
+            map_json_output_file,
+            indent=self.json_indent,
+        )
 
         return True
 
@@ -218,7 +253,11 @@ class Merge:
         output_file_list = sorted(output_file_list)
 
         for input_file, output_file in zip(input_file_list, output_file_list):
-            self.merge_nuscenes_json(input_file, output_file)
+            self.merge_nuscenes_json(
+                input_file,
+                output_file,
+                indent=self.json_indent,
+            )
 
         # 3. 合并map.json
         # merge map.json 与 其他json文件不同,
@@ -226,7 +265,22 @@ class Merge:
         # 所以需要单独处理
         input_file = os.path.join(input_path, "v1.0-all", "map.json")
         output_file = os.path.join(output_path, merge_type, "map.json")
-        self.merge_map_json(input_file, output_file)
+        self.merge_map_json(
+            input_file,
+            output_file,
+            indent=self.json_indent,
+        )
+
+    @staticmethod
+    def has_pcd_file(scene_path, main_channel):
+        """场景中的融合点云是否保存为 .pcd (或 zstd 压缩的 .pcd.zst) 格式"""
+        for folder in ["samples", "sweeps"]:
+            channel_path = os.path.join(scene_path, folder, main_channel)
+            if not os.path.exists(channel_path):
+                continue
+            if any(is_pcd_file(filename) for filename in os.listdir(channel_path)):
+                return True
+        return False
 
     def pcd2bin(self):
         """将pcd文件转换为bin文件"""
@@ -244,9 +298,7 @@ class Merge:
                 for filename in samples_filename_list
             ]
             samples_pcd_filepath_list = [
-                filepath
-                for filepath in samples_filepath_list
-                if filepath.endswith(".pcd")
+                filepath for filepath in samples_filepath_list if is_pcd_file(filepath)
             ]
         sweeps_path = os.path.join(
             self.target_nuscenes_path, "sweeps", self.main_channel
@@ -257,18 +309,16 @@ class Merge:
                 os.path.join(sweeps_path, filename) for filename in sweeps_filename_list
             ]
             sweeps_pcd_filepath_list = [
-                filepath
-                for filepath in sweeps_filepath_list
-                if filepath.endswith(".pcd")
+                filepath for filepath in sweeps_filepath_list if is_pcd_file(filepath)
             ]
 
         pcd_filepath_list = samples_pcd_filepath_list + sweeps_pcd_filepath_list
 
         def replace_pcd_to_bin(pcd_filepath):
-            pc = pypcd.PointCloud.from_path(pcd_filepath)
+            pc = load_pcd(pcd_filepath)
             # no need remove .pcd file
             # os.remove(pcd_filepath)
-            bin_filepath = pcd_filepath + ".bin"
+            bin_filepath = get_bin_filename(pcd_filepath)
 
             pc.save_bin(bin_filepath, "xyzi")
 
@@ -286,12 +336,16 @@ class Merge:
 
             # 3.2 修改 sample_data.json 中的点云文件名称 为其加上后缀.bin
             for item in sample_data:
-                if item["filename"].endswith(".pcd"):
-                    item["filename"] += ".bin"
+                if is_pcd_file(item["filename"]):
+                    item["filename"] = get_bin_filename(item["filename"])
 
             # 3.3 写入 sample_data.json
-            with open(sample_data_filepath, "w") as f:
-                json.dump(sample_data, f, indent=4)
+            save_json_table(
+                sample_data,
+                sample_data_filepath,
+                indent=self.json_indent,
+                ensure_ascii=MERGE_JSON_ENSURE_ASCII,
+            )
 
         trainval_sample_data_filepath = os.path.join(
             self.target_nuscenes_path, "v1.0-trainval", "sample_data.json"
@@ -306,7 +360,11 @@ class Merge:
             update_sample_data(test_sample_data_filepath)
 
     @staticmethod
-    def merge_nuscenes_json(input_file, output_file):
+    def merge_nuscenes_json(
+        input_file,
+        output_file,
+        indent=DEFAULT_JSON_INDENT,
+    ):
         """合并nuscenes的json文件
 
         所有的json文件中的内容都是list,每一个list中的元素都是一个dict,
@@ -315,6 +373,7 @@ class Merge:
         Args:
             input_file (str): 输入文件的路径
             output_file (str): 输出文件的路径
+            indent (int): 输出文件的缩进, None 表示紧凑格式
         """
 
         # 1. 文件路径检查
@@ -343,11 +402,19 @@ class Merge:
         output_data = list(output_data_dict.values())
 
         # 6. 格式化写入输出文件
-        with open(output_file, "w") as f:
-            json.dump(output_data, f, indent=4)
+        save_json_table(
+            output_data,
+            output_file,
+            indent=indent,
+            ensure_ascii=MERGE_JSON_ENSURE_ASCII,
+        )
 
     @staticmethod
-    def merge_nuscenes_jsons(input_files: list, output_file: str):
+    def merge_nuscenes_jsons(
+        input_files: list,
+        output_file: str,
+        indent=DEFAULT_JSON_INDENT,
+    ):
         """多个json文件合并为一个nuscenes的json文件
 
         所有的json文件中的内容都是list,每一个list中的元素都是一个dict,
@@ -356,6 +423,7 @@ class Merge:
         Args:
             input_files (list): 多个输入文件的路径
             output_file (str): 输出文件的路径
+            indent (int): 输出文件的缩进, None 表示紧凑格式
         """
 
         # 1. 文件路径检查
@@ -384,11 +452,19 @@ class Merge:
         output_data = list(output_data_dict.values())
 
         # 5. 格式化写入输出文件
-        with open(output_file, "w") as f:
-            json.dump(output_data, f, indent=4)
+        save_json_table(
+            output_data,
+            output_file,
+            indent=indent,
+            ensure_ascii=MERGE_JSON_ENSURE_ASCII,
+        )
 
     @staticmethod
-    def merge_map_json(input_file, output_file):
+    def merge_map_json(
+        input_file,
+        output_file,
+        indent=DEFAULT_JSON_INDENT,
+    ):
         """合并nuscenes的map.json文件
 
         所有的json文件中的内容都是list,每一个list中的元素都是一个dict,
@@ -400,6 +476,7 @@ class Merge:
         Args:
             input_file (str): 输入文件的路径
             output_file (str): 输出文件的路径
+            indent (int): 输出文件的缩进, None 表示紧凑格式
         """
 
         # 1. 文件路径检查
@@ -446,11 +523,19 @@ class Merge:
             item["log_tokens"] = list(set(item["log_tokens"]))
 
         # 4. 格式化写入输出文件
-        with open(output_file, "w") as f:
-            json.dump(output_data, f, indent=4)
+        save_json_table(
+            output_data,
+            output_file,
+            indent=indent,
+            ensure_ascii=MERGE_JSON_ENSURE_ASCII,
+        )
 
     @staticmethod
-    def merge_map_jsons(input_file_list: list, output_file: str):
+    def merge_map_jsons(
+        input_file_list: list,
+        output_file: str,
+        indent=DEFAULT_JSON_INDENT,
+    ):
         """合并nuscenes的map.json文件
 
         所有的json文件中的内容都是list,每一个list中的元素都是一个dict,
@@ -462,6 +547,7 @@ class Merge:
         Args:
             input_file (str): 输入文件的路径
             output_file (str): 输出文件的路径
+            indent (int): 输出文件的缩进, None 表示紧凑格式
         """
 
         # 1. 文件路径检查
@@ -496,5 +582,9 @@ class Merge:
             item["log_tokens"] = list(set(item["log_tokens"]))
 
         # 6. write to output file
-        with open(output_file, "w") as f:
-            json.dump(output_data, f, indent=4)
+        save_json_table(
+            output_data,
+            output_file,
+            indent=indent,
+            ensure_ascii=MERGE_JSON_ENSURE_ASCII,
+        )
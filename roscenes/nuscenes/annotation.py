@@ -1,6 +1,16 @@
 import os
 
+import numpy as np
+
+from ..common.json_writer import DEFAULT_JSON_BACKEND, DEFAULT_JSON_INDENT
 from . import rule
+from .columnar import (
+    CategoricalColumn,
+    iter_number_matrix_column,
+    iter_optional_int_column,
+    number_matrix_column,
+    optional_int_column,
+)
 from .utils import save_to_json
 
 
@@ -11,12 +21,12 @@ class SceneTable:
         # Note : 一个scene只有一个Scene记录
         self.scene_list = [Scene(self.car_id, self.scene_id, samples_timestamp_list)]
 
-    def sequence_to_json(self, path, filename):
-        result = []
-        for scene in self.scene_list:
-            result.append(scene.sequence_to_json())
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+    ):
+        result = (scene.sequence_to_json() for scene in self.scene_list)
 
-        save_to_json(result, path, filename)
+        save_to_json(result, path, filename, indent=indent, backend=backend)
 
 
 class Scene:
@@ -91,12 +101,12 @@ class InstanceTable:
                 )
             )
 
-    def sequence_to_json(self, path, filename):
-        result = []
-        for instance in self.instance_list:
-            result.append(instance.sequence_to_json())
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+    ):
+        result = (instance.sequence_to_json() for instance in self.instance_list)
 
-        save_to_json(result, path, filename)
+        save_to_json(result, path, filename, indent=indent, backend=backend)
 
 
 class Instance:
@@ -157,119 +167,122 @@ class Lidarseg:
 
 
 class SampleAnnotationTable:
-    def __init__(self, sample_annotation_info_list):
-        self.sample_annotation_list = []
-
-        for sample_annotation_info in sample_annotation_info_list:
-            sample_annotation = SampleAnnotation(
-                sample_annotation_info["scene_name"],
-                sample_annotation_info["timestamp"],
-                sample_annotation_info["object_id"],
-                sample_annotation_info["track_id"],
-                sample_annotation_info["attribute_name_list"],
-                sample_annotation_info["visibility"],
-                sample_annotation_info["translation"],
-                sample_annotation_info["size"],
-                sample_annotation_info["rotation"],
-                sample_annotation_info["num_lidar_pts"],
-                sample_annotation_info["pre_timestamp"],
-                sample_annotation_info["pre_object_id"],
-                sample_annotation_info["next_timestamp"],
-                sample_annotation_info["next_object_id"],
-            )
-            self.sample_annotation_list.append(sample_annotation)
-
-    def sequence_to_json(self, path, filename):
-        result = []
-        for sample_annotation in self.sample_annotation_list:
-            result.append(sample_annotation.sequence_to_json())
+    """SampleAnnotationTable 是一个 SampleAnnotation 的集合
+    token : uuid(${car_id}-${scene_id}-sample_annotation-${timestamp}-${object_id})
 
-        save_to_json(result, path, filename)
+    Note : 按列存储, 时间戳, object_id, 数量等保存在 numpy 数组中, translation, size, rotation
+        分别为 (N, 3), (N, 3), (N, 4) 的 float64 数组, 并记录原始值中的整数位置, 序列化时还原为 int,
+        scene_name, track_id, attribute 和 visibility 只保存编码,
+        所有的 token 以及每一行的 dict 只在序列化时生成
+    """
 
+    def __init__(self, sample_annotation_info_list):
+        info_list = sample_annotation_info_list
+        row_num = len(info_list)
 
-class SampleAnnotation:
-    """_summary_
-    token : uuid(${car_id}-${scene_id}-sample_annotation-${timestamp}-${object_id})
-    """
+        self.scene_names = CategoricalColumn(info["scene_name"] for info in info_list)
+        self.track_ids = CategoricalColumn(info["track_id"] for info in info_list)
+        self.attribute_names = CategoricalColumn(
+            tuple(info["attribute_name_list"]) for info in info_list
+        )
+        self.visibilities = CategoricalColumn(info["visibility"] for info in info_list)
 
-    def __init__(
-        self,
-        scene_name,
-        timestamp,
-        object_id,
-        track_id,
-        attribute_name_list,
-        visibility,
-        translation,
-        size,
-        rotation,
-        num_lidar_pts,
-        pre_timestamp,
-        pre_object_id,
-        next_timestamp,
-        next_object_id,
-    ):
-        self.scene_name = scene_name
-        self.timestamp = timestamp
-        self.object_id = object_id
-        self.track_id = track_id
-        self.attribute_name_list = attribute_name_list
-        self.visibility = visibility
+        self.timestamps = np.fromiter(
+            (info["timestamp"] for info in info_list), dtype=np.int64, count=row_num
+        )
+        self.object_ids = np.fromiter(
+            (info["object_id"] for info in info_list), dtype=np.int64, count=row_num
+        )
+        self.num_lidar_pts = np.fromiter(
+            (info["num_lidar_pts"] for info in info_list),
+            dtype=np.int64,
+            count=row_num,
+        )
 
-        self.translation = translation
-        self.size = size
-        self.rotation = rotation
+        self.translations, self.translation_int_mask = number_matrix_column(
+            [info["translation"] for info in info_list], 3
+        )
+        self.sizes, self.size_int_mask = number_matrix_column(
+            [info["size"] for info in info_list], 3
+        )
+        self.rotations, self.rotation_int_mask = number_matrix_column(
+            [info["rotation"] for info in info_list], 4
+        )
 
-        self.num_lidar_pts = num_lidar_pts
-        self.pre_timestamp = pre_timestamp
-        self.pre_object_id = pre_object_id
-        self.next_timestamp = next_timestamp
-        self.next_object_id = next_object_id
+        # 同一个 track 中的前一帧和后一帧, 没有时为 None
+        self.pre_timestamps, self.has_pre_timestamps = optional_int_column(
+            [info["pre_timestamp"] for info in info_list]
+        )
+        self.pre_object_ids, self.has_pre_object_ids = optional_int_column(
+            [info["pre_object_id"] for info in info_list]
+        )
+        self.next_timestamps, self.has_next_timestamps = optional_int_column(
+            [info["next_timestamp"] for info in info_list]
+        )
+        self.next_object_ids, self.has_next_object_ids = optional_int_column(
+            [info["next_object_id"] for info in info_list]
+        )
 
-        self.token = rule.generate_sample_annotation_token(
-            self.scene_name,
+    def iter_rows(self):
+        row_iter = zip(
+            self.scene_names.iter_values(),
+            self.timestamps.tolist(),
+            self.object_ids.tolist(),
+            self.track_ids.iter_values(),
+            self.attribute_names.iter_values(),
+            self.visibilities.iter_values(),
+            iter_number_matrix_column(self.translations, self.translation_int_mask),
+            iter_number_matrix_column(self.sizes, self.size_int_mask),
+            iter_number_matrix_column(self.rotations, self.rotation_int_mask),
+            self.num_lidar_pts.tolist(),
+            iter_optional_int_column(self.pre_timestamps, self.has_pre_timestamps),
+            iter_optional_int_column(self.pre_object_ids, self.has_pre_object_ids),
+            iter_optional_int_column(self.next_timestamps, self.has_next_timestamps),
+            iter_optional_int_column(self.next_object_ids, self.has_next_object_ids),
+        )
+        for (
+            scene_name,
             timestamp,
             object_id,
-        )
-        # debug
-        if not self.token:
-            print("scene_name", self.scene_name)
-            print("timestamp", timestamp)
-            print("object_id", object_id)
-            print("token", self.token)
-
-        self.sample_token = rule.generate_sample_token(self.scene_name, timestamp)
-        self.instance_token = rule.generate_instance_token(self.scene_name, track_id)
-        self.attribute_tokens = [
-            rule.generate_attribute_token(attribute_name)
-            for attribute_name in attribute_name_list
-        ]
-        self.visibility_token = rule.generate_visibility_token(visibility)
-
-        self.pre_token = rule.generate_sample_annotation_token(
-            self.scene_name,
+            track_id,
+            attribute_name_tuple,
+            visibility,
+            translation,
+            size,
+            rotation,
+            num_lidar_pts,
             pre_timestamp,
             pre_object_id,
-        )
-        self.next_token = rule.generate_sample_annotation_token(
-            self.scene_name,
             next_timestamp,
             next_object_id,
+        ) in row_iter:
+            yield {
+                "token": rule.generate_sample_annotation_token(
+                    scene_name, timestamp, object_id
+                ),
+                "sample_token": rule.generate_sample_token(scene_name, timestamp),
+                "instance_token": rule.generate_instance_token(scene_name, track_id),
+                "attribute_tokens": [
+                    rule.generate_attribute_token(attribute_name)
+                    for attribute_name in attribute_name_tuple
+                ],
+                "visibility_token": rule.generate_visibility_token(visibility),
+                "translation": translation,
+                "size": size,
+                "rotation": rotation,
+                "num_lidar_pts": num_lidar_pts,
+                "num_radar_pts": 0,
+                "prev": rule.generate_sample_annotation_token(
+                    scene_name, pre_timestamp, pre_object_id
+                ),
+                "next": rule.generate_sample_annotation_token(
+                    scene_name, next_timestamp, next_object_id
+                ),
+            }
+
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+    ):
+        save_to_json(
+            self.iter_rows(), path, filename, indent=indent, backend=backend
         )
-        self.result = {
-            "token": self.token,
-            "sample_token": self.sample_token,
-            "instance_token": self.instance_token,
-            "attribute_tokens": self.attribute_tokens,
-            "visibility_token": self.visibility_token,
-            "translation": self.translation,
-            "size": self.size,
-            "rotation": self.rotation,
-            "num_lidar_pts": self.num_lidar_pts,
-            "num_radar_pts": 0,
-            "prev": self.pre_token,
-            "next": self.next_token,
-        }
-
-    def sequence_to_json(self):
-        return self.result
@@ -0,0 +1,285 @@
+import genpy
+import rosbag
+
+from .utils import ros_timestamp_to_us
+
+
+class RawMessage:
+    """bag 中尚未反序列化的原始消息, 只有在第一次调用 deserialize 时才会反序列化
+
+    Args:
+        topic (str): topic 名称
+        timestamp (int): 时间戳(us)
+        data (bytes): 序列化后的消息内容
+        pytype (type): 消息对应的 python 类型
+        msg: 已经反序列化好的消息, 用于包装不在 bag 中的消息
+    """
+
+    __slots__ = ("topic", "timestamp", "data", "pytype", "_msg")
+
+    def __init__(self, topic, timestamp, data=None, pytype=None, msg=None):
+        self.topic = topic
+        self.timestamp = timestamp
+        self.data = data
+        self.pytype = pytype
+        self._msg = msg
+
+    def deserialize(self):
+        if self._msg is None:
+            msg = self.pytype()
+            msg.deserialize(self.data)
+            self._msg = msg
+            # 反序列化后原始数据不再需要, 及时释放
+            self.data = None
+        return self._msg
+
+
+class RosbagIndexAdapter:
+    """rosbag 索引接口的适配层, BagIndexReader 对 rosbag 私有接口的访问全部集中在这里
+
+    基于 ROS noetic 的 rosbag 1.15 (rosbag/bag.py) 编写, 依赖以下私有接口:
+    - Bag._get_connections(topics=...)
+    - Bag._get_entries(connections, start_time, end_time), entry 包含 time 以及
+        chunk_pos + offset (bag v2.0) 或 offset (bag v1.2)
+    - Bag._read_message(position, raw=True).message 为
+        (datatype, data, md5sum, position, pytype)
+
+    rosbag 中没有这些接口时退回公开的 Bag.read_messages(topics, start_time, end_time, raw=True):
+    建立索引时需要顺序读取一遍窗口内的消息(只保留时间戳), 读取单条消息时按时间戳定位,
+    结果一致但速度较慢
+
+    Args:
+        bag (rosbag.Bag): 已经打开的 bag
+    """
+
+    PRIVATE_API_LIST = ["_get_connections", "_get_entries", "_read_message"]
+
+    def __init__(self, bag):
+        self.bag = bag
+        self.private_api_flag = all(
+            hasattr(bag, name) for name in self.PRIVATE_API_LIST
+        )
+        if not self.private_api_flag:
+            print(
+                "rosbag private index api is not available, "
+                "fall back to Bag.read_messages, slicing will be slower"
+            )
+
+    def get_entry_list(self, topic, start_time=None, end_time=None):
+        """获取 topic 在时间窗口内所有消息的时间戳和位置, 不解码消息的 payload
+
+        Args:
+            topic (str): topic 名称
+            start_time (genpy.Time): 时间窗口的起始时间, None 表示不限制
+            end_time (genpy.Time): 时间窗口的结束时间, None 表示不限制
+
+        Returns:
+            list: 按时间顺序排列的 (ros_time, position), topic 不在 bag 中时返回 None
+        """
+        if self.private_api_flag:
+            connections = list(self.bag._get_connections(topics=[topic]))
+            if not connections:
+                return None
+            return [
+                (entry.time, self._get_entry_position(entry))
+                for entry in self.bag._get_entries(connections, start_time, end_time)
+            ]
+
+        if topic not in self.bag.get_type_and_topic_info(topic_filters=[topic]).topics:
+            return None
+        # 公开接口中没有消息位置, 以时间戳作为位置, 读取时按时间戳定位
+        return [
+            (t, t)
+            for _, _, t in self.bag.read_messages(
+                topics=[topic], start_time=start_time, end_time=end_time, raw=True
+            )
+        ]
+
+    @staticmethod
+    def _get_entry_position(entry):
+        # bag v2.0 的索引由 chunk 位置和 chunk 内偏移共同确定, v1.2 只有文件偏移
+        if hasattr(entry, "chunk_pos"):
+            return (entry.chunk_pos, entry.offset)
+        return entry.offset
+
+    def read_raw(self, topic, position):
+        """读取一条消息的原始数据
+
+        Args:
+            topic (str): topic 名称
+            position: get_entry_list 返回的位置
+
+        Returns:
+            tuple: (data, pytype)
+        """
+        if self.private_api_flag:
+            raw = self.bag._read_message(position, raw=True).message
+        else:
+            # 同一时间戳有多条消息时与索引一致, 取最后一条
+            raw = None
+            for _, raw, _ in self.bag.read_messages(
+                topics=[topic], start_time=position, end_time=position, raw=True
+            ):
+                pass
+            if raw is None:
+                raise RuntimeError(f"no message of {topic} at {position}")
+
+        # raw 模式下 message 为 (datatype, data, md5sum, position, pytype)
+        if len(raw) != 5 or not hasattr(raw[4], "deserialize"):
+            raise RuntimeError(
+                "unexpected raw message layout from rosbag, "
+                "expect (datatype, data, md5sum, position, pytype) as in rosbag 1.15"
+            )
+        return raw[1], raw[4]
+
+
+class BagIndexReader:
+    """基于 bag 索引的两阶段读取器
+
+    - 第一阶段: 只读取 bag 中的 connection/chunk 索引, 为每个 topic 构建 时间戳 -> 消息位置 的索引,
+        不解码任何消息的 payload
+    - 第二阶段: 帧同步完成后, 只按需 seek 读取并反序列化真正被使用的消息
+
+    这样峰值内存只与当前处理的帧有关, 而与 bag 的大小无关
+
+    如果指定了 start_time/end_time, 时间窗口会下推到 bag 的索引读取中, 窗口外的 chunk
+    既不会建立索引也不会被读取
+
+    Args:
+        bag_path (str): bag包路径
+        topic_list (list): 需要建立索引的 topic 列表
+        start_time (int): 时间窗口的起始时间(us), None 表示不限制
+        end_time (int): 时间窗口的结束时间(us), None 表示不限制
+        unwindowed_topic_list (list): 不受时间窗口限制的 topic, 例如 /tf_static
+    """
+
+    def __init__(
+        self,
+        bag_path,
+        topic_list,
+        start_time=None,
+        end_time=None,
+        unwindowed_topic_list=("/tf_static",),
+    ):
+        self.bag_path = bag_path
+        self.topic_list = topic_list
+        self.start_time = start_time
+        self.end_time = end_time
+        self.unwindowed_topic_list = list(unwindowed_topic_list)
+
+        try:
+            self.bag = rosbag.Bag(bag_path, "r")
+        except rosbag.bag.ROSBagException as e:
+            raise RuntimeError(f"Failed to open bag file {bag_path}: {str(e)}")
+
+        self.adapter = RosbagIndexAdapter(self.bag)
+
+        # 不在 bag 中, 但需要参与帧同步的消息 (例如缺失 camera 时填充的默认图片)
+        self.injected_msg_dict = {}
+
+        # topic -> {timestamp_us: position}
+        self.index_by_topic = self._build_index()
+
+    def _build_index(self):
+        """读取 bag 的索引信息, 构建每个 topic 的时间戳索引
+
+        Returns:
+            dict: 以 topic 为 key, value 为 {timestamp_us: position} 的字典,
+                bag 中不存在的 topic 不会出现在字典中
+        """
+        window_start_time = self.us_to_ros_timestamp(self.start_time)
+        window_end_time = self.us_to_ros_timestamp(self.end_time)
+
+        index_by_topic = {}
+        for topic in self.topic_list:
+            if topic in self.unwindowed_topic_list:
+                entry_list = self.adapter.get_entry_list(topic)
+            else:
+                entry_list = self.adapter.get_entry_list(
+                    topic, window_start_time, window_end_time
+                )
+            if entry_list is None:
+                continue
+
+            index_by_topic[topic] = {
+                ros_timestamp_to_us(t): position for t, position in entry_list
+            }
+
+        return index_by_topic
+
+    @staticmethod
+    def us_to_ros_timestamp(timestamp_us):
+        if timestamp_us is None:
+            return None
+        secs, usecs = divmod(int(timestamp_us), 1000000)
+        return genpy.Time(secs, usecs * 1000)
+
+    def has_topic(self, topic):
+        return topic in self.index_by_topic
+
+    def get_topic_list(self):
+        """获取 bag 中真实存在的 topic 列表"""
+        return list(self.index_by_topic.keys())
+
+    def get_timestamp_list(self, topic):
+        """获取指定 topic 排序后的时间戳列表(us), topic 不存在时返回空列表"""
+        if topic not in self.index_by_topic:
+            return []
+        return sorted(self.index_by_topic[topic].keys())
+
+    def inject_message(self, topic, timestamp, msg):
+        """注入一条不在 bag 中的消息, 使其可以像 bag 中的消息一样被同步和读取"""
+        if topic not in self.index_by_topic:
+            self.index_by_topic[topic] = {}
+        self.index_by_topic[topic][timestamp] = None
+        self.injected_msg_dict[(topic, timestamp)] = msg
+
+    def read_raw_message(self, topic, timestamp):
+        """按 topic 和时间戳读取一条消息, 但不进行反序列化
+
+        Args:
+            topic (str): topic 名称
+            timestamp (int): 时间戳(us), 必须是索引中存在的时间戳
+
+        Returns:
+            RawMessage: 原始消息, 调用 deserialize 后才会得到真正的 ros msg
+        """
+        if (topic, timestamp) in self.injected_msg_dict:
+            msg = self.injected_msg_dict[(topic, timestamp)]
+            return RawMessage(topic, timestamp, msg=msg)
+
+        position = self.index_by_topic[topic][timestamp]
+        data, pytype = self.adapter.read_raw(topic, position)
+        return RawMessage(topic, timestamp, data=data, pytype=pytype)
+
+    def read_message(self, topic, timestamp):
+        """按 topic 和时间戳读取并反序列化一条消息
+
+        Args:
+            topic (str): topic 名称
+            timestamp (int): 时间戳(us), 必须是索引中存在的时间戳
+
+        Returns:
+            msg: 反序列化后的 ros msg
+        """
+        return self.read_raw_message(topic, timestamp).deserialize()
+
+    def read_messages(self, topic):
+        """按时间顺序读取指定 topic 的所有消息, 仅用于 /tf_static 这类很小的 topic
+
+        Note : 同一时间戳可能有多条消息(例如多条 /tf_static), 所以这里不经过时间戳索引
+
+        Yields:
+            tuple: (timestamp_us, msg)
+        """
+        for _, msg, t in self.bag.read_messages(topics=[topic]):
+            yield ros_timestamp_to_us(t), msg
+
+    def close(self):
+        self.bag.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
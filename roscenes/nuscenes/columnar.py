@@ -0,0 +1,101 @@
+import numpy as np
+
+
+class CategoricalColumn:
+    """重复值很多的列(例如 channel, fileformat, attribute 列表), 每个不同的值只保存一次,
+    每一行只保存一个整数编码
+
+    Args:
+        value_iter (iterable): 每一行的值, 值需要是可哈希的
+    """
+
+    def __init__(self, value_iter=()):
+        self.value_list = []
+        self._code_dict = {}
+        self.codes = np.fromiter(
+            (self.encode(value) for value in value_iter), dtype=np.int32
+        )
+
+    def encode(self, value):
+        code = self._code_dict.get(value)
+        if code is None:
+            code = len(self.value_list)
+            self._code_dict[value] = code
+            self.value_list.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.codes)
+
+    def iter_values(self):
+        value_list = self.value_list
+        for code in self.codes.tolist():
+            yield value_list[code]
+
+
+def optional_int_column(value_list):
+    """将可能包含 None 的整数列表转换为 (values, mask), None 对应的位置 mask 为 False
+
+    Args:
+        value_list (list): 整数或 None 组成的列表
+
+    Returns:
+        tuple: (np.ndarray(int64), np.ndarray(bool))
+    """
+    mask = np.fromiter((value is not None for value in value_list), dtype=bool)
+    values = np.fromiter(
+        (0 if value is None else value for value in value_list), dtype=np.int64
+    )
+    return values, mask
+
+
+def iter_optional_int_column(values, mask):
+    """optional_int_column 的逆过程, 逐行返回 int 或 None"""
+    for value, valid in zip(values.tolist(), mask.tolist()):
+        yield value if valid else None
+
+
+def float_matrix_column(value_list, dims):
+    """将定长的浮点数列表(例如 translation, rotation)转换为 (N, dims) 的 float64 数组"""
+    if len(value_list) == 0:
+        return np.zeros((0, dims), dtype=np.float64)
+    matrix = np.asarray(value_list, dtype=np.float64)
+    if matrix.ndim != 2 or matrix.shape[1] != dims:
+        raise ValueError(f"each row should have {dims} values, but got {matrix.shape}")
+    return matrix
+
+
+def number_matrix_column(value_list, dims):
+    """与 float_matrix_column 相同, 同时记录原始值中哪些位置是整数
+
+    float64 数组中整数 1 会变成 1.0, 序列化时通过 int_mask 将这些位置还原为 int,
+    使输出与直接序列化原始列表一致
+
+    Args:
+        value_list (list): 每一行为 dims 个 int 或 float 组成的列表
+        dims (int): 每一行的长度
+
+    Returns:
+        tuple: (np.ndarray(float64, (N, dims)), np.ndarray(bool, (N, dims)))
+    """
+    matrix = float_matrix_column(value_list, dims)
+    int_mask = np.array(
+        [
+            [
+                isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+                for value in row
+            ]
+            for row in value_list
+        ],
+        dtype=bool,
+    ).reshape(-1, dims)
+    return matrix, int_mask
+
+
+def iter_number_matrix_column(matrix, int_mask):
+    """number_matrix_column 的逆过程, 逐行返回 list, 原本是整数的位置返回 int"""
+    if not int_mask.any():
+        yield from matrix.tolist()
+        return
+    for row, int_row in zip(matrix.tolist(), int_mask.tolist()):
+        yield [int(value) if is_int else value for value, is_int in zip(row, int_row)]
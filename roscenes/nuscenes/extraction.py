@@ -7,16 +7,24 @@ Description:
 Copyright (c) 2023 by windzu, All Rights Reserved. 
 """
 import os
-from typing import List
 
 import numpy as np
 
+from ..common.json_writer import DEFAULT_JSON_BACKEND, DEFAULT_JSON_INDENT
 from . import rule
+from .columnar import (
+    CategoricalColumn,
+    float_matrix_column,
+    iter_optional_int_column,
+    optional_int_column,
+)
 from .utils import save_to_json
 
 
 class SceneTable:
-    def __init__(self, scene_name, samples_timestamp_list, description):
+    def __init__(
+        self, scene_name, samples_timestamp_list, description, lidar_voxel_info=None
+    ):
         self.scene_name = scene_name
         # Note : 一个scene只有一个Scene记录
         self.scene_list = [
@@ -25,15 +33,16 @@ class SceneTable:
                 samples_timestamp_list=samples_timestamp_list,
                 name=self.scene_name,
                 description=description,
+                lidar_voxel_info=lidar_voxel_info,
             )
         ]
 
-    def sequence_to_json(self, path, filename):
-        result = []
-        for scene in self.scene_list:
-            result.append(scene.sequence_to_json())
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+    ):
+        result = (scene.sequence_to_json() for scene in self.scene_list)
 
-        save_to_json(result, path, filename)
+        save_to_json(result, path, filename, indent=indent, backend=backend)
 
 
 class Scene:
@@ -47,6 +56,7 @@ class Scene:
         samples_timestamp_list,
         name,
         description,
+        lidar_voxel_info=None,
     ):
         self.scene_name = scene_name
         self.samples_timestamp_list = samples_timestamp_list
@@ -79,6 +89,9 @@ class Scene:
             "first_sample_token": self.first_sample_token,
             "last_sample_token": self.last_sample_token,
         }
+        # 融合点云经过体素降采样时记录降采样参数, 否则保持 nuscenes 的原有字段
+        if lidar_voxel_info:
+            self.result["lidar_voxel"] = lidar_voxel_info
 
     def sequence_to_json(self):
         return self.result
@@ -88,315 +101,233 @@ class SampleTable:
     """SampleTable 是一个 Sample 的集合, 通过 car_id 和 scene_id 来确定
     而对于每一个具体的 sample, 再通过 timestamp 来确定sample_token
     sample_token =  uuid(${car_id}-${scene_id}-sample-${timestamp})
+
+    Note : 按列存储, 只保存 sample 的时间戳, token 以及每一行的 dict 只在序列化时生成
     """
 
     def __init__(self, scene_name, samples_timestamp_list):
         self.scene_name = scene_name
-        self.samples_timestamp_list = samples_timestamp_list
-        self.sample_list = self._sample_list_init()
-
-    def _sample_list_init(self):
-        sample_list = []
 
         # Note : 这里的5是一个magic number, 用来保证sample_list的长度大于5
-        if len(self.samples_timestamp_list) < 5:
-            return sample_list
-
-        for i, timestamp in enumerate(self.samples_timestamp_list):
-            prev_timestamp = None
-            next_timestamp = None
-            if i == 0:
-                prev_timestamp = None
-                next_timestamp = self.samples_timestamp_list[i + 1]
-            elif i == len(self.samples_timestamp_list) - 1:
-                prev_timestamp = self.samples_timestamp_list[i - 1]
-                next_timestamp = None
-            else:
-                prev_timestamp = self.samples_timestamp_list[i - 1]
-                next_timestamp = self.samples_timestamp_list[i + 1]
-            sample = Sample(
-                self.scene_name,
-                timestamp,
-                prev_timestamp,
-                next_timestamp,
-            )
-            sample_list.append(sample)
-
-        return sample_list
-
-    def sequence_to_json(self, path, filename):
-        result = []
-        for sample in self.sample_list:
-            result.append(sample.sequence_to_json())
-
-        save_to_json(result, path, filename)
-
+        if len(samples_timestamp_list) < 5:
+            samples_timestamp_list = []
+        self.timestamps = np.asarray(samples_timestamp_list, dtype=np.int64)
+
+    def iter_rows(self):
+        scene_name = self.scene_name
+        scene_token = rule.generate_scene_token(scene_name)
+        timestamp_list = self.timestamps.tolist()
+        token_list = [
+            rule.generate_sample_token(scene_name, timestamp)
+            for timestamp in timestamp_list
+        ]
 
-class Sample:
-    def __init__(
-        self,
-        scene_name,
-        timestamp,
-        prev_timestamp,
-        next_timestamp,
+        for i, timestamp in enumerate(timestamp_list):
+            yield {
+                "token": token_list[i],
+                "scene_token": scene_token,
+                "timestamp": timestamp,
+                "prev": token_list[i - 1] if i > 0 else "",
+                "next": token_list[i + 1] if i < len(token_list) - 1 else "",
+            }
+
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
     ):
-        self.scene_name = scene_name
-        self.timestamp = timestamp
-
-        self.token = rule.generate_sample_token(
-            self.scene_name,
-            self.timestamp,
+        save_to_json(
+            self.iter_rows(), path, filename, indent=indent, backend=backend
         )
-        self.scene_token = rule.generate_scene_token(self.scene_name)
-        self.prev = ""
-        if prev_timestamp is not None:
-            self.prev = rule.generate_sample_token(
-                self.scene_name,
-                prev_timestamp,
-            )
-        self.next = ""
-        if next_timestamp is not None:
-            self.next = rule.generate_sample_token(
-                self.scene_name,
-                next_timestamp,
-            )
-
-        self.result = {
-            "token": self.token,
-            "scene_token": self.scene_token,
-            "timestamp": self.timestamp,
-            "prev": self.prev,
-            "next": self.next,
-        }
-
-    def sequence_to_json(self):
-        return self.result
 
 
 class SampleDataTable:
     """SampleDataTable 是一个 SampleData 的集合, 通过 car_id 和 scene_id 来确定
     而对于每一个具体的 sample_data, 再通过 timestamp 和 channel 来确定sample_token
     sample_data_token =  uuid(${car_id}-${scene_id}-sample_data-${timestamp}-${channel})
+
+    每个 sample_data 包含一个sample, 一个ego_pose, 一个calibrated_sensor
+
+    Note : 按列存储, 时间戳, 宽高, 关键帧标志等保存在 numpy 数组中, channel 和 fileformat
+        只保存编码, 所有的 token 以及每一行的 dict 只在序列化时生成.
+        同一个 channel 的数据连续存放并按时间戳排序, prev/next 即为同一个 channel 中的相邻行
     """
 
     def __init__(self, scene_name, sample_data_info_list_dict):
         self.scene_name = scene_name
-        self.sample_data_info_list_dict = sample_data_info_list_dict
-        self.sample_data_list = self._sample_data_list_init()
-
-    def _sample_data_list_init(self):
-        sample_data_list = []
 
-        for channel, sample_data_info_list in self.sample_data_info_list_dict.items():
-            last_sample_timestamp = None
-            current_sample_timestamp = None
-
-            for i, sample_data_info in enumerate(sample_data_info_list):
-                scene_name = self.scene_name
-                timestamp = sample_data_info["timestamp"]
-                channel = sample_data_info["channel"]
-                filename = sample_data_info["filename"]
-                fileformat = sample_data_info["fileformat"]
-                width = sample_data_info["width"]
-                height = sample_data_info["height"]
-
-                # judge is_key_frame
-                is_key_frame = sample_data_info["is_key_frame"]
-                if is_key_frame:
-                    current_sample_timestamp = timestamp
-                    last_sample_timestamp = current_sample_timestamp
-                else:
-                    current_sample_timestamp = last_sample_timestamp
-
-                # judge prev_timestamp and next_timestamp
-                if i == 0:
-                    prev_timestamp = None
-                    next_timestamp = sample_data_info_list[i + 1]["timestamp"]
-                elif i == len(sample_data_info_list) - 1:
-                    prev_timestamp = sample_data_info_list[i - 1]["timestamp"]
-                    next_timestamp = None
-                else:
-                    prev_timestamp = sample_data_info_list[i - 1]["timestamp"]
-                    next_timestamp = sample_data_info_list[i + 1]["timestamp"]
-
-                sample_data = SampleData(
-                    scene_name,
-                    timestamp,
-                    channel,
-                    filename,
-                    fileformat,
-                    width,
-                    height,
-                    is_key_frame,
-                    current_sample_timestamp,
-                    prev_timestamp,
-                    next_timestamp,
-                )
-                sample_data_list.append(sample_data)
-        return sample_data_list
+        sample_data_info_list = []
+        for channel_sample_data_info_list in sample_data_info_list_dict.values():
+            sample_data_info_list.extend(channel_sample_data_info_list)
+        row_num = len(sample_data_info_list)
 
-    def sequence_to_json(self, path, filename):
-        result = []
-        for sample_data in self.sample_data_list:
-            result.append(sample_data.sequence_to_json())
-
-        save_to_json(result, path, filename)
-
-
-class SampleData:
-    """_summary_ : 一个sample_data包含一个sample, 一个ego_pose, 一个calibrated_sensor
-
-    sample_data_token =  uuid(${car_id}-${scene_id}-sample_data-${timestamp}-${channel})
-    """
-
-    def __init__(
-        self,
-        scene_name,
-        timestamp,
-        channel,
-        filename,
-        fileformat,
-        width,
-        height,
-        is_key_frame,
-        sample_timestamp,
-        prev_timestamp,
-        next_timestamp,
-    ):
-        self.scene_name = scene_name
-        self.timestamp = int(timestamp)
-        self.channel = channel
-        self.token = rule.generate_sample_data_token(
-            self.scene_name,
-            self.timestamp,
-            self.channel,
+        self.channels = CategoricalColumn(
+            info["channel"] for info in sample_data_info_list
         )
-
-        self.sample_token = rule.generate_sample_token(
-            self.scene_name,
-            sample_timestamp,
+        self.fileformats = CategoricalColumn(
+            info["fileformat"] for info in sample_data_info_list
         )
-        self.ego_pose_token = rule.generate_ego_pose_token(
-            self.scene_name,
-            self.timestamp,
+        self.timestamps = np.fromiter(
+            (info["timestamp"] for info in sample_data_info_list),
+            dtype=np.int64,
+            count=row_num,
         )
-        self.calibrated_sensor_token = rule.generate_calibrated_sensor_token(
-            self.scene_name,
-            self.channel,
+        self.widths = np.fromiter(
+            (info["width"] for info in sample_data_info_list),
+            dtype=np.int32,
+            count=row_num,
         )
-
-        if is_key_frame:
-            # filename should be samples/channel/xxx
-            # check if filename have samples/channel
-            if "samples" not in filename:
-                filename = filename.split("/")[-1]
-                filename = os.path.join("samples", channel, filename)
-        else:
-            # filename should be sweeps/channel/xxx
-            # check if filename have sweeps/channel
-            if "sweeps" not in filename:
-                filename = filename.split("/")[-1]
-                filename = os.path.join("sweeps", channel, filename)
-        self.filename = filename
-
-        self.fileformat = fileformat
-        self.width = width
-        self.height = height
-
-        self.is_key_frame = is_key_frame
-        self.next = ""
-        if next_timestamp is not None:
-            self.next = rule.generate_sample_data_token(
-                self.scene_name,
-                next_timestamp,
-                self.channel,
-            )
-        self.prev = ""
-        if prev_timestamp is not None:
-            self.prev = rule.generate_sample_data_token(
-                self.scene_name,
-                prev_timestamp,
-                self.channel,
+        self.heights = np.fromiter(
+            (info["height"] for info in sample_data_info_list),
+            dtype=np.int32,
+            count=row_num,
+        )
+        self.is_key_frames = np.fromiter(
+            (info["is_key_frame"] for info in sample_data_info_list),
+            dtype=bool,
+            count=row_num,
+        )
+        self.filenames = [
+            self.normalize_filename(
+                info["filename"], info["channel"], info["is_key_frame"]
             )
+            for info in sample_data_info_list
+        ]
 
-        self.result = {
-            "token": self.token,
-            "sample_token": self.sample_token,
-            "ego_pose_token": self.ego_pose_token,
-            "calibrated_sensor_token": self.calibrated_sensor_token,
-            "filename": self.filename,
-            "fileformat": self.fileformat,
-            "width": self.width,
-            "height": self.height,
-            "timestamp": self.timestamp,
-            "is_key_frame": self.is_key_frame,
-            "next": self.next,
-            "prev": self.prev,
-        }
+        # 每一行所属的 sample 为同一个 channel 中最近的一个关键帧,
+        # 在第一个关键帧之前的 sweep 没有所属的 sample
+        self.sample_timestamps, self.has_samples = optional_int_column(
+            self._get_sample_timestamp_list(sample_data_info_list_dict)
+        )
 
-    def sequence_to_json(self):
-        return self.result
+        # 同一个 channel 的第一行没有 prev, 最后一行没有 next
+        channel_codes = self.channels.codes
+        self.has_prevs = np.zeros(row_num, dtype=bool)
+        self.has_prevs[1:] = channel_codes[1:] == channel_codes[:-1]
+        self.has_nexts = np.zeros(row_num, dtype=bool)
+        self.has_nexts[:-1] = channel_codes[:-1] == channel_codes[1:]
+
+    @staticmethod
+    def _get_sample_timestamp_list(sample_data_info_list_dict):
+        sample_timestamp_list = []
+        for channel_sample_data_info_list in sample_data_info_list_dict.values():
+            last_sample_timestamp = None
+            for sample_data_info in channel_sample_data_info_list:
+                if sample_data_info["is_key_frame"]:
+                    last_sample_timestamp = sample_data_info["timestamp"]
+                sample_timestamp_list.append(last_sample_timestamp)
+        return sample_timestamp_list
+
+    @staticmethod
+    def normalize_filename(filename, channel, is_key_frame):
+        """关键帧的 filename 应为 samples/channel/xxx, 否则为 sweeps/channel/xxx"""
+        folder = "samples" if is_key_frame else "sweeps"
+        if folder not in filename:
+            filename = filename.split("/")[-1]
+            filename = os.path.join(folder, channel, filename)
+        return filename
+
+    def iter_rows(self):
+        scene_name = self.scene_name
+        timestamp_list = self.timestamps.tolist()
+        has_prev_list = self.has_prevs.tolist()
+        has_next_list = self.has_nexts.tolist()
+
+        row_iter = zip(
+            self.channels.iter_values(),
+            self.fileformats.iter_values(),
+            timestamp_list,
+            iter_optional_int_column(self.sample_timestamps, self.has_samples),
+            self.widths.tolist(),
+            self.heights.tolist(),
+            self.is_key_frames.tolist(),
+            self.filenames,
+        )
+        for i, (
+            channel,
+            fileformat,
+            timestamp,
+            sample_timestamp,
+            width,
+            height,
+            is_key_frame,
+            filename,
+        ) in enumerate(row_iter):
+            prev_token = ""
+            if has_prev_list[i]:
+                prev_token = rule.generate_sample_data_token(
+                    scene_name, timestamp_list[i - 1], channel
+                )
+            next_token = ""
+            if has_next_list[i]:
+                next_token = rule.generate_sample_data_token(
+                    scene_name, timestamp_list[i + 1], channel
+                )
+
+            yield {
+                "token": rule.generate_sample_data_token(scene_name, timestamp, channel),
+                "sample_token": rule.generate_sample_token(scene_name, sample_timestamp),
+                "ego_pose_token": rule.generate_ego_pose_token(scene_name, timestamp),
+                "calibrated_sensor_token": rule.generate_calibrated_sensor_token(
+                    scene_name, channel
+                ),
+                "filename": filename,
+                "fileformat": fileformat,
+                "width": width,
+                "height": height,
+                "timestamp": timestamp,
+                "is_key_frame": is_key_frame,
+                "next": next_token,
+                "prev": prev_token,
+            }
+
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+    ):
+        save_to_json(
+            self.iter_rows(), path, filename, indent=indent, backend=backend
+        )
 
 
 class EgoPoseTable:
     """EgoPoseTable 是一个 EgoPose 的集合, 通过 car_id 和 scene_id 来确定
     而对于每一个具体的 ego_pose, 再通过 timestamp 来确定token
     ego_pose_token =  uuid(${car_id}-${scene_id}-ego_pose-${timestamp})
+
+    Note : 按列存储, 时间戳为 (N,) 的 int64 数组, translation 和 rotation 分别为 (N, 3) 和
+        (N, 4) 的 float64 数组, token 以及每一行的 dict 只在序列化时生成
     """
 
     def __init__(self, scene_name, ego_pose_info_list):
         self.scene_name = scene_name
-        self.ego_pose_info_list = ego_pose_info_list
-        self.ego_pose_list: List[EgoPose] = []
-
-        self._ego_pose_list_init()
-
-    def _ego_pose_list_init(self):
-        for ego_pose_info in self.ego_pose_info_list:
-            timestamp = ego_pose_info["timestamp"]
-            translation = ego_pose_info["translation"]
-            rotation = ego_pose_info["rotation"]
-            ego_pose = EgoPose(self.scene_name, timestamp, translation, rotation)
-            self.ego_pose_list.append(ego_pose)
-
-    def sequence_to_json(self, path, filename):
-        result = []
-        for ego_pose in self.ego_pose_list:
-            result.append(ego_pose.sequence_to_json())
 
-        save_to_json(result, path, filename)
-
-
-class EgoPose:
-    def __init__(self, scene_name, timestamp, translation, rotation):
-        self.scene_name = scene_name
-        self.timestamp = timestamp
-        self.token = rule.generate_ego_pose_token(
-            self.scene_name,
-            self.timestamp,
+        self.timestamps = np.fromiter(
+            (ego_pose_info["timestamp"] for ego_pose_info in ego_pose_info_list),
+            dtype=np.int64,
+            count=len(ego_pose_info_list),
         )
-
-        self.translation = translation
-        self.rotation = rotation
-
-    def sequence_to_json(self):
-        token = str(self.token)
-        translation = (
-            self.translation.tolist()
-            if isinstance(self.translation, np.ndarray)
-            else self.translation
+        self.translations = float_matrix_column(
+            [ego_pose_info["translation"] for ego_pose_info in ego_pose_info_list], 3
         )
-        rotation = (
-            self.rotation.tolist()
-            if isinstance(self.rotation, np.ndarray)
-            else self.rotation
+        self.rotations = float_matrix_column(
+            [ego_pose_info["rotation"] for ego_pose_info in ego_pose_info_list], 4
         )
-        timestamp = self.timestamp
 
-        result = {
-            "token": token,
-            "translation": translation,
-            "rotation": rotation,
-            "timestamp": timestamp,
-        }
-        return result
+    def iter_rows(self):
+        scene_name = self.scene_name
+        for timestamp, translation, rotation in zip(
+            self.timestamps.tolist(),
+            self.translations.tolist(),
+            self.rotations.tolist(),
+        ):
+            yield {
+                "token": rule.generate_ego_pose_token(scene_name, timestamp),
+                "translation": translation,
+                "rotation": rotation,
+                "timestamp": timestamp,
+            }
+
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+    ):
+        save_to_json(
+            self.iter_rows(), path, filename, indent=indent, backend=backend
+        )
@@ -0,0 +1,90 @@
+class SampleDataLedger:
+    """切片过程中每个写入文件的记录, 生成数据库时直接使用, 不再遍历输出目录
+
+    每条记录为一个字典:
+        {
+            "timestamp": 基准帧的时间戳(us),
+            "channel": channel,
+            "is_key_frame": 是否为关键帧(保存在 samples 中),
+            "filename": 文件名,
+            "path": 相对于场景根目录的路径,
+            "width": 图片宽度, 点云为 0,
+            "height": 图片高度, 点云为 0,
+        }
+
+    Note : width 和 height 在写入线程完成写入后才会被填充
+    """
+
+    def __init__(self):
+        self.record_list = []
+
+    def __len__(self):
+        return len(self.record_list)
+
+    def add(self, timestamp, channel, is_key_frame, filename, path):
+        record = {
+            "timestamp": timestamp,
+            "channel": channel,
+            "is_key_frame": is_key_frame,
+            "filename": filename,
+            "path": path,
+            "width": 0,
+            "height": 0,
+        }
+        self.record_list.append(record)
+        return record
+
+    def extend(self, record_list):
+        self.record_list.extend(record_list)
+
+    @staticmethod
+    def wrap(record, func):
+        """包装写入函数, 用写入函数返回的 (width, height, file_path) 填充记录的宽高"""
+
+        def run(*args, **kwargs):
+            result = func(*args, **kwargs)
+            record["width"], record["height"] = result[0], result[1]
+            return result
+
+        return run
+
+    def get_key_frame_channel_list(self):
+        """获取有关键帧数据的 channel 列表, 即 samples 文件夹下的 channel"""
+        channel_list = []
+        for record in self.record_list:
+            if record["is_key_frame"] and record["channel"] not in channel_list:
+                channel_list.append(record["channel"])
+        return channel_list
+
+    def to_sample_data_info_list_dict(self, scene_name):
+        """转换为 SampleDataTable 所需的 sample_data_info_list_dict
+
+        Args:
+            scene_name (str): 场景名称
+
+        Returns:
+            dict: 以 channel 为 key, value 为按照 timestamp 排序的 sample_data_info 列表,
+                格式与 generate_sample_data_info_list_dict 一致
+        """
+        sample_data_info_list_dict = {}
+        for record in self.record_list:
+            channel = record["channel"]
+            if channel not in sample_data_info_list_dict:
+                sample_data_info_list_dict[channel] = []
+            sample_data_info_list_dict[channel].append(
+                {
+                    "filename": record["filename"],
+                    "scene_name": scene_name,
+                    "channel": channel,
+                    "timestamp": record["timestamp"],
+                    "fileformat": record["filename"].split(".")[-1],
+                    "width": record["width"],
+                    "height": record["height"],
+                    "is_key_frame": record["is_key_frame"],
+                }
+            )
+
+        for sample_data_info_list in sample_data_info_list_dict.values():
+            sample_data_info_list.sort(key=lambda x: x["timestamp"])
+
+        return sample_data_info_list_dict
@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+
+
+class SliceManifest:
+    """场景切片的清单, 用于中断后的断点续切
+
+    清单是场景根目录下的一个追加写入的 jsonl 文件:
+        - 第一行为 header, 记录切片配置的校验值
+        - 每一帧的所有文件写入完成后, 追加一行该帧的记录(时间戳, ego pose, 文件的 ledger 记录及大小)
+        - 数据库生成完成后, 追加一行 complete 记录
+
+    每条记录通过一次 write 追加写入, 进程崩溃时最多只会留下最后一行不完整的记录, 读取时直接忽略即可
+
+    Args:
+        scene_path (str): 场景根目录
+        config_checksum (str): 切片配置的校验值, 配置变化后清单失效
+    """
+
+    FILENAME = ".slice_manifest.jsonl"
+
+    def __init__(self, scene_path, config_checksum):
+        self.scene_path = scene_path
+        self.path = os.path.join(scene_path, self.FILENAME)
+        self.config_checksum = config_checksum
+
+        self.header_checksum = None
+        self.frame_record_dict = {}
+        self.complete = False
+
+        self._lock = threading.Lock()
+
+    def load(self):
+        """读取已有的清单, 清单不存在时为空"""
+        self.header_checksum = None
+        self.frame_record_dict = {}
+        self.complete = False
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时写了一半的记录
+                    continue
+                record_type = record.get("type")
+                if record_type == "header":
+                    self.header_checksum = record["config_checksum"]
+                elif record_type == "frame":
+                    self.frame_record_dict[record["timestamp"]] = record
+                elif record_type == "complete":
+                    self.complete = True
+
+    def discard_torn_record(self):
+        """截掉崩溃时写了一半的最后一行, 否则续切时追加的第一条记录会与它拼在同一行而无法读取
+
+        Note : 只能在没有其他进程追加写入清单时调用, 例如续切开始之前
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def is_valid(self):
+        """清单是否与当前的切片配置一致"""
+        return self.header_checksum == self.config_checksum
+
+    def is_complete(self):
+        """场景是否已经完整切片并生成了数据库"""
+        return self.is_valid() and self.complete
+
+    def reset(self):
+        """重新开始一个清单, 只包含 header"""
+        os.makedirs(self.scene_path, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self._dumps({"type": "header", "config_checksum": self.config_checksum}))
+        os.replace(tmp_path, self.path)
+
+        self.header_checksum = self.config_checksum
+        self.frame_record_dict = {}
+        self.complete = False
+
+    def get_committed_frame(self, timestamp):
+        """获取已经完整写入的帧的记录, 如果记录中的文件缺失或大小不一致, 则视为未写入
+
+        Args:
+            timestamp (int): 帧的时间戳(us)
+
+        Returns:
+            dict: 帧的记录, 未写入时为 None
+        """
+        record = self.frame_record_dict.get(timestamp)
+        if record is None:
+            return None
+        for file_info in record["file_list"]:
+            file_path = os.path.join(self.scene_path, file_info["path"])
+            if not os.path.exists(file_path):
+                return None
+            if os.path.getsize(file_path) != file_info["size"]:
+                return None
+        return record
+
+    def commit_frame(self, timestamp, ego_pose_info, sample_data_record_list):
+        """记录一帧已经完整写入
+
+        Args:
+            timestamp (int): 帧的时间戳(us)
+            ego_pose_info (dict): 帧的 ego pose 信息
+            sample_data_record_list (list): 帧写入的所有文件的 SampleDataLedger 记录,
+                其中 path 为相对于场景根目录的路径
+        """
+        record = {
+            "type": "frame",
+            "timestamp": timestamp,
+            "ego_pose": ego_pose_info,
+            "file_list": [
+                dict(
+                    sample_data_record,
+                    size=os.path.getsize(
+                        os.path.join(self.scene_path, sample_data_record["path"])
+                    ),
+                )
+                for sample_data_record in sample_data_record_list
+            ],
+        }
+        self._append(record)
+        with self._lock:
+            self.frame_record_dict[timestamp] = record
+
+    def mark_complete(self):
+        self._append({"type": "complete"})
+        self.complete = True
+
+    def _append(self, record):
+        # 以追加模式打开, 并通过一次 write 写入整行, 分片切片时多个进程可以同时追加
+        line = self._dumps(record).encode("utf-8")
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    @staticmethod
+    def _dumps(record):
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+class PendingFrame:
+    """记录一帧中尚未完成的写入任务, 所有任务完成后回调 on_commit
+
+    Args:
+        job_num (int): 该帧的写入任务数量
+        on_commit (callable): 所有任务完成后的回调
+    """
+
+    def __init__(self, job_num, on_commit):
+        self._lock = threading.Lock()
+        self.remaining = job_num
+        self.on_commit = on_commit
+        if job_num == 0:
+            on_commit()
+
+    def wrap(self, func):
+        """包装写入函数, 函数执行成功后计为一个任务完成, 执行失败则该帧永远不会被提交"""
+
+        def run(*args, **kwargs):
+            result = func(*args, **kwargs)
+            self.done()
+            return result
+
+        return run
+
+    def done(self):
+        with self._lock:
+            self.remaining -= 1
+            commit = self.remaining == 0
+        if commit:
+            self.on_commit()
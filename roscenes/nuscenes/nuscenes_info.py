@@ -1,36 +1,48 @@
+import copy
+import hashlib
+import json
 import os
+import shutil
 import time
+from functools import partial
 
 import cv2
 import numpy as np
-import rosbag
 from sensor_msgs.msg import CompressedImage
 
-from ..common.calib import CalibInfo
+from ..common.calib import CalibInfo, CalibRegistry
 from ..common.data_config import DataConfig
+from ..common.image_meta import get_image_size_from_bytes
+from ..common.lidar_filter import LidarCropFilter
 from . import rule
+from .bag_reader import BagIndexReader
+from .ledger import SampleDataLedger
+from .manifest import PendingFrame, SliceManifest
+from .packed import pack_scene_point_clouds
+from .profiler import StageProfiler
+from .sync import FrameSynchronizer
+from .writer import AsyncWriter, StageStats
 from .annotation import InstanceTable, LidarsegTable, SampleAnnotationTable
 from .extraction import EgoPoseTable, SampleDataTable, SampleTable, SceneTable
 from .taxonomy import AttributeTable, CategoryTable, VisibilityTable
 
 # utils
 from .utils import (
-    closest_timestamp,
     fusion_lidar_points,
     generate_calibrated_sensor_info_list,
-    generate_sample_data_info_list_dict,
-    generate_sensor_info_list,
+    generate_sensor_info_list_from_channel_list,
     parse_ego_pose,
-    preprocess_bag,
-    ros_timestamp_to_us,
     save_camera,
     save_lidar,
-    save_msg,
+    save_lidar_bin,
 )
 from .vehicle import CalibratedSensorTable, LogTable, MapTable, SensorTable
 
 
 class NuscenesInfo:
+    # 开启 DataConfig.profile_flag 时, 各阶段的统计报告保存在场景根目录下的该文件中
+    PROFILE_FILENAME = "slice_profile.json"
+
     def __init__(
         self,
         data_config: DataConfig,
@@ -62,13 +74,24 @@ class NuscenesInfo:
         self.time_diff_threshold_us = int(self.data_config.time_diff_threshold) * 1000
         self.sample_interval = self.data_config.sample_interval
         self.save_sweep_data_flag = self.data_config.save_sweep_data_flag
+        # 融合时的车身排除框以及范围裁剪, 没有配置时为 None
+        self.lidar_crop_filter = LidarCropFilter.from_data_config(self.data_config)
+
+        # 各阶段的耗时, 读写字节数以及峰值内存统计, 关闭时没有额外开销
+        self.profiler = StageProfiler(enabled=self.data_config.profile_flag)
 
         # parse bag get some info
         # - self.lidar_topic_channel_dict
         # - self.calib_info_dict
-        # - self.data_by_topic
-        self.parse_bag()
+        # - self.calib_registry
+        # - self.bag_reader
+        with self.profiler.stage("parse_bag"):
+            self.parse_bag()
 
+        self.reset_scene_state()
+
+    def reset_scene_state(self):
+        """重置与单个场景相关的状态, 从同一个 bag 派生出新的场景时也需要调用"""
         self.nuscenes_databse_dict = {}
 
         # wait scene info sync from outside
@@ -78,19 +101,113 @@ class NuscenesInfo:
 
         # global info
         self.ego_pose_info_list = []
+        # 每个写入文件的记录, 生成数据库时直接使用
+        self.sample_data_ledger = SampleDataLedger()
 
         # global variable
         self.sweeps_count = 0
 
+        # 断点续切的清单, 在 store_init 中创建
+        self.slice_manifest = None
+
     def slice(self):
+        """切片整个 bag (或 start_time/end_time 时间窗口) 为一个场景
+
+        Returns:
+            list: 场景的统计报告, 未开启统计或场景被跳过时为空列表
+        """
+        report = self.slice_scene()
+        self.bag_reader.close()
+        return [report] if report else []
+
+    def slice_scene(self):
+        """切片当前场景
+
+        Returns:
+            dict: 场景的统计报告, 未开启统计或场景被跳过时为 None
+        """
         # 1. 存储初始化
         print("1. Store init")
-        if not self.store_init():
-            return
+        with self.profiler.stage("store_init"):
+            if not self.store_init():
+                return None
 
         print("2. Slice bag to file")
         self.slice_bag_to_file()
+        if not self.ego_pose_info_list:
+            print(f"no frame synchronized in {self.scene_name}, skip generate database")
+            return self.save_profile()
         self.generate_database(self.nuscenes_folder_path)
+        self.slice_manifest.mark_complete()
+        return self.save_profile()
+
+    def save_profile(self):
+        """将统计报告保存到场景根目录, 未开启统计时不做任何事情
+
+        Returns:
+            dict: 统计报告, 未开启统计时为 None
+        """
+        report = self.profiler.save(
+            os.path.join(self.nuscenes_folder_path, self.PROFILE_FILENAME)
+        )
+        if report is not None:
+            report["scene_name"] = self.scene_name
+        return report
+
+    def slice_time_list(self, time_list):
+        """只读取一次 bag, 将多个时间窗口分别切片为独立的场景
+
+        每个时间窗口对应 nuscenes_folder_path 下的一个子文件夹, 场景名称由
+        rule.generate_window_scene_name 生成, 每个场景有自己独立的数据库
+
+        Note : 所有场景共享同一个 bag 索引和标定信息, 所以构建时的 start_time/end_time
+            应当覆盖所有的时间窗口
+
+        Args:
+            time_list (list): 时间窗口列表, 格式为 [[start_time, end_time], ...], 单位为 us
+
+        Returns:
+            list: 每个场景的统计报告, 未开启统计或场景被跳过时不包含在内
+        """
+        report_list = []
+        for window_index, (start_time, end_time) in enumerate(time_list):
+            scene_name = rule.generate_window_scene_name(self.scene_name, window_index)
+            print(f"slice time window {window_index} : [{start_time}, {end_time}]")
+            scene_info = self.derive_scene(
+                scene_name=scene_name,
+                nuscenes_folder_path=os.path.join(self.nuscenes_folder_path, scene_name),
+                start_time=start_time,
+                end_time=end_time,
+            )
+            report = scene_info.slice_scene()
+            if report:
+                report_list.append(report)
+        self.bag_reader.close()
+        return report_list
+
+    def derive_scene(self, scene_name, nuscenes_folder_path, start_time, end_time):
+        """从当前 bag 派生出一个新的场景
+
+        新场景与当前场景共享 bag 索引, 标定信息以及相关配置, 只有场景本身的状态是独立的
+
+        Args:
+            scene_name (str): 新场景的名称
+            nuscenes_folder_path (str): 新场景的保存路径
+            start_time (int): 新场景的起始时间(us)
+            end_time (int): 新场景的结束时间(us)
+
+        Returns:
+            NuscenesInfo: 新场景
+        """
+        scene_info = copy.copy(self)
+        scene_info.scene_name = scene_name
+        scene_info.nuscenes_folder_path = nuscenes_folder_path
+        scene_info.start_time = start_time
+        scene_info.end_time = end_time
+        scene_info.reset_scene_state()
+        # parse_bag 由所有派生的场景共享, 也会出现在每个场景的统计报告中
+        scene_info.profiler = self.profiler.copy()
+        return scene_info
 
     def store_init(self):
         """init nuscenes folder path
@@ -98,30 +215,112 @@ class NuscenesInfo:
         if nuscenes folder path is not exist, create it and sub folder
         else, remove it and create it again
 
+        如果开启了断点续切(resume_flag), 并且场景的清单与当前配置一致:
+            - 场景已经完整切片, 则直接跳过, 返回 False
+            - 否则保留已有的文件, 已经写入的帧在切片时会被跳过
+
+        Returns:
+            bool: 是否需要继续切片
         """
+        self.slice_manifest = SliceManifest(
+            self.nuscenes_folder_path, self.get_config_checksum()
+        )
 
-        if not os.path.exists(self.nuscenes_folder_path):
-            os.makedirs(self.nuscenes_folder_path)
-        else:
-            os.system(f"rm -rf {self.nuscenes_folder_path}")
-            os.makedirs(self.nuscenes_folder_path)
+        if self.data_config.resume_flag and os.path.exists(self.nuscenes_folder_path):
+            self.slice_manifest.load()
+            if self.slice_manifest.is_complete():
+                print(f"{self.scene_name} is unchanged, skip")
+                return False
+            if self.slice_manifest.is_valid():
+                print(
+                    f"resume {self.scene_name} from {len(self.slice_manifest.frame_record_dict)} committed frames"
+                )
+                self.slice_manifest.discard_torn_record()
+                self.make_store_folders()
+                return True
+            print(f"config of {self.scene_name} changed, slice from scratch")
 
-        os.makedirs(os.path.join(self.nuscenes_folder_path, "samples"))
-        os.makedirs(os.path.join(self.nuscenes_folder_path, "sweeps"))
-        os.makedirs(os.path.join(self.nuscenes_folder_path, "v1.0-all"))
-        os.makedirs(os.path.join(self.nuscenes_folder_path, "maps"))
+        if os.path.exists(self.nuscenes_folder_path):
+            shutil.rmtree(self.nuscenes_folder_path)
+        self.make_store_folders()
+        self.slice_manifest.reset()
 
         return True
 
-    def slice_bag_to_file(self):
-        """从bag包中提取数据"""
+    def make_store_folders(self):
+        for folder in ["samples", "sweeps", "v1.0-all", "maps"]:
+            os.makedirs(os.path.join(self.nuscenes_folder_path, folder), exist_ok=True)
 
-        print("start slice bag to file")
-        topic_list = []
-        topic_list.extend(self.camera_topic_channel_dict.keys())
-        topic_list.extend(self.lidar_topic_channel_dict.keys())
-        topic_list.extend(self.pose_topic_channel_dict.keys())
+    def load_manifest(self):
+        """读取已有的清单而不重置, 用于分片切片的子进程, 清单的校验由父进程完成"""
+        self.slice_manifest = SliceManifest(
+            self.nuscenes_folder_path, self.get_config_checksum()
+        )
+        self.slice_manifest.load()
+
+    def get_config_checksum(self):
+        return self.compute_config_checksum(
+            data_config=self.data_config,
+            scene_name=self.scene_name,
+            scene_bag_file=self.scene_bag_file,
+            start_time=self.start_time,
+            end_time=self.end_time,
+        )
+
+    @staticmethod
+    def compute_config_checksum(
+        data_config, scene_name, scene_bag_file, start_time, end_time
+    ):
+        """计算切片配置的校验值, 配置, bag 文件, 时间窗口任意一项变化都会导致校验值变化
+
+        Returns:
+            str: 校验值
+        """
+        bag_stat = os.stat(scene_bag_file)
+        checksum_dict = {
+            "config": data_config.get_slice_config_dict(),
+            "scene_name": scene_name,
+            "bag": {
+                "path": os.path.abspath(scene_bag_file),
+                "size": bag_stat.st_size,
+                "mtime_ns": bag_stat.st_mtime_ns,
+            },
+            "start_time": start_time,
+            "end_time": end_time,
+        }
+        checksum_str = json.dumps(checksum_dict, sort_keys=True, default=str)
+        return hashlib.sha1(checksum_str.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def is_scene_complete(
+        cls,
+        data_config,
+        scene_name,
+        scene_bag_file,
+        nuscenes_folder_path,
+        start_time=None,
+        end_time=None,
+    ):
+        """在读取 bag 之前判断场景是否已经完整切片, 用于断点续切时跳过没有变化的场景"""
+        slice_manifest = SliceManifest(
+            nuscenes_folder_path,
+            cls.compute_config_checksum(
+                data_config, scene_name, scene_bag_file, start_time, end_time
+            ),
+        )
+        slice_manifest.load()
+        return slice_manifest.is_complete()
+
+    def slice_bag_to_file(self, frame_list=None):
+        """从bag包中提取数据
+
+        Args:
+            frame_list (list): 已经完成同步的帧列表, 每个元素为 (timestamp, closest_time_dict),
+                为 None 时对当前时间窗口内的所有帧进行同步. 按时间分片并行切片时, 由父进程统一同步后
+                将每个分片的帧列表传入, 此时 self.sweeps_count 应设置为该分片第一帧的全局序号
+        """
 
+        print("start slice bag to file")
         lidar_channel_list = []
         lidar_channel_list.extend(self.lidar_topic_channel_dict.values())
         lidar_channel_topic_dict = {
@@ -129,15 +328,10 @@ class NuscenesInfo:
         }
 
         camera_channel_list = []
-        camera_topic_list = []
-        camera_topic_list.extend(self.camera_topic_channel_dict.keys())
         camera_channel_list.extend(self.camera_topic_channel_dict.values())
         camera_channel_topic_dict = {
             channel: topic for topic, channel in self.camera_topic_channel_dict.items()
         }
-        camera_topic_resolution_dict = {
-            topic: (1280, 720) for topic in camera_topic_list
-        }
 
         pose_channel_topic_dict = {
             channel: topic for topic, channel in self.pose_topic_channel_dict.items()
@@ -146,96 +340,63 @@ class NuscenesInfo:
         samples_path = os.path.join(self.nuscenes_folder_path, "samples")
         sweeps_path = os.path.join(self.nuscenes_folder_path, "sweeps")
 
-        # 根据目标topic,从bag包中提取数据 , 如果没有对应的topic数据,则其值为空字典
-        # data_by_topic = preprocess_bag(self.scene_bag_file, topic_list)
-        data_by_topic = self.data_by_topic
+        # 融合点云的保存格式, bin 格式在 merge 时不需要再由 pcd 转换
+        lidar_file_format = self.data_config.lidar_file_format
+        lidar_file_suffix = self.data_config.get_lidar_file_suffix()
 
-        # get camera real resolution
-        # 获取真实的camera分辨率,如果没有camera数据,则使用默认的分辨率
-        for camera_topic in camera_topic_list:
-            # 如果camera数据为空,为其填充一张默认分辨率的ros image
-            if camera_topic not in data_by_topic:
-                # create fake ros image msg with default resolution
-                main_lidar_first_timestamp = list(
-                    data_by_topic[self.main_topic].values()
-                )[0].header.stamp
-                fake_camera_msg = msg = CompressedImage()
-                fake_camera_msg.header.stamp = main_lidar_first_timestamp
-                fake_camera_msg.format = "jpeg"
-                fake_image = np.zeros((720, 1280, 3), np.uint8)
-                _, fake_jpeg_image = cv2.imencode(".jpg", fake_image)
-                fake_jpeg_bytes = fake_jpeg_image.tobytes()
-                fake_camera_msg.data = fake_jpeg_bytes
-                data_by_topic[camera_topic] = {0: fake_camera_msg}
+        # 帧同步只依赖 bag 索引中的时间戳, 消息本身在保存时才按需读取
+        bag_reader = self.bag_reader
 
-            # # 如果camera数据为空,则跳过,使用默认的分辨率即可
-            # if not data_by_topic[camera_topic]:
-            #     continue
+        with self.profiler.stage("prepare_camera"):
+            camera_topic_resolution_dict = self.prepare_camera_topics()
 
-            # 获取camera数据的分辨率
-            camera_msg_sample = list(data_by_topic[camera_topic].values())[0]
-            np_arr = np.fromstring(camera_msg_sample.data, np.uint8)
-            image_np = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-            img_width = image_np.shape[1]
-            img_height = image_np.shape[0]
-            camera_topic_resolution_dict[camera_topic] = (img_width, img_height)
-        print("parse camera data finished")
-        main_timestamps = []
-        if not self.start_time and not self.end_time:
-            main_timestamps = list(data_by_topic[self.main_topic].keys())
-        else:
-            start_time, end_time = self.start_time, self.end_time
-            for timestamp in list(data_by_topic[self.main_topic].keys()):
-                if start_time <= timestamp <= end_time:
-                    main_timestamps.append(timestamp)
-        # 遍历main topic的时间戳,进行帧同步
-        for timestamp in main_timestamps:
-            all_topics_found = True
-            closest_time_dict = {}
-
-            # 第一次遍历，找到所有topic的最近时间戳,并判断是否所有的 topic msg 都在 time_diff_threshold_us 内
-            # - 如果不在，就跳过这个时间戳
-            # - 如果在，就保存这个时间戳所有 topic 的数据
-            for topic in topic_list:
-                # 如果这个topic没有数据，继续检查该topic是否是camera数据,
-                # 原则上允许camera数据缺失,但是其他数据不允许
-                if not data_by_topic[topic].keys():
-                    if topic in camera_topic_list:
-                        continue
-                    else:
-                        all_topics_found = False
-                        break
-
-                # 如果这个topic有数据但是时间同步不满足,需要进一步判断
-                # 如果是camera数据,则可以认为是时间同步满足的
-                # 如果是其他数据,则认为此帧所有数据都不满足时间同步,跳过
-                closest_time = closest_timestamp(
-                    timestamp, list(data_by_topic[topic].keys())
-                )
-                if abs(closest_time - timestamp) > self.time_diff_threshold_us:
-                    if topic in camera_topic_list:
-                        closest_time_dict[topic] = closest_time
-                        continue
-                    else:
-                        all_topics_found = False
-                        break
-                else:
-                    closest_time_dict[topic] = closest_time
+        # 各阶段耗时统计, 写入阶段的耗时由写入线程记录
+        stage_stats = StageStats()
+
+        # 基于 bag 索引一次性完成所有帧的同步, 只遍历满足同步条件的帧
+        if frame_list is None:
+            stage_start = time.time()
+            with self.profiler.stage("sync"):
+                frame_list = self.get_frame_list()
+            stage_stats.add("sync", time.time() - stage_start, len(frame_list))
 
-            # 当此帧所有数据都满足时间同步时,保存此帧数据
-            if all_topics_found:
-                sample_data_dict = {}
-                sample_data_dict["timestamp"] = timestamp
-                sample_data_dict["msg_info_list"] = []
+        # 图片编码和点云写入交给有界的写入线程池, 避免慢速的磁盘写入阻塞帧循环
+        writer = AsyncWriter(
+            worker_num=self.data_config.writer_worker_num,
+            queue_size=self.data_config.writer_queue_size,
+            stage_stats=stage_stats,
+        )
+        skipped_frame_num = 0
+        with self.profiler.stage("slice_frames"), writer:
+            for timestamp, closest_time_dict in frame_list:
+                # 先决定该帧保存为 sample 还是 sweep, 不保存 sweep 数据时, 非关键帧不会写入任何文件,
+                # 直接跳过, 不读取消息, 不融合点云, 也不解析 ego pose
+                # - 到达 sample_interval 时，保存一次 sample 数据
+                # - 其他时候，保存 sweep 数据
+                is_key_frame = self.sweeps_count % self.sample_interval == 0
+                if not is_key_frame and not self.save_sweep_data_flag:
+                    skipped_frame_num += 1
+                    self.sweeps_count += 1
+                    continue
+
+                # 断点续切时, 已经完整写入的帧直接跳过, 只恢复它的 ego pose, 文件记录和帧序号
+                if self.slice_manifest is not None:
+                    committed_frame = self.slice_manifest.get_committed_frame(timestamp)
+                    if committed_frame is not None:
+                        self.ego_pose_info_list.append(committed_frame["ego_pose"])
+                        self.sample_data_ledger.extend(committed_frame["file_list"])
+                        self.sweeps_count += 1
+                        continue
 
                 # fusion lidar points prepare
                 lidar_msg_dict = {}
 
                 # - 保存 ego_pose 数据
+                stage_start = time.time()
                 ego_pose_topic = pose_channel_topic_dict["ego-pose"]
-                ego_pose_msg = data_by_topic[ego_pose_topic][
-                    closest_time_dict[ego_pose_topic]
-                ]
+                ego_pose_msg = bag_reader.read_message(
+                    ego_pose_topic, closest_time_dict[ego_pose_topic]
+                )
                 (rotation, translation) = parse_ego_pose(ego_pose_msg)
                 ego_pose_info = {
                     "timestamp": timestamp,
@@ -248,43 +409,49 @@ class NuscenesInfo:
                 lidar_data_list = []
 
                 fusion_lidar_filename = rule.generate_filename(
-                    self.scene_name, "lidar-fusion", timestamp, ".pcd"
+                    self.scene_name, "lidar-fusion", timestamp, lidar_file_suffix
                 )
 
                 lidar_msg_dict = {}
                 for lidar_channel in lidar_channel_list:
                     lidar_topic = lidar_channel_topic_dict[lidar_channel]
-                    lidar_msg = data_by_topic[lidar_topic][
-                        closest_time_dict[lidar_topic]
-                    ]
+                    lidar_msg = bag_reader.read_message(
+                        lidar_topic, closest_time_dict[lidar_topic]
+                    )
                     lidar_msg_dict[lidar_channel] = lidar_msg
-                fusion_lidar_msg = fusion_lidar_points(
+                stage_stats.add("read", time.time() - stage_start)
+
+                stage_start = time.time()
+                # 融合结果为结构化的点云数组, 直接交给写入线程保存
+                fusion_lidar_array = fusion_lidar_points(
                     lidar_msg_dict=lidar_msg_dict,
-                    calib_info_dict=self.calib_info_dict,
+                    calib_registry=self.calib_registry,
                     lidar_fusion_flag=self.lidar_fusion_flag,
                     channel_name=self.lidar_topic_channel_dict[self.main_topic],
                     transform_lidar_flag=self.data_config.transform_lidar_flag,
+                    crop_filter=self.lidar_crop_filter,
+                    voxel_size=self.data_config.get_voxel_size(is_key_frame),
+                    voxel_reduction=self.data_config.voxel_reduction,
                 )
+                stage_stats.add("fusion", time.time() - stage_start)
                 lidar_data_list.append(
                     {
                         "filename": fusion_lidar_filename,
-                        "fileformat": "pcd",
+                        "fileformat": lidar_file_format,
                         "channel": "lidar-fusion",
-                        "data": fusion_lidar_msg,
+                        "data": fusion_lidar_array,
                     }
                 )
                 # - 保存 camera数据
                 camera_data_list = []
                 for camera_channel in camera_channel_list:
                     camera_topic = camera_channel_topic_dict[camera_channel]
-                    if (
-                        camera_topic not in data_by_topic
-                        or camera_topic not in closest_time_dict
-                    ):
+                    if camera_topic not in closest_time_dict:
                         continue
-                    camera_msg = data_by_topic[camera_topic][
-                        closest_time_dict[camera_topic]
-                    ]
+                    # camera 数据先保持原始的序列化形式, 只有在真正保存时才反序列化
+                    camera_msg = bag_reader.read_raw_message(
+                        camera_topic, closest_time_dict[camera_topic]
+                    )
                     camera_filename = rule.generate_filename(
                         self.scene_name, camera_channel, timestamp, ".jpg"
                     )
@@ -298,19 +465,12 @@ class NuscenesInfo:
                     )
                 data_list = camera_data_list + lidar_data_list
 
+                save_root_path = samples_path if is_key_frame else sweeps_path
+                write_job_list = []
                 for data in data_list:
                     filename = data["filename"]
-                    fileformat = data["fileformat"]
                     channel = data["channel"]
                     msg = data["data"]
-                    msg_info = {
-                        "height": 0,
-                        "width": 0,
-                        "filename": "",
-                        "fileformat": fileformat,
-                        "channel": channel,
-                    }
-                    sample_data_dict["msg_info_list"].append(msg_info)
 
                     # get camera resolution
                     default_img_width = 0
@@ -320,41 +480,250 @@ class NuscenesInfo:
                             camera_topic_resolution_dict[channel]
                         )
 
-                    # - 到达 sample_interval 时，保存一次 sample 数据
-                    # - 其他时候，保存 sweep 数据
-                    save_path = ""
-                    if self.sweeps_count % self.sample_interval == 0:
-                        save_path = os.path.join(samples_path, channel)
-                    elif self.save_sweep_data_flag:
-                        save_path = os.path.join(sweeps_path, channel)
-                    else:
-                        continue
+                    save_path = os.path.join(save_root_path, channel)
+
+                    # 文件写入完成后, 写入函数返回的宽高会填充到记录中
+                    sample_data_record = self.sample_data_ledger.add(
+                        timestamp=timestamp,
+                        channel=channel,
+                        is_key_frame=is_key_frame,
+                        filename=filename,
+                        path=os.path.relpath(
+                            os.path.join(save_path, filename), self.nuscenes_folder_path
+                        ),
+                    )
 
                     if channel in camera_channel_list:
-                        save_camera(
-                            msg,
-                            save_path,
-                            filename,
-                            default_img_width,
-                            default_img_height,
+                        write_job_list.append(
+                            (
+                                "camera",
+                                sample_data_record,
+                                save_camera,
+                                (
+                                    msg.deserialize(),
+                                    save_path,
+                                    filename,
+                                    default_img_width,
+                                    default_img_height,
+                                    self.data_config.camera_passthrough_flag,
+                                ),
+                            )
+                        )
+                    elif channel == "lidar-fusion" and lidar_file_format in ["bin", "packed"]:
+                        write_job_list.append(
+                            (
+                                "lidar",
+                                sample_data_record,
+                                save_lidar_bin,
+                                (msg, save_path, filename, self.data_config.save_pcd_dims),
+                            )
                         )
                     elif channel == "lidar-fusion":
-                        save_lidar(msg, save_path, filename)
+                        write_job_list.append(
+                            (
+                                "lidar",
+                                sample_data_record,
+                                save_lidar,
+                                (
+                                    msg,
+                                    save_path,
+                                    filename,
+                                    self.data_config.pcd_compression,
+                                    self.data_config.pcd_zstd_level,
+                                ),
+                            )
+                        )
                     else:
                         raise ValueError(f"{channel} not in camera or lidar list")
 
+                # 写入任务交给写入线程, 队列满时这里会阻塞
+                # 该帧的所有文件都写入完成后, 才会在清单中提交该帧
+                pending_frame = None
+                if self.slice_manifest is not None:
+                    pending_frame = PendingFrame(
+                        len(write_job_list),
+                        partial(
+                            self.slice_manifest.commit_frame,
+                            timestamp,
+                            ego_pose_info,
+                            [record for _, record, _, _ in write_job_list],
+                        ),
+                    )
+                for stage, sample_data_record, func, args in write_job_list:
+                    func = SampleDataLedger.wrap(sample_data_record, func)
+                    if pending_frame is not None:
+                        func = pending_frame.wrap(func)
+                    writer.submit(stage, func, *args)
+
                 self.sweeps_count += 1
 
+        stage_stats.report(
+            f"slice {self.scene_name} with {writer.worker_num} writer workers"
+        )
+        if skipped_frame_num:
+            print(f"    skip {skipped_frame_num} sweep frames, save_sweep_data_flag is off")
+        self.profiler.set_info("frame_num", len(frame_list))
+        self.profiler.set_info("skipped_frame_num", skipped_frame_num)
+        self.profiler.set_info("throughput", copy.deepcopy(stage_stats.stage_dict))
+
+    def prepare_camera_topics(self):
+        """获取每个 camera topic 的真实分辨率, 没有数据的 camera 会被注入一张默认分辨率的图片
+
+        Returns:
+            dict: 以 camera topic 为 key, value 为 (width, height)
+        """
+        bag_reader = self.bag_reader
+        camera_topic_list = []
+        camera_topic_list.extend(self.camera_topic_channel_dict.keys())
+        camera_topic_resolution_dict = {
+            topic: (1280, 720) for topic in camera_topic_list
+        }
+
+        # get camera real resolution
+        # 获取真实的camera分辨率,如果没有camera数据,则使用默认的分辨率
+        for camera_topic in camera_topic_list:
+            # 如果camera数据为空,为其填充一张默认分辨率的ros image
+            # Note : topic 存在但索引为空(没有消息)时与 topic 不存在的处理一致
+            if not bag_reader.get_timestamp_list(camera_topic):
+                # create fake ros image msg with default resolution
+                main_lidar_first_timestamp = bag_reader.read_message(
+                    self.main_topic, bag_reader.get_timestamp_list(self.main_topic)[0]
+                ).header.stamp
+                fake_camera_msg = msg = CompressedImage()
+                fake_camera_msg.header.stamp = main_lidar_first_timestamp
+                fake_camera_msg.format = "jpeg"
+                fake_image = np.zeros((720, 1280, 3), np.uint8)
+                _, fake_jpeg_image = cv2.imencode(".jpg", fake_image)
+                fake_jpeg_bytes = fake_jpeg_image.tobytes()
+                fake_camera_msg.data = fake_jpeg_bytes
+                bag_reader.inject_message(camera_topic, 0, fake_camera_msg)
+
+            # # 如果camera数据为空,则跳过,使用默认的分辨率即可
+            # if not data_by_topic[camera_topic]:
+            #     continue
+
+            # 获取camera数据的分辨率
+            camera_msg_sample = bag_reader.read_message(
+                camera_topic, bag_reader.get_timestamp_list(camera_topic)[0]
+            )
+            # 只解析 jpeg/png 文件头, 其他格式才完整解码
+            try:
+                img_width, img_height = get_image_size_from_bytes(
+                    camera_msg_sample.data
+                )
+            except ValueError:
+                np_arr = np.frombuffer(camera_msg_sample.data, np.uint8)
+                image_np = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+                img_width = image_np.shape[1]
+                img_height = image_np.shape[0]
+            camera_topic_resolution_dict[camera_topic] = (img_width, img_height)
+        print("parse camera data finished")
+
+        return camera_topic_resolution_dict
+
+    def get_frame_list(self):
+        """对当前时间窗口内的所有基准帧进行同步
+
+        Note : 需要先调用 prepare_camera_topics, 保证缺失的 camera 已经被注入默认图片
+
+        Returns:
+            list: 满足同步条件的帧列表, 每个元素为 (timestamp, closest_time_dict)
+        """
+        # bag 的索引中包含窗口两侧的余量, 这里再按照真正的时间窗口过滤基准时间戳
+        main_timestamps = []
+        for timestamp in self.bag_reader.get_timestamp_list(self.main_topic):
+            if self.start_time is not None and timestamp < self.start_time:
+                continue
+            if self.end_time is not None and timestamp > self.end_time:
+                continue
+            main_timestamps.append(timestamp)
+
+        sync_result = self.synchronize(main_timestamps)
+        return list(sync_result.iter_frames())
+
+    @staticmethod
+    def split_frame_list(frame_list, shard_num):
+        """将帧列表切分为 shard_num 个连续的分片
+
+        Args:
+            frame_list (list): 同步后的帧列表
+            shard_num (int): 分片数量
+
+        Returns:
+            list: 每个元素为 (sweeps_count_start, shard_frame_list), sweeps_count_start 为分片第一帧的
+                全局序号, 用于保证 sample/sweep 的划分与串行切片完全一致
+        """
+        shard_num = max(1, min(shard_num, len(frame_list)))
+        shard_size, remainder = divmod(len(frame_list), shard_num)
+
+        shard_list = []
+        start = 0
+        for shard_index in range(shard_num):
+            end = start + shard_size + (1 if shard_index < remainder else 0)
+            shard_list.append((start, frame_list[start:end]))
+            start = end
+        return shard_list
+
+    @staticmethod
+    def get_frame_list_time_range(frame_list):
+        """获取帧列表中所有基准时间戳以及匹配到的时间戳的范围(us)
+
+        Note : 时间戳为 0 的是注入的默认 camera 图片, 不在 bag 中, 不参与计算
+        """
+        timestamp_list = []
+        for timestamp, closest_time_dict in frame_list:
+            timestamp_list.append(timestamp)
+            timestamp_list.extend(t for t in closest_time_dict.values() if t > 0)
+        return min(timestamp_list), max(timestamp_list)
+
+    def synchronize(self, main_timestamps):
+        """基于 bag 索引中的时间戳, 为 main_timestamps 中的每一帧匹配所有 topic 的最近消息
+
+        Args:
+            main_timestamps (list): 基准 topic 的时间戳(us)列表
+
+        Returns:
+            SyncResult: 帧同步结果, 包含 frames x topics 的匹配矩阵和时间差矩阵
+        """
+        topic_list = []
+        topic_list.extend(self.camera_topic_channel_dict.keys())
+        topic_list.extend(self.lidar_topic_channel_dict.keys())
+        topic_list.extend(self.pose_topic_channel_dict.keys())
+
+        timestamp_list_by_topic = {
+            topic: self.bag_reader.get_timestamp_list(topic) for topic in topic_list
+        }
+        self.frame_synchronizer = FrameSynchronizer(
+            timestamp_list_by_topic=timestamp_list_by_topic,
+            time_diff_threshold_us=self.time_diff_threshold_us,
+            optional_topic_list=list(self.camera_topic_channel_dict.keys()),
+        )
+        sync_result = self.frame_synchronizer.match(main_timestamps)
+
+        print(f"sync {len(sync_result)}/{len(main_timestamps)} frames")
+        for topic, drop_stat in self.frame_synchronizer.drop_stats.items():
+            if drop_stat["missing"] or drop_stat["exceed_threshold"]:
+                print(f"    {topic} : {drop_stat}")
+
+        return sync_result
+
     def generate_database(self, save_path):
-        """生成nuscenes数据库"""
+        """生成nuscenes数据库
+
+        Note : sensor 和 sample_data 的信息来自切片过程中记录的 self.sample_data_ledger,
+            不再遍历输出目录, 也不再读取图片获取宽高
+        """
         # 1. 准备构建数据库所需的必要信息
         # - 对于已有的数据，只需从类中获取即可
-        # - 对于还没有的数据，需要从外部获取
-        sensor_info_list = generate_sensor_info_list(save_path)
+        sensor_info_list = generate_sensor_info_list_from_channel_list(
+            self.sample_data_ledger.get_key_frame_channel_list()
+        )
         calibrated_sensor_info_list = generate_calibrated_sensor_info_list(
             self.calib_info_dict
         )
-        sample_data_info_list_dict = generate_sample_data_info_list_dict(save_path)
+        sample_data_info_list_dict = self.sample_data_ledger.to_sample_data_info_list_dict(
+            self.scene_name
+        )
         ego_pose_info_list = self.ego_pose_info_list
 
         # 通过 sample_data_list_dict 构建 sample_timestamp_list
@@ -369,20 +738,34 @@ class NuscenesInfo:
                 sample_timestamp_list.append(timestamp)
 
         # 2. 构建数据库
-        self.nuscenes_databse_dict = self.build_database(
-            scene_name=self.scene_name,
-            map_name=self.map_name,
-            date_captured=self.date_captured,
-            sensor_info_list=sensor_info_list,
-            calibrated_sensor_info_list=calibrated_sensor_info_list,
-            ego_pose_info_list=ego_pose_info_list,
-            sample_data_info_list_dict=sample_data_info_list_dict,
-            sample_timestamp_list=sample_timestamp_list,
-            description=self.description,
-        )
+        with self.profiler.stage("build_database"):
+            self.nuscenes_databse_dict = self.build_database(
+                scene_name=self.scene_name,
+                map_name=self.map_name,
+                date_captured=self.date_captured,
+                sensor_info_list=sensor_info_list,
+                calibrated_sensor_info_list=calibrated_sensor_info_list,
+                ego_pose_info_list=ego_pose_info_list,
+                sample_data_info_list_dict=sample_data_info_list_dict,
+                sample_timestamp_list=sample_timestamp_list,
+                description=self.description,
+                lidar_voxel_info=self.data_config.get_voxel_info(),
+            )
 
         # 3. 将数据库转换成 json 文件存储
-        self.database_sequence_to_json(save_path)
+        with self.profiler.stage("write_json"):
+            self.database_sequence_to_json(save_path)
+
+        # 4. 将每个点云 channel 的 .bin 文件打包为一个 blob
+        # Note : 在 mark_complete 之前打包, 打包中断时续切会重新生成被删除的帧并重新打包
+        if self.data_config.lidar_file_format == "packed":
+            with self.profiler.stage("pack_lidar"):
+                pack_scene_point_clouds(
+                    scene_path=save_path,
+                    scene_name=self.scene_name,
+                    record_list=self.sample_data_ledger.record_list,
+                    dims=self.data_config.save_pcd_dims,
+                )
 
     @staticmethod
     def build_database(
@@ -395,6 +778,7 @@ class NuscenesInfo:
         sample_data_info_list_dict,
         sample_timestamp_list,
         description,
+        lidar_voxel_info=None,
     ):
         """构建nuscenes数据库
 
@@ -407,6 +791,7 @@ class NuscenesInfo:
             ego_pose_info_list (list): 包含所有ego_pose信息的列表
             sample_data_info_list_dict (dict): 包含所有sample_data信息的字典
             sample_timestamp_list (list): 包含所有sample的时间戳的列表
+            lidar_voxel_info (dict): 融合点云的体素降采样参数, 记录在 scene 表中, None 表示没有降采样
         """
         # - log_table :
         # - - 依赖 car_id 和 scene_id 保证唯一性
@@ -454,6 +839,7 @@ class NuscenesInfo:
             scene_name,
             sample_timestamp_list,
             description,
+            lidar_voxel_info,
         )
 
         # - sample_data_table :
@@ -490,50 +876,54 @@ class NuscenesInfo:
 
     def database_sequence_to_json(self, save_path):
         save_path = os.path.join(save_path, "v1.0-all")
+        json_options = {
+            "indent": self.data_config.json_indent,
+            "backend": self.data_config.json_backend,
+        }
         # vehicle sequence to json
         self.nuscenes_databse_dict["vehicle"]["log"].sequence_to_json(
-            save_path, "log.json"
+            save_path, "log.json", **json_options
         )
         self.nuscenes_databse_dict["vehicle"]["map"].sequence_to_json(
-            save_path, "map.json"
+            save_path, "map.json", **json_options
         )
         self.nuscenes_databse_dict["vehicle"]["calibrated_sensor"].sequence_to_json(
-            save_path, "calibrated_sensor.json"
+            save_path, "calibrated_sensor.json", **json_options
         )
         self.nuscenes_databse_dict["vehicle"]["sensor"].sequence_to_json(
-            save_path, "sensor.json"
+            save_path, "sensor.json", **json_options
         )
 
         # extraction sequence to json
         if self.nuscenes_databse_dict["extraction"]["scene"]:
             self.nuscenes_databse_dict["extraction"]["scene"].sequence_to_json(
-                save_path, "scene.json"
+                save_path, "scene.json", **json_options
             )
 
         if self.nuscenes_databse_dict["extraction"]["sample"]:
             self.nuscenes_databse_dict["extraction"]["sample"].sequence_to_json(
-                save_path, "sample.json"
+                save_path, "sample.json", **json_options
             )
 
         if self.nuscenes_databse_dict["extraction"]["sample_data"]:
             self.nuscenes_databse_dict["extraction"]["sample_data"].sequence_to_json(
-                save_path, "sample_data.json"
+                save_path, "sample_data.json", **json_options
             )
 
         if self.nuscenes_databse_dict["extraction"]["ego_pose"]:
             self.nuscenes_databse_dict["extraction"]["ego_pose"].sequence_to_json(
-                save_path, "ego_pose.json"
+                save_path, "ego_pose.json", **json_options
             )
 
         # taxonomy sequence to json
         self.nuscenes_databse_dict["taxonomy"]["category"].sequence_to_json(
-            save_path, "category.json"
+            save_path, "category.json", **json_options
         )
         self.nuscenes_databse_dict["taxonomy"]["attribute"].sequence_to_json(
-            save_path, "attribute.json"
+            save_path, "attribute.json", **json_options
         )
         self.nuscenes_databse_dict["taxonomy"]["visibility"].sequence_to_json(
-            save_path, "visibility.json"
+            save_path, "visibility.json", **json_options
         )
 
         # annotation sequence to json
@@ -545,174 +935,79 @@ class NuscenesInfo:
         with open(sample_annotation_path, "w") as f:
             f.write("[]")
 
-    def get_calib_info_from_bag(self):
-        """从bag包中获取标定信息,同时修正 bag 中 lidar 的真实topic与config中的topic的差异
-
-        Args:
-            bag_path (str): bag包路径
-            camera_topic_channel_dict (dict): camera topic 和 channel 的映射
-            lidar_topic_channel_dict (dict): lidar topic 和 channel 的映射
-
-        Returns:
-            calib_info_dict (dict): 标定信息字典
-            {
-                "topic0": CalibInfo(),
-                "topic1": CalibInfo(),
-            }
-
-            calib_info = CalibInfo(
-                        channel=channel,
-                        translation=translation,
-                        rotation=rotation,
-                        camera_info=camera_info,
-                    )
-        """
-
-        calib_info_dict = {}
-
-        # rename for easy use
-        bag_path = self.scene_bag_file
-
-        # 1. init all sensor calib info
-        # 1.1 init lidar-fusion calib info
-        lidar_fusion_calib_info = CalibInfo(
-            channel="lidar-fusion",
-            translation=[0, 0, 0],
-            rotation=[1, 0, 0, 0],
-            camera_info={},
-        )
-        calib_info_dict["lidar-fusion"] = lidar_fusion_calib_info
-
-        # 1.2 init camera calib info
-        for camera_channel in self.camera_topic_channel_dict.values():
-            camera_calib_info = CalibInfo(
-                channel=camera_channel,
-                translation=[0, 0, 0],
-                rotation=[1, 0, 0, 0],
-                camera_info="default",
-            )
-            calib_info_dict[camera_channel] = camera_calib_info
-
-        # 2. update calib info by parse tf info from bag
-        # 2.1 get real lidar channel list by parse lidar topic from bag
-        lidar_real_topic_channel_dict = {}
-        lidar_real_channel_list = []
-        # open bag and if error, raise bag_path
-        try:
-            with rosbag.Bag(bag_path, "r") as bag:
-                for topic, msg, t in bag.read_messages():
-                    if topic in self.lidar_topic_channel_dict:
-                        lidar_channel = self.lidar_topic_channel_dict[topic]
-                        lidar_real_channel_list.append(lidar_channel)
-                        lidar_real_topic_channel_dict[topic] = lidar_channel
-        except rosbag.bag.ROSBagException as e:
-            raise RuntimeError(f"Failed to open bag file {bag_path}: {str(e)}")
-
-        # update lidar_topic_channel_dict
-        self.lidar_topic_channel_dict = lidar_real_topic_channel_dict
-
-        # 2.2 lidar need get true calib info by parse tf info from bag
-        lidar_calib_info_dict = {}
-        for lidar_channel in lidar_real_channel_list:
-            lidar_calib_info_dict[lidar_channel] = None
-        with rosbag.Bag(bag_path, "r") as bag:
-            for topic, msg, t in bag.read_messages():
-                # check lidar_calib_info_dict is all filled
-                if all(lidar_calib_info_dict.values()):
-                    break
-                if topic == "/tf_static":
-                    lidar_topic = msg.child_frame_id
-                    lidar_channel = self.lidar_topic_channel_dict[lidar_topic]
-                    if lidar_topic in self.lidar_topic_channel_dict:
-                        translation = [
-                            msg.transform.translation.x,
-                            msg.transform.translation.y,
-                            msg.transform.translation.z,
-                        ]
-                        rotation = [
-                            msg.transform.rotation.w,
-                            msg.transform.rotation.x,
-                            msg.transform.rotation.y,
-                            msg.transform.rotation.z,
-                        ]
-                        lidar_calib_info = CalibInfo(
-                            channel=lidar_channel,
-                            translation=translation,
-                            rotation=rotation,
-                            camera_info={},
-                        )
-                        lidar_calib_info_dict[lidar_channel] = lidar_calib_info
-
-        # 3. check lidar_calib_info_dict is all filled
-        if not all(lidar_calib_info_dict.values()):
-            raise ValueError("lidar calib info not all filled")
-        calib_info_dict.update(lidar_calib_info_dict)
-
-        return calib_info_dict
-
     def parse_bag(self):
-        """从rosbag中提取数据,因为解析包耗时非常久,需要保证一次性读取完所有后续所需数据
+        """从rosbag中提取数据,为了控制内存占用,这里只读取bag的索引信息,不解码消息的内容
         所需获取数据包括:
             - calib_info_dict : 标定信息字典,需要构建一个字典, key为channel, value为CalibInfo,
                 其中key包括所有camera和所有lidar的channel,以及 lidar-fusion 为key的channel
             - 在bag中真实的lidar channel 和 camera channel,
                 因为在config中的channel是一个最大的集合,可能真实的bag中并不包含所有的channel
-            - data_by_topic : 从bag中提取的数据,以topic为key,value为时间戳和msg的字典
+            - bag_reader : 基于bag索引的读取器,其中包含每个topic的时间戳索引,
+                帧同步只基于索引进行,真正需要的消息在保存时才按需读取
         """
         bag_path = self.scene_bag_file
 
         # 1. 构建基本的数据结构
-        topic_list = []
-        topic_list.extend(self.camera_topic_channel_dict.keys())
-        topic_list.extend(self.lidar_topic_channel_dict.keys())
-        topic_list.extend(self.pose_topic_channel_dict.keys())
+        # 只关心 DataConfig 中定义的 topic, 其余 topic 不建立索引也不读取
+        topic_list = self.data_config.get_slice_topic_list()
 
         # 获取默认的标定信息字典
         calib_info_dict = self.get_default_calib_info_dict()
         lidar_real_topic_channel_dict = {}
-        data_by_topic = {}
 
-        # 2. 从bag中提取数据
+        # 2. 从bag中读取索引
+        # 如果指定了时间窗口, 则只读取窗口内的数据, 窗口两侧各留出一个同步阈值的余量,
+        # 保证窗口边缘的帧依然可以匹配到最近的消息
+        window_start_time = None
+        window_end_time = None
+        if self.start_time is not None:
+            window_start_time = self.start_time - self.time_diff_threshold_us
+        if self.end_time is not None:
+            window_end_time = self.end_time + self.time_diff_threshold_us
+
+        # camera 是可选的 topic, 允许超过同步阈值, 此时使用整个 bag 中最近的消息,
+        # 所以 camera 的索引不受时间窗口限制, 保证与不指定窗口时的匹配结果一致
+        # (只读取索引, 窗口外的 camera 消息只有在被匹配到时才会读取)
+        unwindowed_topic_list = ["/tf_static"]
+        unwindowed_topic_list.extend(self.camera_topic_channel_dict.keys())
+
         print("start parse bag")
-        try:
-            with rosbag.Bag(bag_path, "r") as bag:
-                for topic, msg, t in bag.read_messages():
-                    # get all data by topic
-                    if topic not in data_by_topic:
-                        data_by_topic[topic] = {}
-                    timestamp_us = ros_timestamp_to_us(t)
-                    data_by_topic[topic][timestamp_us] = msg
-
-                    # update lidar_topic_channel_dict
-                    if topic in self.lidar_topic_channel_dict:
-                        lidar_channel = self.lidar_topic_channel_dict[topic]
-                        lidar_real_topic_channel_dict[topic] = lidar_channel
-
-                    # get tf info
-                    if topic == "/tf_static":
-                        lidar_topic = msg.child_frame_id
-                        lidar_channel = self.lidar_topic_channel_dict[lidar_topic]
-                        if lidar_topic in self.lidar_topic_channel_dict:
-                            translation = [
-                                msg.transform.translation.x,
-                                msg.transform.translation.y,
-                                msg.transform.translation.z,
-                            ]
-                            rotation = [
-                                msg.transform.rotation.w,
-                                msg.transform.rotation.x,
-                                msg.transform.rotation.y,
-                                msg.transform.rotation.z,
-                            ]
-                            lidar_calib_info = CalibInfo(
-                                channel=lidar_channel,
-                                translation=translation,
-                                rotation=rotation,
-                                camera_info={},
-                            )
-                            calib_info_dict[lidar_channel] = lidar_calib_info
-        except rosbag.bag.ROSBagException as e:
-            raise RuntimeError(f"Failed to open bag file {bag_path}: {str(e)}")
+        bag_reader = BagIndexReader(
+            bag_path,
+            topic_list,
+            start_time=window_start_time,
+            end_time=window_end_time,
+            unwindowed_topic_list=unwindowed_topic_list,
+        )
+
+        # update lidar_topic_channel_dict
+        for topic, lidar_channel in self.lidar_topic_channel_dict.items():
+            if bag_reader.has_topic(topic):
+                lidar_real_topic_channel_dict[topic] = lidar_channel
+
+        # get tf info , /tf_static 数据量很小,直接全部读取
+        for _, msg in bag_reader.read_messages("/tf_static"):
+            lidar_topic = msg.child_frame_id
+            if lidar_topic in self.lidar_topic_channel_dict:
+                lidar_channel = self.lidar_topic_channel_dict[lidar_topic]
+                translation = [
+                    msg.transform.translation.x,
+                    msg.transform.translation.y,
+                    msg.transform.translation.z,
+                ]
+                rotation = [
+                    msg.transform.rotation.w,
+                    msg.transform.rotation.x,
+                    msg.transform.rotation.y,
+                    msg.transform.rotation.z,
+                ]
+                lidar_calib_info = CalibInfo(
+                    channel=lidar_channel,
+                    translation=translation,
+                    rotation=rotation,
+                    camera_info={},
+                )
+                calib_info_dict[lidar_channel] = lidar_calib_info
         print("finish parse bag")
         # 3. update
         # 3.1 use lidar_real_topic_channel_dict replace lidar_topic_channel_dict
@@ -721,8 +1016,10 @@ class NuscenesInfo:
         self.calib_info_dict = {
             key: value for key, value in calib_info_dict.items() if value
         }
-        # 3.3 update data_by_topic
-        self.data_by_topic = data_by_topic
+        # 3.3 build calib registry, 之后的热循环只读取其中缓存的变换
+        self.calib_registry = CalibRegistry(self.calib_info_dict)
+        # 3.4 update bag_reader
+        self.bag_reader = bag_reader
 
     def get_default_calib_info_dict(self):
         """获取默认的标定信息字典
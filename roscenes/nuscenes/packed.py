@@ -0,0 +1,226 @@
+import json
+import os
+
+import numpy as np
+
+from . import rule
+
+# 打包后的点云保存在场景根目录下的该文件夹中, 文件名带有场景名称, 合并多个场景时不会冲突
+PACKED_FOLDER = "packed"
+
+
+def get_packed_blob_path(scene_path, scene_name, channel):
+    return os.path.join(scene_path, PACKED_FOLDER, f"{scene_name}_{channel}.bin")
+
+
+def get_packed_index_path(scene_path, scene_name, channel):
+    return os.path.join(scene_path, PACKED_FOLDER, f"{scene_name}_{channel}.index.json")
+
+
+def get_packed_scene_name_list(path, channel="lidar-fusion"):
+    """获取目录(场景根目录或合并后的 nuscenes 根目录)下打包了 channel 的所有场景名称"""
+    packed_path = os.path.join(path, PACKED_FOLDER)
+    if not os.path.exists(packed_path):
+        return []
+    index_suffix = f"_{channel}.index.json"
+    return sorted(
+        filename[: -len(index_suffix)]
+        for filename in os.listdir(packed_path)
+        if filename.endswith(index_suffix)
+    )
+
+
+def pack_scene_point_clouds(scene_path, scene_name, record_list, dims, remove_source=True):
+    """将一个场景中每个点云 channel 的所有 .bin 文件按时间顺序拼接为一个 float32 的 blob
+
+    blob 旁边保存一个索引, 以 sample_data token 为 key, 记录每一帧在 blob 中的偏移和点数(单位均为点):
+        {
+            "scene_name": 场景名称,
+            "channel": channel,
+            "dtype": "float32",
+            "dims": 每个点的维度,
+            "point_num": blob 中的总点数,
+            "frames": {
+                sample_data_token: {
+                    "offset": 起始点的序号,
+                    "count": 点数,
+                    "timestamp": 时间戳(us),
+                    "is_key_frame": 是否为关键帧,
+                    "filename": 展开为单个文件时的路径(即 sample_data 中的 filename),
+                },
+                ...
+            },
+        }
+
+    blob 先写入临时文件再替换, 全部写入成功后才删除原来的单个文件, 中途崩溃时原有文件不受影响
+
+    Args:
+        scene_path (str): 场景根目录
+        scene_name (str): 场景名称
+        record_list (list): SampleDataLedger 中的记录, 只打包 fileformat 为 bin 的记录
+        dims (int): 每个点的维度
+        remove_source (bool): 打包完成后是否删除原来的单个文件
+
+    Returns:
+        dict: 以 channel 为 key, value 为 blob 的路径
+    """
+    channel_record_dict = {}
+    for record in record_list:
+        if record["filename"].split(".")[-1] != "bin":
+            continue
+        channel_record_dict.setdefault(record["channel"], []).append(record)
+
+    point_bytes = dims * np.dtype(np.float32).itemsize
+    blob_path_dict = {}
+    for channel, channel_record_list in channel_record_dict.items():
+        # 按照时间顺序排列, 训练时按时间顺序读取多帧 sweep 是顺序读
+        channel_record_list = sorted(channel_record_list, key=lambda x: x["timestamp"])
+        blob_path = get_packed_blob_path(scene_path, scene_name, channel)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+
+        frame_dict = {}
+        offset = 0
+        tmp_blob_path = blob_path + ".tmp"
+        with open(tmp_blob_path, "wb") as blob_file:
+            for record in channel_record_list:
+                with open(os.path.join(scene_path, record["path"]), "rb") as f:
+                    data = f.read()
+                if len(data) % point_bytes != 0:
+                    raise ValueError(
+                        f"{record['path']} size {len(data)} is not a multiple of {dims} float32"
+                    )
+                count = len(data) // point_bytes
+                blob_file.write(data)
+                token = rule.generate_sample_data_token(
+                    scene_name, record["timestamp"], channel
+                )
+                frame_dict[token] = {
+                    "offset": offset,
+                    "count": count,
+                    "timestamp": record["timestamp"],
+                    "is_key_frame": record["is_key_frame"],
+                    "filename": record["path"],
+                }
+                offset += count
+        os.replace(tmp_blob_path, blob_path)
+
+        index = {
+            "scene_name": scene_name,
+            "channel": channel,
+            "dtype": "float32",
+            "dims": dims,
+            "point_num": offset,
+            "frames": frame_dict,
+        }
+        index_path = get_packed_index_path(scene_path, scene_name, channel)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(index_path + ".tmp", index_path)
+        blob_path_dict[channel] = blob_path
+
+        if remove_source:
+            remove_packed_source_files(scene_path, channel_record_list)
+
+    return blob_path_dict
+
+
+def remove_packed_source_files(scene_path, record_list):
+    """删除已经打包的单个文件, 以及删除后为空的 channel 文件夹
+
+    Note : 需要删除空文件夹, 否则 scene_check 中 samples 下各个 channel 的文件数量会不一致
+    """
+    folder_set = set()
+    for record in record_list:
+        file_path = os.path.join(scene_path, record["path"])
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        folder_set.add(os.path.dirname(file_path))
+    for folder in folder_set:
+        if os.path.isdir(folder) and not os.listdir(folder):
+            os.rmdir(folder)
+
+
+class PackedPointCloudReader:
+    """读取打包后的点云, 每一帧返回 blob 的 np.memmap 视图, 不拷贝数据
+
+    Args:
+        scene_path (str): 场景根目录(或合并后的 nuscenes 根目录)
+        scene_name (str): 场景名称
+        channel (str): 点云的 channel, 例如 lidar-fusion
+    """
+
+    def __init__(self, scene_path, scene_name, channel="lidar-fusion"):
+        self.scene_path = scene_path
+        self.blob_path = get_packed_blob_path(scene_path, scene_name, channel)
+        self.index_path = get_packed_index_path(scene_path, scene_name, channel)
+
+        with open(self.index_path, "r") as f:
+            self.index = json.load(f)
+        self.dims = self.index["dims"]
+        self.frame_dict = self.index["frames"]
+        self.filename_dict = {
+            frame["filename"]: token for token, frame in self.frame_dict.items()
+        }
+
+        # 空的 blob 无法建立 memmap
+        if self.index["point_num"] == 0:
+            self.data = np.zeros((0, self.dims), dtype=np.float32)
+        else:
+            self.data = np.memmap(
+                self.blob_path,
+                dtype=np.dtype(self.index["dtype"]),
+                mode="r",
+                shape=(self.index["point_num"], self.dims),
+            )
+
+    def get_token_list(self):
+        """按照 blob 中的顺序(时间顺序)返回所有 sample_data token"""
+        return sorted(self.frame_dict, key=lambda token: self.frame_dict[token]["offset"])
+
+    def has_token(self, token):
+        return token in self.frame_dict
+
+    def get(self, token):
+        """获取一帧点云
+
+        Args:
+            token (str): sample_data token
+
+        Returns:
+            np.ndarray: shape (count, dims) 的只读视图
+        """
+        frame = self.frame_dict[token]
+        return self.data[frame["offset"] : frame["offset"] + frame["count"]]
+
+    def get_by_filename(self, filename):
+        """通过 sample_data 中的 filename 获取一帧点云"""
+        return self.get(self.filename_dict[filename])
+
+
+def export_packed_point_clouds(
+    scene_path, scene_name, channel="lidar-fusion", output_path=None, key_frame_only=False
+):
+    """将打包的点云展开为单个文件, 文件路径与 sample_data 中的 filename 一致
+
+    Args:
+        scene_path (str): 场景根目录
+        scene_name (str): 场景名称
+        channel (str): 点云的 channel
+        output_path (str): 输出的根目录, 默认为场景根目录, 即恢复打包前的目录结构
+        key_frame_only (bool): 是否只展开关键帧, 例如导出标注时只需要 samples
+
+    Returns:
+        int: 展开的文件数量
+    """
+    output_path = output_path or scene_path
+    reader = PackedPointCloudReader(scene_path, scene_name, channel)
+    export_num = 0
+    for token in reader.get_token_list():
+        frame = reader.frame_dict[token]
+        if key_frame_only and not frame["is_key_frame"]:
+            continue
+        file_path = os.path.join(output_path, frame["filename"])
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        reader.get(token).tofile(file_path)
+        export_num += 1
+    return export_num
@@ -0,0 +1,235 @@
+import json
+import os
+import resource
+import time
+
+
+def read_proc_io():
+    """读取当前进程累计的读写字节数
+
+    使用 /proc/self/io 中的 rchar/wchar, 即所有 read/write 系统调用的字节数(包含命中页缓存的部分),
+    非 linux 系统上返回 (None, None)
+
+    Returns:
+        tuple: (read_bytes, write_bytes)
+    """
+    try:
+        with open("/proc/self/io", "r") as f:
+            io_dict = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(io_dict["rchar"]), int(io_dict["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def read_peak_rss():
+    """读取当前进程的峰值 RSS (bytes)
+
+    优先使用 /proc/self/status 中的 VmHWM, 它可以通过 reset_peak_rss 重置, 从而得到某一段时间内的峰值;
+    否则使用 getrusage 的 ru_maxrss, 它是进程整个生命周期的峰值
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    # linux 下 ru_maxrss 的单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss():
+    """重置当前进程的峰值 RSS, 进程池中的 worker 会先后处理多个 bag, 需要重置后才能得到每个场景的峰值
+
+    Returns:
+        bool: 是否重置成功, 不支持时峰值为进程整个生命周期的峰值
+    """
+    try:
+        fd = os.open("/proc/self/clear_refs", os.O_WRONLY)
+    except OSError:
+        return False
+    try:
+        os.write(fd, b"5")
+        return True
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+
+class _NullStage:
+    """关闭统计时使用的空上下文, 不做任何事情"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.read_start, self.write_start = read_proc_io()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        read_end, write_end = read_proc_io()
+        read_bytes = None
+        write_bytes = None
+        if read_end is not None and self.read_start is not None:
+            read_bytes = read_end - self.read_start
+            write_bytes = write_end - self.write_start
+        self.profiler.add_stage(
+            self.name,
+            wall_seconds=time.perf_counter() - self.wall_start,
+            cpu_seconds=time.process_time() - self.cpu_start,
+            read_bytes=read_bytes,
+            write_bytes=write_bytes,
+            peak_rss_bytes=read_peak_rss(),
+        )
+        return False
+
+
+class StageProfiler:
+    """按阶段记录切片过程的 wall time, cpu time, 读写字节数以及峰值 RSS
+
+    用法:
+        profiler = StageProfiler(enabled=True)
+        with profiler.stage("sync"):
+            ...
+        profiler.save(report_path)
+
+    Note : cpu time, 读写字节数都是整个进程的统计, 包含写入线程在该阶段内的消耗;
+        峰值 RSS 为阶段结束时进程的峰值, 关闭时 stage() 返回一个空上下文, 不会有额外的开销
+
+    Args:
+        enabled (bool): 是否开启统计
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stage_dict = {}
+        self.info_dict = {}
+        # 峰值 RSS 是否从开始统计时重新计算, 否则为进程整个生命周期的峰值
+        self.peak_rss_reset = reset_peak_rss() if enabled else False
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def add_stage(
+        self,
+        name,
+        wall_seconds,
+        cpu_seconds,
+        read_bytes=None,
+        write_bytes=None,
+        peak_rss_bytes=None,
+        count=1,
+    ):
+        """累加一个阶段的统计, 同名阶段多次执行时耗时和字节数累加, 峰值 RSS 取最大值"""
+        if name not in self.stage_dict:
+            self.stage_dict[name] = {
+                "count": 0,
+                "wall_seconds": 0.0,
+                "cpu_seconds": 0.0,
+                "read_bytes": None,
+                "write_bytes": None,
+                "peak_rss_bytes": None,
+            }
+        stat = self.stage_dict[name]
+        stat["count"] += count
+        stat["wall_seconds"] += wall_seconds
+        stat["cpu_seconds"] += cpu_seconds
+        for key, value in [("read_bytes", read_bytes), ("write_bytes", write_bytes)]:
+            if value is not None:
+                stat[key] = (stat[key] or 0) + value
+        if peak_rss_bytes is not None:
+            stat["peak_rss_bytes"] = max(stat["peak_rss_bytes"] or 0, peak_rss_bytes)
+
+    def set_info(self, key, value):
+        """记录与阶段无关的附加信息, 例如帧数, 各写入阶段的吞吐量"""
+        if self.enabled:
+            self.info_dict[key] = value
+
+    def copy(self):
+        """复制已有的统计, 用于从同一个 bag 派生出的场景, 共享的 parse_bag 等阶段会出现在每个场景中"""
+        profiler = StageProfiler(enabled=False)
+        profiler.enabled = self.enabled
+        profiler.peak_rss_reset = self.peak_rss_reset
+        profiler.stage_dict = {name: dict(stat) for name, stat in self.stage_dict.items()}
+        profiler.info_dict = dict(self.info_dict)
+        return profiler
+
+    def get_peak_rss(self):
+        """所有阶段中的最大峰值 RSS (bytes), 没有记录时返回 None"""
+        peak_rss_list = [
+            stat["peak_rss_bytes"]
+            for stat in self.stage_dict.values()
+            if stat["peak_rss_bytes"] is not None
+        ]
+        return max(peak_rss_list) if peak_rss_list else None
+
+    def to_dict(self):
+        return {
+            "pid": os.getpid(),
+            "wall_seconds": sum(stat["wall_seconds"] for stat in self.stage_dict.values()),
+            "cpu_seconds": sum(stat["cpu_seconds"] for stat in self.stage_dict.values()),
+            "peak_rss_bytes": self.get_peak_rss(),
+            "peak_rss_reset": self.peak_rss_reset,
+            "stages": self.stage_dict,
+            "info": self.info_dict,
+        }
+
+    def save(self, file_path):
+        """保存为 json 报告, 关闭统计时不做任何事情
+
+        Returns:
+            dict: 报告内容, 关闭统计时为 None
+        """
+        if not self.enabled:
+            return None
+        report = self.to_dict()
+        with open(file_path, "w") as f:
+            json.dump(report, f, indent=4)
+        return report
+
+    @staticmethod
+    def aggregate(report_list):
+        """汇总多个场景的报告, 耗时和字节数累加, 峰值 RSS 取最大值
+
+        Args:
+            report_list (list): 每个场景的报告, 格式与 to_dict 一致
+
+        Returns:
+            dict: 汇总后的报告
+        """
+        profiler = StageProfiler(enabled=False)
+        for report in report_list:
+            for name, stat in report["stages"].items():
+                profiler.add_stage(
+                    name,
+                    wall_seconds=stat["wall_seconds"],
+                    cpu_seconds=stat["cpu_seconds"],
+                    read_bytes=stat["read_bytes"],
+                    write_bytes=stat["write_bytes"],
+                    peak_rss_bytes=stat["peak_rss_bytes"],
+                    count=stat["count"],
+                )
+        return {
+            "scene_num": len(report_list),
+            "wall_seconds": sum(report["wall_seconds"] for report in report_list),
+            "cpu_seconds": sum(report["cpu_seconds"] for report in report_list),
+            "peak_rss_bytes": profiler.get_peak_rss(),
+            "stages": profiler.stage_dict,
+        }
@@ -7,8 +7,19 @@ Description:
 Copyright (c) 2023 by windzu, All Rights Reserved. 
 """
 
+from functools import lru_cache
+
 from .utils import generate_uuid_from_input
 
+# token 由 uuid5 计算得到, 同一个 token 在构建各个表时会被重复计算多次,
+# 例如 sample_data 的 prev/next, sample 的 token 等, 所以对 token 生成函数进行缓存
+# Note : typed=True 避免 1 和 1.0 这类相等但 str() 结果不同的参数共享缓存
+TOKEN_CACHE_SIZE = 65536
+
+
+def token_cache(func):
+    return lru_cache(maxsize=TOKEN_CACHE_SIZE, typed=True)(func)
+
 
 def generate_filename(scene_name, channel, timestamp, suffix):
     filename = str(scene_name) + "_" + str(channel) + "_" + str(timestamp) + str(suffix)
@@ -81,6 +92,24 @@ def get_scene_id_from_scene_name(scene_name):
         raise Exception("scene_id : {} is not valid.".format(scene_id))
 
 
+def generate_window_scene_name(scene_name, window_index):
+    """为同一个 bag 中切出的第 window_index 个时间窗口生成场景名称
+
+    在 scene_id 后追加窗口序号, 例如 0001-0_YC200A01-N1-0001 的第 2 个窗口为
+    0001-0-2_YC200A01-N1-0001, 生成的名称依然满足 scene_id_car_id 的格式
+
+    Args:
+        scene_name (str): 原始场景名称
+        window_index (int): 时间窗口序号
+
+    Returns:
+        str: 时间窗口对应的场景名称
+    """
+    scene_id = get_scene_id_from_scene_name(scene_name)
+    car_id = get_car_id_from_scene_name(scene_name)
+    return f"{scene_id}-{window_index}_{car_id}"
+
+
 def get_car_id_from_scene_name(scene_name: str):
     """parse car_id from scene_name
 
@@ -121,6 +150,7 @@ def get_car_id_from_scene_name(scene_name: str):
 
 
 # vehicle
+@token_cache
 def generate_log_token(scene_name):
     """生成log token
 
@@ -134,15 +164,18 @@ def generate_log_token(scene_name):
     return generate_uuid_from_input(input)
 
 
+@token_cache
 def generate_map_token(map_filename):
     return generate_uuid_from_input(map_filename)
 
 
+@token_cache
 def generate_calibrated_sensor_token(scene_name, channel):
     input = scene_name + "-calibrated_sensor-" + channel
     return generate_uuid_from_input(input)
 
 
+@token_cache
 def generate_sensor_token(channel):
     """生成sensor token
 
@@ -156,27 +189,32 @@ def generate_sensor_token(channel):
 
 
 # extraction
+@token_cache
 def generate_scene_token(scene_name):
     input = scene_name + "-scene"
     return generate_uuid_from_input(input)
 
 
+@token_cache
 def generate_sample_token(scene_name, timestamp):
     input = scene_name + "-sample-" + str(timestamp)
     return generate_uuid_from_input(input)
 
 
+@token_cache
 def generate_sample_data_token(scene_name, timestamp, channel):
     input = scene_name + "-sample_data-" + str(timestamp) + "-" + channel
     return generate_uuid_from_input(input)
 
 
+@token_cache
 def generate_ego_pose_token(scene_name, timestamp):
     input = scene_name + "-ego_pose-" + str(timestamp)
     return generate_uuid_from_input(input)
 
 
 # annotation
+@token_cache
 def generate_instance_token(scene_name, track_id):
     if track_id is None:
         return ""
@@ -185,6 +223,7 @@ def generate_instance_token(scene_name, track_id):
     return generate_uuid_from_input(input)
 
 
+@token_cache
 def generate_sample_annotation_token(scene_name, timestamp, object_id):
     if timestamp is None or object_id is None:
         return ""
@@ -194,10 +233,12 @@ def generate_sample_annotation_token(scene_name, timestamp, object_id):
 
 
 # taxonomy
+@token_cache
 def generate_category_token(category_name):
     return generate_uuid_from_input(category_name)
 
 
+@token_cache
 def generate_attribute_token(attribute_name):
     if attribute_name is None:
         return ""
@@ -0,0 +1,162 @@
+import numpy as np
+
+
+class SyncResult:
+    """帧同步结果
+
+    Args:
+        main_timestamps (np.ndarray): 基准 topic 的时间戳, shape (F,)
+        topic_list (list): 参与同步的 topic 列表, 顺序与矩阵的列对应
+        match_matrix (np.ndarray): 每一帧每个 topic 匹配到的时间戳, shape (F, T), 无数据时为 -1
+        residual_matrix (np.ndarray): 匹配时间戳与基准时间戳的差的绝对值(us), shape (F, T),
+            无数据时为 -1
+        valid_mask (np.ndarray): 每一帧是否满足同步条件, shape (F,)
+    """
+
+    def __init__(
+        self,
+        main_timestamps,
+        topic_list,
+        match_matrix,
+        residual_matrix,
+        valid_mask,
+    ):
+        self.main_timestamps = main_timestamps
+        self.topic_list = topic_list
+        self.match_matrix = match_matrix
+        self.residual_matrix = residual_matrix
+        self.valid_mask = valid_mask
+
+    def __len__(self):
+        return int(np.count_nonzero(self.valid_mask))
+
+    def iter_frames(self):
+        """遍历所有满足同步条件的帧
+
+        Yields:
+            tuple: (timestamp, closest_time_dict), 其中 closest_time_dict 以 topic 为 key,
+                value 为匹配到的时间戳, 没有数据的 topic 不会出现在字典中
+        """
+        for frame_index in np.flatnonzero(self.valid_mask):
+            yield self.get_frame(frame_index)
+
+    def get_frame(self, frame_index):
+        timestamp = int(self.main_timestamps[frame_index])
+        closest_time_dict = {}
+        for topic_index, topic in enumerate(self.topic_list):
+            closest_time = int(self.match_matrix[frame_index, topic_index])
+            if closest_time >= 0:
+                closest_time_dict[topic] = closest_time
+        return timestamp, closest_time_dict
+
+
+class FrameSynchronizer:
+    """基于有序 numpy 时间戳数组的多 topic 帧同步器
+
+    每个 topic 持有一个排序后的 int64 时间戳数组, 通过 searchsorted 一次性为所有基准时间戳找到
+    最近的消息, 复杂度为 O(F * T * log(N)), 与逐帧遍历 key 列表相比可以忽略不计
+
+    同步规则与原逐帧实现保持一致:
+        - 必须的 topic (lidar, pose) 没有数据或时间差超过阈值时, 丢弃该帧
+        - 可选的 topic (camera) 允许缺失, 也允许时间差超过阈值, 此时仍使用最近的消息
+
+    Args:
+        timestamp_list_by_topic (dict): 以 topic 为 key, value 为时间戳(us)列表
+        time_diff_threshold_us (int): 时间同步阈值(us)
+        optional_topic_list (list): 可选的 topic 列表
+    """
+
+    def __init__(
+        self,
+        timestamp_list_by_topic,
+        time_diff_threshold_us,
+        optional_topic_list=None,
+    ):
+        self.topic_list = list(timestamp_list_by_topic.keys())
+        self.time_diff_threshold_us = int(time_diff_threshold_us)
+        self.optional_topic_list = list(optional_topic_list or [])
+
+        self.timestamp_array_by_topic = {
+            topic: np.sort(np.asarray(timestamp_list, dtype=np.int64))
+            for topic, timestamp_list in timestamp_list_by_topic.items()
+        }
+
+        # 最近一次同步各 topic 的丢帧统计
+        self.drop_stats = {}
+
+    def match(self, main_timestamps):
+        """为所有基准时间戳匹配每个 topic 的最近时间戳
+
+        Args:
+            main_timestamps (list): 基准 topic 的时间戳(us)列表
+
+        Returns:
+            SyncResult: 帧同步结果
+        """
+        main_timestamps = np.asarray(main_timestamps, dtype=np.int64)
+        frame_num = main_timestamps.shape[0]
+        topic_num = len(self.topic_list)
+
+        match_matrix = np.full((frame_num, topic_num), -1, dtype=np.int64)
+        residual_matrix = np.full((frame_num, topic_num), -1, dtype=np.int64)
+        valid_mask = np.ones(frame_num, dtype=bool)
+
+        drop_stats = {}
+        for topic_index, topic in enumerate(self.topic_list):
+            is_optional = topic in self.optional_topic_list
+            timestamp_array = self.timestamp_array_by_topic[topic]
+
+            # 如果这个topic没有数据, 原则上允许camera数据缺失, 但是其他数据不允许
+            if timestamp_array.shape[0] == 0:
+                if not is_optional:
+                    valid_mask[:] = False
+                drop_stats[topic] = {
+                    "missing": frame_num,
+                    "exceed_threshold": 0,
+                    "max_residual_us": None,
+                }
+                continue
+
+            closest = self.closest_timestamps(main_timestamps, timestamp_array)
+            residual = np.abs(closest - main_timestamps)
+            match_matrix[:, topic_index] = closest
+            residual_matrix[:, topic_index] = residual
+
+            exceed_mask = residual > self.time_diff_threshold_us
+            if not is_optional:
+                valid_mask &= ~exceed_mask
+            drop_stats[topic] = {
+                "missing": 0,
+                "exceed_threshold": int(np.count_nonzero(exceed_mask)),
+                "max_residual_us": int(residual.max()) if frame_num else None,
+            }
+
+        self.drop_stats = drop_stats
+        return SyncResult(
+            main_timestamps=main_timestamps,
+            topic_list=self.topic_list,
+            match_matrix=match_matrix,
+            residual_matrix=residual_matrix,
+            valid_mask=valid_mask,
+        )
+
+    @staticmethod
+    def closest_timestamps(target_timestamps, timestamp_array):
+        """向量化版本的 closest_timestamp, 距离相同时取较早的时间戳
+
+        Args:
+            target_timestamps (np.ndarray): 目标时间戳, shape (F,)
+            timestamp_array (np.ndarray): 排序后的非空时间戳数组, shape (N,)
+
+        Returns:
+            np.ndarray: 每个目标时间戳最近的时间戳, shape (F,)
+        """
+        last_index = timestamp_array.shape[0] - 1
+        idx = np.searchsorted(timestamp_array, target_timestamps, side="left")
+        before = timestamp_array[np.clip(idx - 1, 0, last_index)]
+        after = timestamp_array[np.clip(idx, 0, last_index)]
+
+        use_after = (idx == 0) | (
+            (idx <= last_index) & (after - target_timestamps < target_timestamps - before)
+        )
+        return np.where(use_after, after, before)
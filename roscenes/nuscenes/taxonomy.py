@@ -6,8 +6,9 @@ LastEditTime: 2023-11-03 18:04:52
 Description: 
 Copyright (c) 2023 by windzu, All Rights Reserved. 
 """
+from ..common.json_writer import DEFAULT_JSON_BACKEND, DEFAULT_JSON_INDENT
 from . import rule
-from .utils import generate_uuid_from_input, save_to_json
+from .utils import save_to_json
 
 
 class CategoryTable:
@@ -134,12 +135,12 @@ class CategoryTable:
 
         self.category_name_list = [category.name for category in self.category_list]
 
-    def sequence_to_json(self, path, filename):
-        result = []
-        for category in self.category_list:
-            result.append(category.sequence_to_json())
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+    ):
+        result = (category.sequence_to_json() for category in self.category_list)
 
-        save_to_json(result, path, filename)
+        save_to_json(result, path, filename, indent=indent, backend=backend)
 
 
 class Category:
@@ -147,7 +148,7 @@ class Category:
         components = [c0, c1, c2]
         non_empty_components = [c for c in components if c]
         self.name = ".".join(non_empty_components)
-        self.token = generate_uuid_from_input(self.name)
+        self.token = rule.generate_category_token(self.name)
         self.description = description
 
     def sequence_to_json(self):
@@ -202,18 +203,18 @@ class AttributeTable:
 
         self.attribute_name_list = [attribute.name for attribute in self.attribute_list]
 
-    def sequence_to_json(self, path, filename):
-        result = []
-        for attribute in self.attribute_list:
-            result.append(attribute.sequence_to_json())
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+    ):
+        result = (attribute.sequence_to_json() for attribute in self.attribute_list)
 
-        save_to_json(result, path, filename)
+        save_to_json(result, path, filename, indent=indent, backend=backend)
 
 
 class Attribute:
     def __init__(self, category, attribute, description=""):
         self.name = category + "." + attribute
-        self.token = generate_uuid_from_input(self.name)
+        self.token = rule.generate_attribute_token(self.name)
         self.description = description
 
     def sequence_to_json(self):
@@ -236,12 +237,12 @@ class VisibilityTable:
             ),
         ]
 
-    def sequence_to_json(self, path, filename):
-        result = []
-        for visibility in self.visibility_list:
-            result.append(visibility.sequence_to_json())
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+    ):
+        result = (visibility.sequence_to_json() for visibility in self.visibility_list)
 
-        save_to_json(result, path, filename)
+        save_to_json(result, path, filename, indent=indent, backend=backend)
 
 
 class Visibility:
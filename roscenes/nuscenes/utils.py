@@ -1,6 +1,5 @@
 import bisect
 import datetime
-import json
 import os
 import uuid
 
@@ -9,6 +8,19 @@ import numpy as np
 import rosbag
 from pypcd import pypcd
 
+from ..common.data_config import VOXEL_REDUCTION_LIST
+from ..common.json_writer import (
+    DEFAULT_JSON_BACKEND,
+    DEFAULT_JSON_INDENT,
+    save_json_table,
+)
+from ..common.pcd_codec import DEFAULT_PCD_COMPRESSION, DEFAULT_ZSTD_LEVEL, save_pcd
+from ..common.image_meta import (
+    get_image_format,
+    get_image_size,
+    get_image_size_from_bytes,
+)
+
 
 NAMESPACE_URL = uuid.NAMESPACE_URL
 
@@ -19,17 +31,24 @@ def save_camera(
     filename,
     default_img_width,
     default_img_height,
+    passthrough=False,
 ):
     file_path = os.path.join(path, filename)
 
-    if not os.path.exists(os.path.dirname(file_path)):
-        os.makedirs(os.path.dirname(file_path))
+    # 多个写入线程可能同时创建同一个目录
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
     # save CompressedImage to png
     # 如果 msg 不为空 则按照正常流程保存图片
     # 如果 msg 为空 则创建一张绿色图片,并保存,使用默认的宽高
-    if msg:
-        np_arr = np.fromstring(msg.data, np.uint8)
+    # 如果开启 passthrough 且压缩格式与文件后缀一致, 则直接写入原始字节, 不做解码和重新编码
+    if msg and passthrough and is_passthrough_image(msg.data, filename):
+        img_width, img_height = get_image_size_from_bytes(msg.data)
+        with open(file_path, "wb") as f:
+            f.write(msg.data)
+        return (img_width, img_height, file_path)
+    elif msg:
+        np_arr = np.frombuffer(msg.data, np.uint8)
         image_np = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
         cv2.imwrite(file_path, image_np)
 
@@ -45,89 +64,322 @@ def save_camera(
         return (default_img_width, default_img_height, file_path)
 
 
-def save_lidar(msg, path, filename):
+def is_passthrough_image(data, filename):
+    """判断压缩图片是否可以不经过解码直接写入文件
+
+    Note : 不依赖 CompressedImage 的 format 字段 (其内容因驱动而异), 而是根据数据的魔数判断,
+        只有数据格式与文件后缀一致时才能直接写入
+
+    Args:
+        data (bytes): CompressedImage 中的图片数据
+        filename (str): 保存的文件名
+
+    Returns:
+        bool: 是否可以直接写入
+    """
+    image_format = get_image_format(data)
+    suffix = os.path.splitext(filename)[1].lower()
+    if image_format == "jpeg":
+        return suffix in (".jpg", ".jpeg")
+    if image_format == "png":
+        return suffix == ".png"
+    return False
+
+
+# 融合后点云的数据格式, 与 (N, 4) 的 float32 数组内存布局一致
+FUSION_POINT_DTYPE = np.dtype(
+    [
+        ("x", np.float32),
+        ("y", np.float32),
+        ("z", np.float32),
+        ("intensity", np.float32),
+    ]
+)
+
+# PointCloud2 中的 PointField 数据类型与 numpy 数据类型的对应关系
+POINT_FIELD_DTYPE_DICT = {
+    1: np.int8,
+    2: np.uint8,
+    3: np.int16,
+    4: np.uint16,
+    5: np.int32,
+    6: np.uint32,
+    7: np.float32,
+    8: np.float64,
+}
+
+
+def save_lidar(
+    msg,
+    path,
+    filename,
+    compression=DEFAULT_PCD_COMPRESSION,
+    zstd_level=DEFAULT_ZSTD_LEVEL,
+):
+    """保存点云为 pcd
+
+    Note : 编码(lzf/zstd 压缩)在调用该函数的写入线程中进行, 多个写入线程可以同时压缩不同的帧
+
+    Args:
+        msg (PointCloud2 or np.ndarray): ros 点云消息, 或者结构化的点云数组(例如融合后的点云)
+        path (str): 保存路径
+        filename (str): 文件名
+        compression (str): 压缩方式, 见 pcd_codec.PCD_COMPRESSION_LIST
+        zstd_level (int): zstd 的压缩级别
+    """
+    file_path = os.path.join(path, filename)
+
+    # 多个写入线程可能同时创建同一个目录
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    if isinstance(msg, np.ndarray):
+        pc = point_cloud_from_structured_array(msg)
+    else:
+        pc = pypcd.PointCloud.from_msg(msg)
+    save_pcd(pc, file_path, compression, zstd_level)
+    return (0, 0, file_path)
+
+
+def save_lidar_bin(points, path, filename, dims=4):
+    """保存点云为 float32 的 .bin 文件, 与 mmdet3d 读取 nuscenes 点云的格式一致
+
+    每个点 dims 个 float32, 前 4 维为 x, y, z, intensity, 多出的维度填充 0 (例如 nuscenes 的 5 维格式),
+    dims 为 3 时只保存 x, y, z
+
+    Args:
+        points (np.ndarray): 融合后的点云, dtype 为 FUSION_POINT_DTYPE
+        path (str): 保存路径
+        filename (str): 文件名
+        dims (int): 每个点保存的维度
+    """
     file_path = os.path.join(path, filename)
 
-    if not os.path.exists(os.path.dirname(file_path)):
-        os.makedirs(os.path.dirname(file_path))
+    # 多个写入线程可能同时创建同一个目录
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
-    # save PointCloud2 to bin
-    pc = pypcd.PointCloud.from_msg(msg)
-    pc.save_pcd(file_path, compression="binary_compressed")
-    # pc.save_bin(file_path, "xyzi")
+    # FUSION_POINT_DTYPE 与 (N, 4) 的 float32 数组内存布局一致, dims 为 4 时不需要任何拷贝
+    xyzi = np.ascontiguousarray(points).view(np.float32).reshape(-1, 4)
+    if dims == 4:
+        data = xyzi
+    else:
+        data = np.zeros((xyzi.shape[0], dims), dtype=np.float32)
+        data[:, : min(dims, 4)] = xyzi[:, : min(dims, 4)]
+    data.tofile(file_path)
     return (0, 0, file_path)
 
 
+def point_cloud_from_structured_array(points):
+    """由结构化的点云数组构建 pypcd.PointCloud
+
+    Note : pypcd.PointCloud.from_array 会复制一份数据, 这里直接引用原数组
+
+    Args:
+        points (np.ndarray): 结构化的点云数组, 每个 field 的 count 都为 1
+
+    Returns:
+        pypcd.PointCloud: 点云
+    """
+    md = {
+        "version": 0.7,
+        "fields": list(points.dtype.names),
+        "size": [],
+        "count": [],
+        "width": len(points),
+        "height": 1,
+        "viewpoint": [0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0],
+        "points": len(points),
+        "type": [],
+        "data": "binary_compressed",
+    }
+    for field in md["fields"]:
+        type_, size_ = pypcd.numpy_type_to_pcd_type[points.dtype.fields[field][0]]
+        md["type"].append(type_)
+        md["size"].append(size_)
+        md["count"].append(1)
+    return pypcd.PointCloud(md, points)
+
+
+def pointcloud2_to_structured_view(msg, field_names=("x", "y", "z", "intensity")):
+    """将 PointCloud2 的数据直接视为结构化数组, 不复制数据
+
+    Args:
+        msg (PointCloud2): ros 点云消息
+        field_names (tuple): 需要的 field, 其余 field 作为填充跳过
+
+    Returns:
+        np.ndarray: 只读的结构化数组视图, shape (height * width,)
+    """
+    field_dict = {field.name: field for field in msg.fields}
+    for name in field_names:
+        if name not in field_dict:
+            raise ValueError(f"PointCloud2 has no field {name}")
+
+    byte_order = ">" if msg.is_bigendian else "<"
+    dtype = np.dtype(
+        {
+            "names": list(field_names),
+            "formats": [
+                np.dtype(POINT_FIELD_DTYPE_DICT[field_dict[name].datatype]).newbyteorder(
+                    byte_order
+                )
+                for name in field_names
+            ],
+            "offsets": [field_dict[name].offset for name in field_names],
+            "itemsize": msg.point_step,
+        }
+    )
+    # 反序列化得到的 data 为 bytes, 手动构建的消息中 data 可能为 list
+    buffer = msg.data
+    if not isinstance(buffer, (bytes, bytearray, memoryview)):
+        buffer = np.asarray(buffer, dtype=np.uint8)
+
+    # 按照 row_step 和 point_step 构建视图, 兼容每行末尾有填充的情况
+    view = np.ndarray(
+        shape=(msg.height, msg.width),
+        dtype=dtype,
+        buffer=buffer,
+        strides=(msg.row_step, msg.point_step),
+    )
+    return view.reshape(-1)
+
+
 def fusion_lidar_points(
     lidar_msg_dict,
-    calib_info_dict,
+    calib_registry,
     lidar_fusion_flag,
     channel_name=None,
     transform_lidar_flag=True,
+    crop_filter=None,
+    voxel_size=None,
+    voxel_reduction="max",
 ):
-    def transform_pc2_msg(msg, transform_matrix):
-        """变换pcd
+    """融合多个 lidar 的点云
 
-        Args:
-            pcd (PointCloud2): pcd
-            transform (numpy.ndarray): 变换矩阵
+    - 直接将 PointCloud2 的数据视为结构化数组, 不经过 pypcd 的转换
+    - nan 过滤以及裁剪(crop_filter)合并为每个 lidar 的一个 mask
+    - 先统计每个 lidar 的有效点数, 一次性分配融合后的输出数组
+    - 旋转和平移在 float32 下进行, 结果直接写入输出数组
 
-        Returns:
-            numpy.ndarray: 变换后的pcd
-        """
-        pc = pypcd.PointCloud.from_msg(msg)
-        x = pc.pc_data["x"].flatten()
-        y = pc.pc_data["y"].flatten()
-        z = pc.pc_data["z"].flatten()
-        intensity = pc.pc_data["intensity"].flatten()
-        nan_index = (
-            np.isnan(x) | np.isnan(y) | np.isnan(z) | np.isnan(intensity)
-        )  # filter nan data
-        pc_array_4d = np.zeros((x[~nan_index].shape[0], 4), dtype=np.float32)
-        pc_array_4d[:, 0] = x[~nan_index]
-        pc_array_4d[:, 1] = y[~nan_index]
-        pc_array_4d[:, 2] = z[~nan_index]
-        pc_array_4d[:, 3] = 1  # 待会儿要乘以变换矩阵，所以最后一列要是1
-
-        if transform_matrix is None:
-            return pc_array_4d
-        pc_array_4d = np.dot(transform_matrix, pc_array_4d.T).T
-        pc_array_4d[:, 3] = intensity[~nan_index]  # 变换后的点云的intensity要重新赋值
-        return pc_array_4d
-
-    fusion_lidar_msg = None
-    fusion_lidar_array = None
-    lidar_calib_dict = {}
-    for tmp_channel_name in lidar_msg_dict.keys():
-        lidar_calib_dict[tmp_channel_name] = calib_info_dict[
-            tmp_channel_name
-        ].get_transform_matrix()
-
-    for tmp_channel_name in lidar_msg_dict.keys():
+    Args:
+        lidar_msg_dict (dict): 以 channel 为 key, value 为 PointCloud2
+        calib_registry (CalibRegistry): 标定信息注册表, 提供每个 lidar 到融合坐标系的变换
+        lidar_fusion_flag (bool): 是否融合所有 lidar, 否则只使用 channel_name 对应的 lidar
+        channel_name (str): 不融合时使用的 lidar channel
+        transform_lidar_flag (bool): 是否将点云变换到融合坐标系, 不变换时 intensity 为 1
+        crop_filter (LidarCropFilter): 车身排除框以及范围裁剪, None 表示不裁剪
+        voxel_size (float): 融合后体素降采样的体素边长(m), None 表示不降采样
+        voxel_reduction (str): 体素内点的合并方式, 见 voxel_downsample
+
+    Returns:
+        np.ndarray: 融合后的点云, dtype 为 FUSION_POINT_DTYPE, 可以直接交给 save_lidar 保存
+    """
+    # 1. 获取每个 lidar 的点云视图以及有效点(过滤 nan 以及裁剪)
+    lidar_view_list = []
+    for tmp_channel_name, msg in lidar_msg_dict.items():
         if not lidar_fusion_flag:
             if tmp_channel_name != channel_name:
                 continue
 
-        # transform pcd
-        pc_array_4d = None
+        view = pointcloud2_to_structured_view(msg)
+        nan_index = (
+            np.isnan(view["x"])
+            | np.isnan(view["y"])
+            | np.isnan(view["z"])
+            | np.isnan(view["intensity"])
+        )  # filter nan data
+        valid_index = None if not nan_index.any() else ~nan_index
+        if crop_filter is not None:
+            transform = (
+                calib_registry.get_lidar_to_fusion(tmp_channel_name)
+                if transform_lidar_flag
+                else (None, None)
+            )
+            keep_index = crop_filter.get_keep_mask(tmp_channel_name, view, *transform)
+            if keep_index is not None:
+                valid_index = keep_index if valid_index is None else valid_index & keep_index
+        valid_num = view.shape[0] if valid_index is None else int(valid_index.sum())
+        lidar_view_list.append((tmp_channel_name, view, valid_index, valid_num))
+
+    # 2. 按照总点数一次性分配输出数组, 以及变换时使用的临时数组
+    total_num = sum(valid_num for _, _, _, valid_num in lidar_view_list)
+    max_num = max([valid_num for _, _, _, valid_num in lidar_view_list] + [0])
+    fusion_lidar_array = np.empty((total_num, 4), dtype=np.float32)
+    xyz_buffer = np.empty((max_num, 3), dtype=np.float32) if transform_lidar_flag else None
+
+    # 3. 逐个 lidar 拷贝有效点并变换, 结果写入输出数组对应的区间
+    start = 0
+    for tmp_channel_name, view, valid_index, valid_num in lidar_view_list:
+        end = start + valid_num
+        segment = fusion_lidar_array[start:end]
+        for i, field in enumerate(FUSION_POINT_DTYPE.names):
+            if valid_index is None:
+                segment[:, i] = view[field]
+            else:
+                segment[:, i] = view[field][valid_index]
+
         if transform_lidar_flag:
-            pc_array_4d = transform_pc2_msg(
-                lidar_msg_dict[tmp_channel_name], lidar_calib_dict[tmp_channel_name]
+            rotation, translation = calib_registry.get_lidar_to_fusion(
+                tmp_channel_name
             )
-        else:
-            pc_array_4d = transform_pc2_msg(lidar_msg_dict[tmp_channel_name], None)
 
-        if fusion_lidar_array is None:
-            fusion_lidar_array = pc_array_4d
+            xyz = xyz_buffer[:valid_num]
+            np.dot(segment[:, :3], rotation.T, out=xyz)
+            np.add(xyz, translation, out=segment[:, :3])
         else:
-            fusion_lidar_array = np.vstack((fusion_lidar_array, pc_array_4d))
+            # Note : 与原有实现一致, 不变换点云时 intensity 保存为 1
+            segment[:, 3] = 1
+        start = end
 
-    fusion_lidar_pc = pypcd.PointCloud.from_array_without_dtype(
-        fusion_lidar_array, format="xyzi"
-    )
-    fusion_lidar_msg = fusion_lidar_pc.to_msg()
+    if voxel_size:
+        fusion_lidar_array = voxel_downsample(fusion_lidar_array, voxel_size, voxel_reduction)
+    return fusion_lidar_array.view(FUSION_POINT_DTYPE).reshape(-1)
 
-    return fusion_lidar_msg
+
+def voxel_downsample(points, voxel_size, reduction="max"):
+    """体素降采样
+
+    每个点按照 floor(xyz / voxel_size) 得到体素坐标, 体素坐标线性编码为一个 int64 的 key
+    (超出 int64 范围时退回按行去重), 同一个 key 的点合并为一个点:
+        - max : 保留体素内 intensity 最大的点, 点的坐标不变
+        - mean : 体素内所有点的 x, y, z, intensity 取平均
+
+    Args:
+        points (np.ndarray): shape (N, 4) 的 float32 数组, x, y, z, intensity
+        voxel_size (float): 体素边长(m)
+        reduction (str): "max" 或 "mean"
+
+    Returns:
+        np.ndarray: shape (M, 4) 的 float32 数组, 按照体素的 key 排序
+    """
+    if reduction not in VOXEL_REDUCTION_LIST:
+        raise ValueError(
+            f"voxel reduction should be one of {VOXEL_REDUCTION_LIST}, but got {reduction}"
+        )
+    if points.shape[0] == 0:
+        return points
+
+    coords = np.floor(points[:, :3] / np.float32(voxel_size)).astype(np.int64)
+    coords -= coords.min(axis=0)
+    shape = coords.max(axis=0) + 1
+    if float(shape[0]) * float(shape[1]) * float(shape[2]) < 2 ** 62:
+        key = (coords[:, 0] * shape[1] + coords[:, 1]) * shape[2] + coords[:, 2]
+        unique_key, inverse = np.unique(key, return_inverse=True)
+    else:
+        unique_key, inverse = np.unique(coords, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+    voxel_num = unique_key.shape[0]
+
+    if reduction == "max":
+        # 先按体素排序, 体素内再按 intensity 排序, 每个体素的最后一个点即为 intensity 最大的点
+        order = np.lexsort((points[:, 3], inverse))
+        last_index = np.flatnonzero(np.diff(inverse[order], append=voxel_num))
+        return np.ascontiguousarray(points[order[last_index]])
+
+    count = np.bincount(inverse, minlength=voxel_num)
+    result = np.empty((voxel_num, 4), dtype=np.float32)
+    for i in range(4):
+        result[:, i] = np.bincount(inverse, weights=points[:, i], minlength=voxel_num) / count
+    return result
 
 
 def parse_ego_pose(msg):
@@ -208,14 +460,20 @@ def save_msg(
     return (width, height, filename)
 
 
-def save_to_json(data, path, filename):
-    if not os.path.exists(path):
-        os.makedirs(path)
+def save_to_json(
+    data, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+):
+    """将一个 json 表流式写入 path/filename
 
-    with open(os.path.join(path, filename), "w") as f:
-        # 使用json.dump方法来格式化并保存数据，使其具有良好的可读性
-        # 支持中文，需要指定ensure_ascii=False
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    Args:
+        data (iterable): 表中的记录, 可以是 list 也可以是生成器
+        path (str): 保存的文件夹
+        filename (str): 文件名
+        indent (int): 缩进的空格数, None 表示紧凑格式
+        backend (str): 序列化后端, json 或 orjson
+    """
+    # 默认参数下与 json.dump(data, f, indent=4, ensure_ascii=False) 的输出一致
+    save_json_table(data, os.path.join(path, filename), indent=indent, backend=backend)
 
 
 def generate_uuid_from_input(input_string):
@@ -361,9 +619,7 @@ def get_width_and_height(filename):
     # 确定filename的类型 并获取宽高
     suffix = filename.split(".")[-1]
     if suffix == "png" or suffix == "jpg":
-        img = cv2.imread(filename)
-        width = img.shape[1]
-        height = img.shape[0]
+        width, height = get_image_size(filename)
 
     return width, height
 
@@ -391,8 +647,20 @@ def generate_sensor_info_list(data_path):
     samples_channel_list = os.listdir(samples_path)
 
     # 2. 遍历 samples_channel_list 获取 sensor_info_list
+    return generate_sensor_info_list_from_channel_list(samples_channel_list)
+
+
+def generate_sensor_info_list_from_channel_list(channel_list):
+    """根据 channel 列表生成 sensor_info_list, 格式与 generate_sensor_info_list 一致
+
+    Args:
+        channel_list (list): channel 列表
+
+    Returns:
+        list: sensor_info_list
+    """
     sensor_info_list = []
-    for channel in samples_channel_list:
+    for channel in channel_list:
         sensor_info = {}
         # 3. 判断 channel 是否包含 cam 或者 lidar
         if channel.find("cam") != -1:
@@ -12,6 +12,7 @@ import os
 import cv2
 import numpy as np
 
+from ..common.json_writer import DEFAULT_JSON_BACKEND, DEFAULT_JSON_INDENT
 from . import rule
 from .utils import save_to_json
 from .rule import get_car_id_from_scene_name
@@ -33,12 +34,12 @@ class LogTable:
             )
         ]
 
-    def sequence_to_json(self, path, filename):
-        result = []
-        for log in self.log_list:
-            result.append(log.sequence_to_json())
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+    ):
+        result = (log.sequence_to_json() for log in self.log_list)
 
-        save_to_json(result, path, filename)
+        save_to_json(result, path, filename, indent=indent, backend=backend)
 
 
 class Log:
@@ -73,13 +74,15 @@ class MapTable:
         self.map_list = [Map(scene_name_list=[scene_name], map_name=map_name)]
         self.filename = self.map_list[0].filename
 
-    def sequence_to_json(self, path, filename):
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+    ):
         result = []
         for map in self.map_list:
             map.save_fake_map(os.path.dirname(path))
             result.append(map.sequence_to_json())
 
-        save_to_json(result, path, filename)
+        save_to_json(result, path, filename, indent=indent, backend=backend)
 
 
 class Map:
@@ -146,12 +149,12 @@ class CalibratedSensorTable:
             calibrated_sensor_list.append(calibrated_sensor)
         return calibrated_sensor_list
 
-    def sequence_to_json(self, path, filename):
-        result = []
-        for calibrated_sensor in self.calibrated_sensor_list:
-            result.append(calibrated_sensor.sequence_to_json())
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+    ):
+        result = (calibrated_sensor.sequence_to_json() for calibrated_sensor in self.calibrated_sensor_list)
 
-        save_to_json(result, path, filename)
+        save_to_json(result, path, filename, indent=indent, backend=backend)
 
 
 class CalibratedSensor:
@@ -218,12 +221,12 @@ class SensorTable:
             sensor = Sensor(sensor_info["channel"], sensor_info["modality"])
             self.sensor_list.append(sensor)
 
-    def sequence_to_json(self, path, filename):
-        result = []
-        for sensor in self.sensor_list:
-            result.append(sensor.sequence_to_json())
+    def sequence_to_json(
+        self, path, filename, indent=DEFAULT_JSON_INDENT, backend=DEFAULT_JSON_BACKEND
+    ):
+        result = (sensor.sequence_to_json() for sensor in self.sensor_list)
 
-        save_to_json(result, path, filename)
+        save_to_json(result, path, filename, indent=indent, backend=backend)
 
 
 class Sensor:
@@ -0,0 +1,133 @@
+import queue
+import threading
+import time
+
+
+class StageStats:
+    """记录各个处理阶段的耗时和处理数量, 用于输出吞吐量报告
+
+    Note : 写入线程会并发更新统计信息, 所以这里需要加锁
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_dict = {}
+
+    def add(self, stage, seconds, count=1):
+        with self._lock:
+            if stage not in self.stage_dict:
+                self.stage_dict[stage] = {"count": 0, "seconds": 0.0}
+            self.stage_dict[stage]["count"] += count
+            self.stage_dict[stage]["seconds"] += seconds
+
+    def report(self, title="stage throughput"):
+        """打印各个阶段的吞吐量
+
+        Note : 写入阶段的耗时是多个线程耗时的累加, 所以其吞吐量为单个线程的吞吐量
+        """
+        print(f"{title}:")
+        for stage, stat in self.stage_dict.items():
+            count = stat["count"]
+            seconds = stat["seconds"]
+            throughput = count / seconds if seconds > 0 else 0.0
+            print(
+                f"    {stage:<12} : {count:>6} items, {seconds:>8.3f} s, {throughput:>8.2f} items/s"
+            )
+
+
+class AsyncWriter:
+    """有界的生产者/消费者写入线程池
+
+    帧循环作为生产者把写文件任务(图片编码, 点云写入)放入有界队列, 由多个写入线程消费,
+    队列满时生产者会阻塞, 从而保证待写入的数据所占用的内存是有上限的
+
+    cv2 的编解码以及 zlib/lzf 的压缩都会释放 GIL, 所以这里使用线程即可
+
+    Args:
+        worker_num (int): 写入线程数, 为 0 时在调用线程中直接同步写入
+        queue_size (int): 队列的最大长度
+        stage_stats (StageStats): 用于记录各个写入阶段的耗时
+    """
+
+    def __init__(self, worker_num=4, queue_size=64, stage_stats=None):
+        if worker_num < 0:
+            raise ValueError(f"worker_num should not be negative, got {worker_num}")
+        if queue_size < 1:
+            raise ValueError(f"queue_size should be positive, got {queue_size}")
+
+        self.worker_num = worker_num
+        self.queue_size = queue_size
+        self.stage_stats = stage_stats if stage_stats is not None else StageStats()
+
+        self.job_queue = queue.Queue(maxsize=queue_size)
+        self.error_list = []
+        self.worker_list = []
+        for i in range(worker_num):
+            worker = threading.Thread(
+                target=self._worker_loop, name=f"writer-{i}", daemon=True
+            )
+            worker.start()
+            self.worker_list.append(worker)
+
+    def submit(self, stage, func, *args, **kwargs):
+        """提交一个写入任务, 队列满时阻塞直到有空位
+
+        Args:
+            stage (str): 任务所属阶段, 例如 camera, lidar
+            func (callable): 写入函数
+        """
+        # 某个写入线程已经出错, 不再继续提交任务
+        if self.error_list:
+            raise RuntimeError(
+                f"writer failed : {self.error_list[0]}"
+            ) from self.error_list[0]
+
+        if self.worker_num == 0:
+            self._run_job(stage, func, args, kwargs)
+        else:
+            self.job_queue.put((stage, func, args, kwargs))
+
+    def close(self):
+        """等待所有任务完成并退出写入线程, 如果有任务失败则抛出异常"""
+        self._join_workers()
+
+        if self.error_list:
+            raise RuntimeError(
+                f"writer failed : {self.error_list[0]}"
+            ) from self.error_list[0]
+
+    def _join_workers(self):
+        for _ in self.worker_list:
+            self.job_queue.put(None)
+        for worker in self.worker_list:
+            worker.join()
+        self.worker_list = []
+
+    def _worker_loop(self):
+        while True:
+            job = self.job_queue.get()
+            if job is None:
+                break
+            stage, func, args, kwargs = job
+            try:
+                self._run_job(stage, func, args, kwargs)
+            except Exception as e:
+                self.error_list.append(e)
+
+    def _run_job(self, stage, func, args, kwargs):
+        start = time.time()
+        func(*args, **kwargs)
+        self.stage_stats.add(stage, time.time() - start)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+
+        # 帧循环中已经有异常在传播时, 不能用写入线程的错误覆盖原有的异常, 只打印出来
+        self._join_workers()
+        if self.error_list and exc_value.__cause__ is not self.error_list[0]:
+            print(f"writer failed : {self.error_list[0]}")
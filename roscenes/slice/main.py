@@ -1,7 +1,18 @@
 import os
 from argparse import Action, ArgumentParser
 
-from ..common.data_config import DataConfig
+from ..common.constant import FusionLidarFilterRangeMap
+from ..common.data_config import (
+    LIDAR_FILE_FORMAT_LIST,
+    VOXEL_REDUCTION_LIST,
+    DataConfig,
+)
+from ..common.json_writer import DEFAULT_JSON_INDENT, JSON_BACKEND_LIST
+from ..common.pcd_codec import (
+    DEFAULT_PCD_COMPRESSION,
+    DEFAULT_ZSTD_LEVEL,
+    PCD_COMPRESSION_LIST,
+)
 from .slice import Slice
 
 
@@ -17,6 +28,26 @@ def main(args, unknown):
     # -s/--scene_name_list : scene name list
     # --sample_interval
     # --time_list
+    # --writer_worker_num : number of writer threads per bag
+    # --writer_queue_size : max pending write jobs per bag
+    # --shard_num : split each bag into shard_num time shards and slice them in parallel
+    # --max_workers : number of slice processes
+    # --resume : resume from the slice manifest, skip committed frames and unchanged scenes
+    # --samples_only : only save key frames, sweep frames are never read, fused or decoded
+    # --lidar_file_format : save fused lidar as pcd or float32 .pcd.bin, bin needs no pcd2bin in merge,
+    #   packed packs the .pcd.bin files of each scene into one blob per channel
+    # --save_pcd_dims : float32 values per point of .bin lidar files
+    # --pcd_compression : codec of .pcd lidar files, binary / binary_compressed (lzf) / zstd (.pcd.zst)
+    # --pcd_zstd_level : zstd compression level
+    # --car_brand : drop ego-body points with the exclusion boxes of FusionLidarFilterRangeMap, e.g. yc800
+    # --lidar_range : crop fused lidar to x_min y_min z_min x_max y_max z_max
+    # --camera_passthrough : write jpeg/png bytes as-is without decode/re-encode,
+    #   grayscale/CMYK/EXIF-rotated images are then not normalized to 3-channel BGR
+    # --sweep_voxel_size : voxel size (m) to downsample sweep lidar, 0 means keep full density
+    # --voxel_key_frame : downsample key frame lidar with the same voxel size
+    # --voxel_reduction : keep the max intensity point or the mean of each voxel
+    # --memory_budget : memory budget (GB) of all slice processes, 0 means 80% of available memory
+    # --memory_history_path : peak memory history used to refine the memory estimate of each bag
     parser = ArgumentParser(add_help=False)
     parser.add_argument(
         "-i",
@@ -44,6 +75,38 @@ def main(args, unknown):
     )
     parser.add_argument("--sample_interval", type=int, default=500)
     parser.add_argument("--time_list", type=str, default="")
+    parser.add_argument("--writer_worker_num", type=int, default=4)
+    parser.add_argument("--writer_queue_size", type=int, default=64)
+    parser.add_argument("--shard_num", type=int, default=1)
+    parser.add_argument("--max_workers", type=int, default=4)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--samples_only", action="store_true")
+    parser.add_argument(
+        "--lidar_file_format", type=str, default="pcd", choices=LIDAR_FILE_FORMAT_LIST
+    )
+    parser.add_argument("--save_pcd_dims", type=int, default=4)
+    parser.add_argument(
+        "--pcd_compression",
+        type=str,
+        default=DEFAULT_PCD_COMPRESSION,
+        choices=PCD_COMPRESSION_LIST,
+    )
+    parser.add_argument("--pcd_zstd_level", type=int, default=DEFAULT_ZSTD_LEVEL)
+    parser.add_argument("--car_brand", type=str, default="")
+    parser.add_argument("--lidar_range", type=float, nargs=6, default=None)
+    parser.add_argument("--camera_passthrough", action="store_true")
+    parser.add_argument("--sweep_voxel_size", type=float, default=0)
+    parser.add_argument("--voxel_key_frame", action="store_true")
+    parser.add_argument(
+        "--voxel_reduction", type=str, default="max", choices=VOXEL_REDUCTION_LIST
+    )
+    parser.add_argument("--memory_budget", type=float, default=0)
+    parser.add_argument("--memory_history_path", type=str, default="")
+    parser.add_argument("--compact_json", action="store_true")
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument(
+        "--json_backend", type=str, default="json", choices=JSON_BACKEND_LIST
+    )
 
     args, unknown = parser.parse_known_args(unknown)
 
@@ -52,6 +115,27 @@ def main(args, unknown):
     scene_name_list = args.scene_name_list
     sample_interval = args.sample_interval
     time_list = args.time_list
+    writer_worker_num = args.writer_worker_num
+    writer_queue_size = args.writer_queue_size
+    shard_num = args.shard_num
+    max_workers = args.max_workers
+    resume = args.resume
+    samples_only = args.samples_only
+    lidar_file_format = args.lidar_file_format
+    save_pcd_dims = args.save_pcd_dims
+    pcd_compression = args.pcd_compression
+    pcd_zstd_level = args.pcd_zstd_level
+    car_brand = args.car_brand
+    lidar_range = args.lidar_range
+    camera_passthrough = args.camera_passthrough
+    sweep_voxel_size = args.sweep_voxel_size
+    voxel_key_frame = args.voxel_key_frame
+    voxel_reduction = args.voxel_reduction
+    memory_budget = args.memory_budget
+    memory_history_path = args.memory_history_path
+    compact_json = args.compact_json
+    json_backend = args.json_backend
+    profile = args.profile
 
     # 1. parse and check args
     # check input_rosbag_file_path_list and output_path_list length
@@ -85,8 +169,61 @@ def main(args, unknown):
             for i in range(0, len(time_list), 2)
         ]
 
+    # check writer args valid
+    if writer_worker_num < 0:
+        raise Exception("writer_worker_num should not be negative.")
+    if writer_queue_size < 1:
+        raise Exception("writer_queue_size should be greater than 0.")
+
+    # check shard args valid
+    if shard_num < 1:
+        raise Exception("shard_num should be greater than 0.")
+    if max_workers < 1:
+        raise Exception("max_workers should be greater than 0.")
+
+    # check car_brand valid, unknown car brand would silently skip the ego-body filter
+    if car_brand and car_brand.lower() not in FusionLidarFilterRangeMap.car_brand_filter_range_map:
+        raise Exception(
+            f"car_brand should be one of {list(FusionLidarFilterRangeMap.car_brand_filter_range_map)}."
+        )
+    if lidar_range is not None:
+        if any(lidar_range[i] >= lidar_range[i + 3] for i in range(3)):
+            raise Exception("lidar_range min should be less than max.")
+
+    # check voxel args valid
+    if sweep_voxel_size < 0:
+        raise Exception("sweep_voxel_size should not be negative.")
+    if voxel_key_frame and not sweep_voxel_size:
+        raise Exception("voxel_key_frame needs sweep_voxel_size.")
+
+    # check memory budget valid, convert from GB to bytes
+    if memory_budget < 0:
+        raise Exception("memory_budget should not be negative.")
+    memory_budget = int(memory_budget * 1024 * 1024 * 1024) or None
+
     # build config
-    config = DataConfig(sample_interval=sample_interval)
+    config = DataConfig(
+        save_pcd_dims=save_pcd_dims,
+        lidar_file_format=lidar_file_format,
+        pcd_compression=pcd_compression,
+        pcd_zstd_level=pcd_zstd_level,
+        car_brand=car_brand or None,
+        lidar_range=lidar_range,
+        sweep_voxel_size=sweep_voxel_size or None,
+        voxel_key_frame_flag=voxel_key_frame,
+        voxel_reduction=voxel_reduction,
+        camera_passthrough_flag=camera_passthrough,
+        sample_interval=sample_interval,
+        save_sweep_data_flag=not samples_only,
+        writer_worker_num=writer_worker_num,
+        writer_queue_size=writer_queue_size,
+        resume_flag=resume,
+        json_indent=None if compact_json else DEFAULT_JSON_INDENT,
+        json_backend=json_backend,
+        profile_flag=profile,
+        memory_budget=memory_budget,
+        memory_history_path=memory_history_path or None,
+    )
 
     # build data info list
     # each data info is a dict
@@ -107,7 +244,12 @@ def main(args, unknown):
     print("----------------------")
     print("----    slice     ----")
     print("----------------------")
-    slice = Slice(config=config, data_info_list=data_info_list)
+    slice = Slice(
+        config=config,
+        data_info_list=data_info_list,
+        max_workers=max_workers,
+        shard_num=shard_num,
+    )
     slice.slice()
 
 
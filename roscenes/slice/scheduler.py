@@ -0,0 +1,210 @@
+import json
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import rosbag
+
+# 进程的基础内存占用: python 解释器以及 numpy, cv2, rosbag 等依赖
+BASE_MEMORY_BYTES = 256 * 1024 * 1024
+# bag 索引中每条消息的内存占用: rosbag 自身的索引以及 BagIndexReader 中的 时间戳 -> 位置 索引
+INDEX_ENTRY_BYTES = 256
+# 根据历史记录修正估计值时使用的最近记录数量
+HISTORY_SIZE = 200
+# 未指定内存预算时, 使用当前可用内存的比例
+DEFAULT_MEMORY_BUDGET_RATIO = 0.8
+
+
+def read_available_memory():
+    """读取系统当前的可用内存 (bytes), 非 linux 系统上返回 None"""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def format_bytes(num_bytes):
+    return f"{num_bytes / 1024 / 1024 / 1024:.2f} GB"
+
+
+class BagMemoryEstimator:
+    """根据 bag 的文件大小和 topic 组成估计切片一个 bag 所需的峰值内存, 并根据实际的峰值内存修正估计
+
+    切片时 bag 的消息按需读取, 峰值内存由三部分组成:
+        - 进程的基础内存
+        - bag 索引, 与消息数量成正比
+        - 正在处理以及在写入队列中等待的帧, 每一帧的大小按照 文件大小 / 主 lidar 消息数量 估计,
+            同时在内存中的帧数由写入队列的长度和每一帧的写入任务数量决定
+
+    每次切片结束后记录实际的峰值内存, 之后的估计值乘以历史记录中 实际值 / 估计值 的中位数
+
+    Args:
+        data_config (DataConfig): 提供 topic 以及写入队列的配置
+        history_path (str): 历史记录的保存路径, None 表示不使用历史记录
+    """
+
+    def __init__(self, data_config, history_path=None):
+        self.data_config = data_config
+        self.history_path = history_path
+        self.history_list = self.load_history()
+        self.correction = self.compute_correction(self.history_list)
+
+    def load_history(self):
+        if not self.history_path or not os.path.exists(self.history_path):
+            return []
+        try:
+            with open(self.history_path, "r") as f:
+                history_list = json.load(f)
+        except (OSError, ValueError):
+            print(f"memory history {self.history_path} is invalid, ignore it")
+            return []
+        return history_list if isinstance(history_list, list) else []
+
+    def save_history(self):
+        if not self.history_path:
+            return
+        dir_path = os.path.dirname(self.history_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        with open(self.history_path, "w") as f:
+            json.dump(self.history_list[-HISTORY_SIZE:], f, indent=4)
+
+    @staticmethod
+    def compute_correction(history_list):
+        """历史记录中 实际峰值 / 原始估计值 的中位数, 没有记录时为 1"""
+        ratio_list = sorted(
+            record["peak_rss_bytes"] / record["raw_estimate_bytes"]
+            for record in history_list[-HISTORY_SIZE:]
+            if record.get("peak_rss_bytes") and record.get("raw_estimate_bytes")
+        )
+        if not ratio_list:
+            return 1.0
+        middle = len(ratio_list) // 2
+        if len(ratio_list) % 2:
+            return ratio_list[middle]
+        return (ratio_list[middle - 1] + ratio_list[middle]) / 2
+
+    def get_bag_stats(self, bag_path):
+        """读取 bag 的文件大小以及每个 topic 的消息数量, 只读取 bag 的索引, 不读取消息"""
+        with rosbag.Bag(bag_path, "r") as bag:
+            topic_info_dict = bag.get_type_and_topic_info().topics
+            message_count_dict = {
+                topic: topic_info.message_count
+                for topic, topic_info in topic_info_dict.items()
+            }
+        return {
+            "bag_size": os.path.getsize(bag_path),
+            "message_count_dict": message_count_dict,
+        }
+
+    def estimate_raw(self, bag_stats):
+        """不经过历史记录修正的估计值 (bytes)"""
+        data_config = self.data_config
+        message_count_dict = bag_stats["message_count_dict"]
+        total_message_count = sum(message_count_dict.values())
+        frame_count = max(message_count_dict.get(data_config.main_topic, 0), 1)
+        camera_num = sum(
+            1 for topic in data_config.camera_topic_channel_dict if topic in message_count_dict
+        )
+
+        # 每一帧的写入任务为每个 camera 一张图片以及一个融合后的点云
+        job_num_per_frame = camera_num + 1
+        in_flight_frame_num = (
+            math.ceil(
+                (data_config.writer_queue_size + data_config.writer_worker_num)
+                / job_num_per_frame
+            )
+            + 1
+        )
+        frame_bytes = bag_stats["bag_size"] / frame_count
+        # 融合时每个 lidar 的点云与融合结果同时存在, 额外计算两帧的临时内存
+        return int(
+            BASE_MEMORY_BYTES
+            + total_message_count * INDEX_ENTRY_BYTES
+            + frame_bytes * (in_flight_frame_num + 2)
+        )
+
+    def estimate(self, bag_path):
+        """估计切片一个 bag 所需的峰值内存
+
+        Returns:
+            tuple: (estimate_bytes, raw_estimate_bytes, bag_stats)
+        """
+        bag_stats = self.get_bag_stats(bag_path)
+        raw_estimate_bytes = self.estimate_raw(bag_stats)
+        return int(raw_estimate_bytes * self.correction), raw_estimate_bytes, bag_stats
+
+    def record(self, bag_path, bag_stats, raw_estimate_bytes, peak_rss_bytes):
+        """记录一个 bag 的实际峰值内存"""
+        self.history_list.append(
+            {
+                "bag_path": os.path.abspath(bag_path),
+                "bag_size": bag_stats["bag_size"],
+                "message_count": sum(bag_stats["message_count_dict"].values()),
+                "raw_estimate_bytes": raw_estimate_bytes,
+                "peak_rss_bytes": peak_rss_bytes,
+            }
+        )
+
+
+class MemoryBudgetScheduler:
+    """在内存预算内调度切片任务
+
+    - 任务按照估计内存从大到小排序, 大的 bag 先开始, 避免最后只剩一个大 bag 在运行而其他核心空闲
+    - 只有当正在运行的任务的估计内存之和加上新任务的估计内存不超过预算时, 才提交新任务,
+        否则尝试提交更小的任务
+    - 单个任务超过预算时, 等待其他任务全部完成后单独运行
+
+    Args:
+        executor (Executor): 进程池
+        max_workers (int): 最大并行数量
+        memory_budget (int): 内存预算 (bytes), None 表示不限制
+    """
+
+    def __init__(self, executor, max_workers, memory_budget=None):
+        self.executor = executor
+        self.max_workers = max_workers
+        self.memory_budget = memory_budget
+
+    def fits(self, used_bytes, estimate_bytes):
+        return self.memory_budget is None or used_bytes + estimate_bytes <= self.memory_budget
+
+    def run(self, task_list):
+        """按照内存预算提交任务, 按照完成顺序返回结果
+
+        Args:
+            task_list (list): 每个元素为 (estimate_bytes, func, args, key)
+
+        Yields:
+            tuple: (key, future), 每个任务完成时返回
+        """
+        pending_list = sorted(task_list, key=lambda task: task[0], reverse=True)
+        running_dict = {}
+        used_bytes = 0
+
+        while pending_list or running_dict:
+            # 1. 在预算内从大到小提交任务
+            index = 0
+            while index < len(pending_list) and len(running_dict) < self.max_workers:
+                estimate_bytes, func, args, key = pending_list[index]
+                if self.fits(used_bytes, estimate_bytes) or not running_dict:
+                    future = self.executor.submit(func, *args)
+                    running_dict[future] = (key, estimate_bytes)
+                    used_bytes += estimate_bytes
+                    pending_list.pop(index)
+                    # 超出预算的任务单独运行
+                    if not self.fits(used_bytes, 0):
+                        break
+                else:
+                    index += 1
+
+            # 2. 等待任意一个任务完成, 释放它占用的预算
+            done_set, _ = wait(list(running_dict), return_when=FIRST_COMPLETED)
+            for future in done_set:
+                key, estimate_bytes = running_dict.pop(future)
+                used_bytes -= estimate_bytes
+                yield key, future
@@ -1,9 +1,19 @@
+import json
 import os
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from rich.progress import track
 
+from ..nuscenes import rule
 from ..nuscenes.nuscenes_info import NuscenesInfo
+from ..nuscenes.profiler import StageProfiler, read_peak_rss, reset_peak_rss
+from .scheduler import (
+    DEFAULT_MEMORY_BUDGET_RATIO,
+    BagMemoryEstimator,
+    MemoryBudgetScheduler,
+    format_bytes,
+    read_available_memory,
+)
 
 
 class Slice:
@@ -18,6 +28,7 @@ class Slice:
                     "nuscenes_folder_path": "path/to/0001-0_YC200A01-N1-0001",
                     "start_time": None,
                     "end_time": None,
+                    "time_list": [],
                     "bag_info": {
                         "map_name": "suzhou",
                         "description": "lidar data",
@@ -26,12 +37,28 @@ class Slice:
                 }
             ]
 
+        如果 time_list 不为空, 则只读取一次 bag, 每个时间窗口切片为 nuscenes_folder_path 下的一个独立场景,
+        时间单位与 start_time, end_time 一致(us)
+
+        如果 shard_num 大于 1, 则每个 bag 按时间切分为 shard_num 个连续的分片, 每个分片在独立的进程中切片,
+        帧同步在父进程中统一完成, 所以 sample/sweep 的划分与串行切片的结果完全一致
+
+        否则每个 bag 在独立的进程中切片, 按照估计内存从大到小的顺序, 在 DataConfig.memory_budget 的
+        内存预算内提交, 每个 bag 实际的峰值内存会记录下来, 用于修正之后的估计
+
     """
 
-    def __init__(self, config, data_info_list: list, max_workers: int = 4):
+    def __init__(
+        self,
+        config,
+        data_info_list: list,
+        max_workers: int = 4,
+        shard_num: int = 1,
+    ):
         self.config = config
         self.data_info_list = data_info_list
         self.max_workers = max_workers
+        self.shard_num = shard_num
 
         self._check_data_info_list()
 
@@ -113,29 +140,307 @@ class Slice:
             ):
                 raise Exception("end_time should be None or a number")
 
+        # check if each element in data_info_list has the key : time_list
+        # - if not, add default empty time_list
+        # - if has, check if each time window is [start_time, end_time] and start_time <= end_time
+        for data_info in self.data_info_list:
+            if "time_list" not in data_info or data_info["time_list"] is None:
+                data_info["time_list"] = []
+            for time_window in data_info["time_list"]:
+                if len(time_window) != 2:
+                    raise Exception(
+                        f"time window should be [start_time, end_time] : {time_window}"
+                    )
+                if time_window[0] > time_window[1]:
+                    raise Exception(
+                        f"start_time should not be greater than end_time : {time_window}"
+                    )
+
+    # 开启 profile_flag 时, 所有场景的汇总报告保存在输出目录的公共父目录下的该文件中
+    PROFILE_SUMMARY_FILENAME = "slice_profile_summary.json"
+    # 未指定 DataConfig.memory_history_path 时, 峰值内存的历史记录保存在输出目录的公共父目录下的该文件中
+    MEMORY_HISTORY_FILENAME = "slice_memory_history.json"
+
     def slice(self):
-        print(f"     slice bags with {self.max_workers} processes:")
+        if self.shard_num > 1:
+            report_list = self.slice_with_shards()
+        else:
+            report_list = self.slice_with_processes()
+
+        if self.config.profile_flag:
+            self.save_profile_summary(report_list)
+
+    def slice_with_processes(self):
+        """每个 bag 在独立的进程中切片, 按照估计内存从大到小在内存预算内调度
+
+        Returns:
+            list: 所有场景的统计报告
+        """
+        report_list = []
+        memory_budget = self.get_memory_budget()
+        estimator = BagMemoryEstimator(self.config, self.get_memory_history_path())
+
+        # 1. 估计每个 bag 的峰值内存, 已经完整切片的 bag 直接跳过
+        task_list = []
+        estimate_info_list = []
+        for data_info in self.data_info_list:
+            if self.is_data_info_complete(data_info):
+                print(f"{data_info['scene_name']} is unchanged, skip")
+                continue
+            estimate_bytes, raw_estimate_bytes, bag_stats = estimator.estimate(
+                data_info["rosbag_file_path"]
+            )
+            if memory_budget is not None and estimate_bytes > memory_budget:
+                print(
+                    f"{data_info['scene_name']} needs about {format_bytes(estimate_bytes)}, "
+                    f"more than the budget {format_bytes(memory_budget)}, it will run alone"
+                )
+            task_index = len(task_list)
+            task_list.append(
+                (estimate_bytes, self.slice_bag_with_peak_rss, (data_info,), task_index)
+            )
+            estimate_info_list.append((data_info, estimate_bytes, raw_estimate_bytes, bag_stats))
+
+        # 2. 在内存预算内调度
+        budget_info = "unlimited" if memory_budget is None else format_bytes(memory_budget)
+        print(
+            f"     slice bags with {self.max_workers} processes, memory budget {budget_info}"
+            f" (correction {estimator.correction:.2f}):"
+        )
         with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {
-                executor.submit(
-                    self.slice_bag,
-                    data_info,
-                ): data_info
-                for data_info in self.data_info_list
-            }
-            for future in track(
-                as_completed(futures),
-                total=len(futures),
+            scheduler = MemoryBudgetScheduler(executor, self.max_workers, memory_budget)
+            for task_index, future in track(
+                scheduler.run(task_list),
+                total=len(task_list),
                 description="slicing",
             ):
-                future.result()  # 等待所有任务完成
+                bag_report_list, peak_rss_bytes = future.result()
+                report_list.extend(bag_report_list)
+
+                # 3. 记录实际的峰值内存, 用于修正之后的估计
+                data_info, estimate_bytes, raw_estimate_bytes, bag_stats = estimate_info_list[
+                    task_index
+                ]
+                if peak_rss_bytes is not None:
+                    print(
+                        f"{data_info['scene_name']} peak memory {format_bytes(peak_rss_bytes)}"
+                        f", estimate {format_bytes(estimate_bytes)}"
+                    )
+                    estimator.record(
+                        data_info["rosbag_file_path"],
+                        bag_stats,
+                        raw_estimate_bytes,
+                        peak_rss_bytes,
+                    )
+        estimator.save_history()
 
         # for data_info in self.data_info_list:
         #     self.slice_bag(data_info)
+        return report_list
 
-    def slice_bag(self, data_info: dict):
-        # 1. build nuscene info
-        nuscene_info = NuscenesInfo(
+    def get_memory_budget(self):
+        """内存预算 (bytes), 未指定时为当前可用内存的 DEFAULT_MEMORY_BUDGET_RATIO, 无法获取时不限制"""
+        if self.config.memory_budget:
+            return self.config.memory_budget
+        available_memory = read_available_memory()
+        if available_memory is None:
+            return None
+        return int(available_memory * DEFAULT_MEMORY_BUDGET_RATIO)
+
+    def get_memory_history_path(self):
+        if self.config.memory_history_path:
+            return self.config.memory_history_path
+        return os.path.join(self.get_output_root(), self.MEMORY_HISTORY_FILENAME)
+
+    def get_output_root(self):
+        """所有输出目录的公共父目录"""
+        return os.path.commonpath(
+            [
+                os.path.dirname(os.path.abspath(data_info["nuscenes_folder_path"]))
+                for data_info in self.data_info_list
+            ]
+        )
+
+    def slice_bag_with_peak_rss(self, data_info: dict):
+        """在子进程中切片一个 bag, 同时统计该 bag 的峰值内存
+
+        Note : 进程池中的进程会先后处理多个 bag, 需要先重置峰值 RSS, 不支持重置时不返回峰值,
+            以免将之前的 bag 的峰值记录到当前的 bag 上
+
+        Returns:
+            tuple: (report_list, peak_rss_bytes)
+        """
+        peak_rss_reset = reset_peak_rss()
+        report_list = self.slice_bag(data_info)
+        peak_rss_bytes = read_peak_rss() if peak_rss_reset else None
+        return report_list, peak_rss_bytes
+
+    def save_profile_summary(self, report_list):
+        """汇总所有场景的统计报告并保存, 同时打印各阶段的耗时"""
+        summary = StageProfiler.aggregate(report_list)
+        summary["scene_list"] = [
+            {
+                "scene_name": report["scene_name"],
+                "wall_seconds": report["wall_seconds"],
+                "peak_rss_bytes": report["peak_rss_bytes"],
+            }
+            for report in report_list
+        ]
+
+        summary_path = os.path.join(self.get_output_root(), self.PROFILE_SUMMARY_FILENAME)
+        with open(summary_path, "w") as f:
+            json.dump(summary, f, indent=4)
+
+        print(f"profile of {summary['scene_num']} scenes saved to {summary_path}")
+        for stage, stat in summary["stages"].items():
+            print(
+                f"    {stage:<16} : wall {stat['wall_seconds']:>8.3f} s, cpu {stat['cpu_seconds']:>8.3f} s"
+            )
+        return summary
+
+    def is_data_info_complete(self, data_info: dict):
+        """断点续切时, 在读取 bag 之前判断该 bag 对应的所有场景是否都已经完整切片"""
+        if not self.config.resume_flag:
+            return False
+
+        if not data_info["time_list"]:
+            return NuscenesInfo.is_scene_complete(
+                data_config=self.config,
+                scene_name=data_info["scene_name"],
+                scene_bag_file=data_info["rosbag_file_path"],
+                nuscenes_folder_path=data_info["nuscenes_folder_path"],
+                start_time=data_info["start_time"],
+                end_time=data_info["end_time"],
+            )
+
+        for window_index, (start_time, end_time) in enumerate(data_info["time_list"]):
+            scene_name = rule.generate_window_scene_name(
+                data_info["scene_name"], window_index
+            )
+            if not NuscenesInfo.is_scene_complete(
+                data_config=self.config,
+                scene_name=scene_name,
+                scene_bag_file=data_info["rosbag_file_path"],
+                nuscenes_folder_path=os.path.join(
+                    data_info["nuscenes_folder_path"], scene_name
+                ),
+                start_time=start_time,
+                end_time=end_time,
+            ):
+                return False
+        return True
+
+    def slice_with_shards(self):
+        """逐个 bag 切片, 每个 bag 内部按时间分片并行
+
+        Returns:
+            list: 所有场景的统计报告
+        """
+        report_list = []
+        print(
+            f"     slice bags with {self.shard_num} shards and {self.max_workers} processes:"
+        )
+        for data_info in track(self.data_info_list, description="slicing"):
+            if self.is_data_info_complete(data_info):
+                print(f"{data_info['scene_name']} is unchanged, skip")
+                continue
+
+            # 多个时间窗口的切片只读取一次 bag, 不再按时间分片
+            if data_info["time_list"]:
+                report_list.extend(self.slice_bag(data_info))
+            else:
+                report_list.extend(self.slice_bag_with_shards(data_info))
+        return report_list
+
+    def slice_bag_with_shards(self, data_info: dict):
+        """将一个 bag 按时间分片并行切片为一个场景
+
+        Returns:
+            list: 场景的统计报告, 未开启统计或场景被跳过时为空列表
+        """
+        # 1. 父进程读取 bag 索引并完成所有帧的同步, 全局的帧序号决定 sample/sweep 的划分
+        nuscene_info = self.build_nuscenes_info(
+            data_info, data_info["start_time"], data_info["end_time"]
+        )
+        profiler = nuscene_info.profiler
+        with profiler.stage("store_init"):
+            if not nuscene_info.store_init():
+                nuscene_info.bag_reader.close()
+                return []
+        with profiler.stage("prepare_camera"):
+            nuscene_info.prepare_camera_topics()
+        with profiler.stage("sync"):
+            frame_list = nuscene_info.get_frame_list()
+        nuscene_info.bag_reader.close()
+        if not frame_list:
+            print(f"no frame synchronized in {nuscene_info.scene_name}, skip")
+            return []
+
+        # 2. 每个分片在独立的进程中读取并保存自己的帧
+        shard_list = nuscene_info.split_frame_list(frame_list, self.shard_num)
+        shard_result_list = [None] * len(shard_list)
+        with profiler.stage("slice_shards"), ProcessPoolExecutor(
+            max_workers=self.max_workers
+        ) as executor:
+            futures = {
+                executor.submit(
+                    self.slice_shard,
+                    data_info,
+                    shard_frame_list,
+                    sweeps_count_start,
+                ): shard_index
+                for shard_index, (sweeps_count_start, shard_frame_list) in enumerate(
+                    shard_list
+                )
+            }
+            for future in as_completed(futures):
+                shard_result_list[futures[future]] = future.result()
+
+        # 3. 按分片顺序拼接 ego pose 和文件记录, 统一生成数据库
+        # 分片子进程的统计报告作为附加信息保存在场景的报告中
+        shard_report_list = []
+        for ego_pose_info_list, sample_data_record_list, shard_report in shard_result_list:
+            nuscene_info.ego_pose_info_list.extend(ego_pose_info_list)
+            nuscene_info.sample_data_ledger.extend(sample_data_record_list)
+            shard_report_list.append(shard_report)
+        profiler.set_info("frame_num", len(frame_list))
+        profiler.set_info("shard_list", shard_report_list)
+        nuscene_info.sweeps_count = len(frame_list)
+        nuscene_info.generate_database(nuscene_info.nuscenes_folder_path)
+        nuscene_info.slice_manifest.mark_complete()
+        report = nuscene_info.save_profile()
+        return [report] if report else []
+
+    def slice_shard(self, data_info: dict, shard_frame_list: list, sweeps_count_start):
+        """切片一个时间分片
+
+        Args:
+            data_info (dict): 分片所属 bag 的数据信息
+            shard_frame_list (list): 父进程同步好的帧列表
+            sweeps_count_start (int): 分片第一帧的全局序号
+
+        Returns:
+            tuple: (ego_pose_info_list, sample_data_record_list, shard_report), 分片内每一帧的
+                ego pose 信息, 写入的每个文件的记录, 以及分片的统计报告(未开启统计时为 None)
+        """
+        # 只读取分片用到的时间范围, 两侧的余量由 NuscenesInfo 根据同步阈值添加
+        start_time, end_time = NuscenesInfo.get_frame_list_time_range(shard_frame_list)
+        nuscene_info = self.build_nuscenes_info(data_info, start_time, end_time)
+        nuscene_info.sweeps_count = sweeps_count_start
+        nuscene_info.load_manifest()
+        nuscene_info.slice_bag_to_file(frame_list=shard_frame_list)
+        nuscene_info.bag_reader.close()
+        shard_report = None
+        if nuscene_info.profiler.enabled:
+            shard_report = nuscene_info.profiler.to_dict()
+        return (
+            nuscene_info.ego_pose_info_list,
+            nuscene_info.sample_data_ledger.record_list,
+            shard_report,
+        )
+
+    def build_nuscenes_info(self, data_info: dict, start_time, end_time):
+        return NuscenesInfo(
             data_config=self.config,
             scene_name=data_info["scene_name"],
             scene_bag_file=data_info["rosbag_file_path"],
@@ -143,7 +448,30 @@ class Slice:
             map_name=data_info["bag_info"]["map_name"],
             date_captured=data_info["bag_info"]["date_captured"],
             description=data_info["bag_info"]["description"],
-            start_time=data_info["start_time"],
-            end_time=data_info["end_time"],
+            start_time=start_time,
+            end_time=end_time,
         )
-        nuscene_info.slice()
+
+    def slice_bag(self, data_info: dict):
+        """切片一个 bag, 有多个时间窗口时生成多个场景
+
+        Returns:
+            list: 场景的统计报告, 未开启统计或场景被跳过时为空列表
+        """
+        if self.is_data_info_complete(data_info):
+            print(f"{data_info['scene_name']} is unchanged, skip")
+            return []
+
+        # 如果有多个时间窗口, bag 只读取一次, 读取的范围覆盖所有的时间窗口
+        time_list = data_info["time_list"]
+        start_time = data_info["start_time"]
+        end_time = data_info["end_time"]
+        if time_list:
+            start_time = min(time_window[0] for time_window in time_list)
+            end_time = max(time_window[1] for time_window in time_list)
+
+        # 1. build nuscene info
+        nuscene_info = self.build_nuscenes_info(data_info, start_time, end_time)
+        if time_list:
+            return nuscene_info.slice_time_list(time_list)
+        return nuscene_info.slice()
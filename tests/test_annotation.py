@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+import pytest
+
+from roscenes.nuscenes.columnar import iter_number_matrix_column, number_matrix_column
+
+
+def build_sample_annotation_info_list():
+    return [
+        {
+            "scene_name": "0001-0_YC200A01-N1-0001",
+            "timestamp": 1700000000100000 + index * 100000,
+            "object_id": index,
+            "track_id": index % 2,
+            "attribute_name_list": ["vehicle.moving"] if index % 2 else [],
+            "visibility": "v80-100",
+            # 标注中的整数与浮点数混合
+            "translation": [index, 2.5, -1],
+            "size": [4, 1.9, 1.5] if index % 2 else [1, 1, 1],
+            "rotation": [1, 0, 0, 0] if index % 2 else [0.5, 0.5, -0.5, 0.5],
+            "num_lidar_pts": 10 * index,
+            "pre_timestamp": None if index == 0 else 1700000000000000 + index * 100000,
+            "pre_object_id": None if index == 0 else index - 1,
+            "next_timestamp": None,
+            "next_object_id": None,
+        }
+        for index in range(4)
+    ]
+
+
+def test_number_matrix_column_keeps_int():
+    value_list = [[1, 2.5, -1], [0.1, np.int64(3), 1e-07], [1.0, 2.0, 3.0]]
+    matrix, int_mask = number_matrix_column(value_list, 3)
+    assert matrix.dtype == np.float64
+    assert json.dumps(list(iter_number_matrix_column(matrix, int_mask))) == json.dumps(
+        [[1, 2.5, -1], [0.1, 3, 1e-07], [1.0, 2.0, 3.0]]
+    )
+
+    matrix, int_mask = number_matrix_column([], 4)
+    assert matrix.shape == int_mask.shape == (0, 4)
+    assert list(iter_number_matrix_column(matrix, int_mask)) == []
+
+
+def test_sample_annotation_json_equals_row_output(tmp_path):
+    pytest.importorskip("rosbag")
+    from roscenes.nuscenes import rule
+    from roscenes.nuscenes.annotation import SampleAnnotationTable
+
+    info_list = build_sample_annotation_info_list()
+    SampleAnnotationTable(info_list).sequence_to_json(
+        str(tmp_path), "sample_annotation.json"
+    )
+
+    # 原有的逐行实现直接序列化标注中的原始值
+    expected = [
+        {
+            "token": rule.generate_sample_annotation_token(
+                info["scene_name"], info["timestamp"], info["object_id"]
+            ),
+            "sample_token": rule.generate_sample_token(
+                info["scene_name"], info["timestamp"]
+            ),
+            "instance_token": rule.generate_instance_token(
+                info["scene_name"], info["track_id"]
+            ),
+            "attribute_tokens": [
+                rule.generate_attribute_token(attribute_name)
+                for attribute_name in info["attribute_name_list"]
+            ],
+            "visibility_token": rule.generate_visibility_token(info["visibility"]),
+            "translation": info["translation"],
+            "size": info["size"],
+            "rotation": info["rotation"],
+            "num_lidar_pts": info["num_lidar_pts"],
+            "num_radar_pts": 0,
+            "prev": rule.generate_sample_annotation_token(
+                info["scene_name"], info["pre_timestamp"], info["pre_object_id"]
+            ),
+            "next": rule.generate_sample_annotation_token(
+                info["scene_name"], info["next_timestamp"], info["next_object_id"]
+            ),
+        }
+        for info in info_list
+    ]
+    with open(str(tmp_path / "sample_annotation.json"), "r") as f:
+        assert f.read() == json.dumps(expected, indent=4, ensure_ascii=False)
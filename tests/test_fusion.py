@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("rosbag")
+
+from roscenes.common.calib import CalibInfo, CalibRegistry  # noqa: E402
+from roscenes.nuscenes.utils import fusion_lidar_points  # noqa: E402
+
+FLOAT32 = 7
+
+
+def build_point_cloud_msg(points):
+    """与 sensor_msgs/PointCloud2 字段一致的消息, 点为 (N, 4) 的 xyzi"""
+    points = np.ascontiguousarray(points, dtype=np.float32)
+    return SimpleNamespace(
+        height=1,
+        width=points.shape[0],
+        fields=[
+            SimpleNamespace(name=name, offset=4 * i, datatype=FLOAT32, count=1)
+            for i, name in enumerate(["x", "y", "z", "intensity"])
+        ],
+        is_bigendian=False,
+        point_step=16,
+        row_step=16 * points.shape[0],
+        data=points.tobytes(),
+    )
+
+
+def build_calib_registry():
+    calib_info_dict = {
+        "lidar-fusion": CalibInfo("lidar-fusion", [0, 0, 0], [1, 0, 0, 0], {}),
+        "lidar-top": CalibInfo("lidar-top", [1, 2, 3], [1, 0, 0, 0], {}),
+    }
+    return CalibRegistry(calib_info_dict)
+
+
+@pytest.fixture
+def points():
+    points = np.zeros((5, 4), dtype=np.float32)
+    points[:, 0] = np.arange(5)
+    points[:, 3] = np.arange(5) * 10 + 5
+    points[2, 1] = np.nan
+    return points
+
+
+def to_array(fusion_points):
+    return np.ascontiguousarray(fusion_points).view(np.float32).reshape(-1, 4)
+
+
+def test_transform_keeps_intensity(points):
+    result = to_array(
+        fusion_lidar_points(
+            {"lidar-top": build_point_cloud_msg(points)},
+            build_calib_registry(),
+            lidar_fusion_flag=True,
+        )
+    )
+    valid_points = points[[0, 1, 3, 4]]
+    assert np.allclose(result[:, :3], valid_points[:, :3] + [1, 2, 3])
+    assert np.array_equal(result[:, 3], valid_points[:, 3])
+
+
+def test_no_transform_sets_intensity_to_one(points):
+    result = to_array(
+        fusion_lidar_points(
+            {"lidar-top": build_point_cloud_msg(points)},
+            build_calib_registry(),
+            lidar_fusion_flag=False,
+            channel_name="lidar-top",
+            transform_lidar_flag=False,
+        )
+    )
+    # 与原有实现一致, 不变换点云时 intensity 为 1
+    valid_points = points[[0, 1, 3, 4]]
+    assert np.array_equal(result[:, :3], valid_points[:, :3])
+    assert np.array_equal(result[:, 3], np.ones(4, dtype=np.float32))
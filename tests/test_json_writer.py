@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from roscenes.common.json_writer import JsonTableWriter, save_json_table
+
+TABLE_LIST = [
+    [],
+    [{}],
+    [{"token": "a", "timestamp": 1, "is_key_frame": True}],
+    [
+        {
+            "token": "a",
+            "description": "雨天, night",
+            "translation": [0.1, -2.5, 1e-07],
+            "rotation": [[1.0, 0.0], [0.0, 1.0]],
+            "attribute_tokens": [],
+            "next": "",
+            "prev": None,
+        },
+        {"token": "b", "nested": {"empty": {}, "list": [1, [2, 3]]}},
+    ],
+]
+
+
+def dump_by_json(data, file_path, indent, ensure_ascii):
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=ensure_ascii)
+
+
+def read_bytes(file_path):
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("table", TABLE_LIST)
+@pytest.mark.parametrize("indent", [0, 2, 4])
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+def test_indent_output_equals_json_dump(tmp_path, table, indent, ensure_ascii):
+    expected_path = str(tmp_path / "expected.json")
+    output_path = str(tmp_path / "output.json")
+    dump_by_json(table, expected_path, indent, ensure_ascii)
+
+    with JsonTableWriter(output_path, indent=indent, ensure_ascii=ensure_ascii) as writer:
+        writer.write_all(iter(table))
+
+    assert read_bytes(output_path) == read_bytes(expected_path)
+
+
+@pytest.mark.parametrize("table", TABLE_LIST)
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+def test_compact_output_is_same_table(tmp_path, table, ensure_ascii):
+    output_path = str(tmp_path / "output.json")
+    save_json_table(table, output_path, indent=None, ensure_ascii=ensure_ascii)
+
+    data = read_bytes(output_path)
+    assert json.loads(data.decode("utf-8")) == table
+    assert b"\n" not in data
+    if ensure_ascii:
+        data.decode("ascii")
+
+
+def test_invalid_options(tmp_path):
+    with pytest.raises(ValueError):
+        JsonTableWriter(str(tmp_path / "output.json"), backend="ujson")
+    with pytest.raises(ValueError):
+        JsonTableWriter(str(tmp_path / "output.json"), indent=-1)
+
+
+@pytest.mark.parametrize("indent, ensure_ascii", [(4, False), (None, True)])
+def test_orjson_fallback_warns(tmp_path, capsys, indent, ensure_ascii):
+    output_path = str(tmp_path / "output.json")
+    expected_path = str(tmp_path / "expected.json")
+    table = TABLE_LIST[-1]
+    save_json_table(
+        table, output_path, indent=indent, backend="orjson", ensure_ascii=ensure_ascii
+    )
+    save_json_table(
+        table, expected_path, indent=indent, backend="json", ensure_ascii=ensure_ascii
+    )
+
+    assert "fall back to json backend" in capsys.readouterr().out
+    assert read_bytes(output_path) == read_bytes(expected_path)
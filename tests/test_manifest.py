@@ -0,0 +1,194 @@
+import copy
+import os
+from functools import partial
+
+import pytest
+
+from roscenes.nuscenes.manifest import PendingFrame, SliceManifest
+
+CHANNEL_LIST = ["lidar-fusion", "camera-front"]
+TIMESTAMP_LIST = [1000000, 1100000, 1200000, 1300000]
+
+
+def write_frame(manifest, timestamp, content=b"frame"):
+    """与切片时一致: 一帧的每个文件由写入任务完成, 全部完成后才在清单中提交该帧"""
+    record_list = [
+        {
+            "channel": channel,
+            "timestamp": timestamp,
+            "is_key_frame": True,
+            "path": os.path.join("samples", channel, f"{timestamp}.bin"),
+        }
+        for channel in CHANNEL_LIST
+    ]
+    pending_frame = PendingFrame(
+        len(record_list),
+        partial(
+            manifest.commit_frame, timestamp, {"timestamp": timestamp}, record_list
+        ),
+    )
+
+    def write_file(path):
+        file_path = os.path.join(manifest.scene_path, path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(content + str(timestamp).encode("utf-8"))
+
+    for record in record_list:
+        pending_frame.wrap(write_file)(record["path"])
+
+
+def resume_frames(manifest, timestamp_list):
+    """与 slice_bag_to_file 中的续切逻辑一致, 返回重新写入的帧"""
+    redo_list = []
+    for timestamp in timestamp_list:
+        if manifest.get_committed_frame(timestamp) is not None:
+            continue
+        write_frame(manifest, timestamp, content=b"redo")
+        redo_list.append(timestamp)
+    return redo_list
+
+
+def crash_in_last_frame(manifest):
+    """模拟最后一帧的记录写到一半时进程崩溃"""
+    with open(manifest.path, "rb") as f:
+        data = f.read()
+    last_line_start = data.rstrip(b"\n").rfind(b"\n") + 1
+    with open(manifest.path, "wb") as f:
+        f.write(data[: last_line_start + (len(data) - last_line_start) // 2])
+
+
+def test_resume_skips_committed_and_redoes_torn_frame(tmp_path):
+    scene_path = str(tmp_path / "scene")
+    manifest = SliceManifest(scene_path, "checksum")
+    manifest.reset()
+    for timestamp in TIMESTAMP_LIST[:3]:
+        write_frame(manifest, timestamp)
+    crash_in_last_frame(manifest)
+
+    manifest = SliceManifest(scene_path, "checksum")
+    manifest.load()
+    assert manifest.is_valid()
+    assert not manifest.is_complete()
+    assert sorted(manifest.frame_record_dict) == TIMESTAMP_LIST[:2]
+
+    manifest.discard_torn_record()
+    assert resume_frames(manifest, TIMESTAMP_LIST) == TIMESTAMP_LIST[2:]
+    manifest.mark_complete()
+
+    # 已经提交的帧没有被重新写入, 被截断的帧重新写入后可以被再次读取
+    content_list = [b"frame", b"frame", b"redo", b"redo"]
+    for timestamp, content in zip(TIMESTAMP_LIST, content_list):
+        file_path = os.path.join(
+            scene_path, "samples", "lidar-fusion", f"{timestamp}.bin"
+        )
+        with open(file_path, "rb") as f:
+            assert f.read().startswith(content)
+
+    manifest = SliceManifest(scene_path, "checksum")
+    manifest.load()
+    assert manifest.is_complete()
+    assert sorted(manifest.frame_record_dict) == TIMESTAMP_LIST
+    assert resume_frames(manifest, TIMESTAMP_LIST) == []
+
+
+def test_changed_file_is_not_committed(tmp_path):
+    scene_path = str(tmp_path / "scene")
+    manifest = SliceManifest(scene_path, "checksum")
+    manifest.reset()
+    for timestamp in TIMESTAMP_LIST[:2]:
+        write_frame(manifest, timestamp)
+    samples_path = os.path.join(scene_path, "samples")
+    os.remove(os.path.join(samples_path, "camera-front", f"{TIMESTAMP_LIST[0]}.bin"))
+    with open(
+        os.path.join(samples_path, "lidar-fusion", f"{TIMESTAMP_LIST[1]}.bin"), "ab"
+    ) as f:
+        f.write(b"torn")
+
+    manifest.load()
+    assert manifest.get_committed_frame(TIMESTAMP_LIST[0]) is None
+    assert manifest.get_committed_frame(TIMESTAMP_LIST[1]) is None
+
+
+def test_changed_checksum_is_invalid(tmp_path):
+    scene_path = str(tmp_path / "scene")
+    manifest = SliceManifest(scene_path, "checksum")
+    manifest.reset()
+    write_frame(manifest, TIMESTAMP_LIST[0])
+    manifest.mark_complete()
+
+    manifest = SliceManifest(scene_path, "other checksum")
+    manifest.load()
+    assert not manifest.is_valid()
+    assert not manifest.is_complete()
+
+
+@pytest.fixture
+def nuscenes_info_factory(tmp_path):
+    """不读取 bag, 只构建 store_init 需要的属性"""
+    pytest.importorskip("rosbag")
+    from roscenes.common.data_config import DataConfig
+    from roscenes.nuscenes.nuscenes_info import NuscenesInfo
+
+    scene_bag_file = str(tmp_path / "scene.bag")
+    with open(scene_bag_file, "wb") as f:
+        f.write(b"bag")
+
+    def build(**config):
+        data_config = copy.copy(DataConfig())
+        data_config.resume_flag = True
+        for key, value in config.items():
+            setattr(data_config, key, value)
+
+        nuscenes_info = NuscenesInfo.__new__(NuscenesInfo)
+        nuscenes_info.data_config = data_config
+        nuscenes_info.scene_name = "scene"
+        nuscenes_info.scene_bag_file = scene_bag_file
+        nuscenes_info.nuscenes_folder_path = str(tmp_path / "scene")
+        nuscenes_info.start_time = None
+        nuscenes_info.end_time = None
+        nuscenes_info.slice_manifest = None
+        return nuscenes_info
+
+    return build
+
+
+def test_store_init_resume(nuscenes_info_factory):
+    nuscenes_info = nuscenes_info_factory(sample_interval=5)
+    assert nuscenes_info.store_init()
+    for timestamp in TIMESTAMP_LIST[:3]:
+        write_frame(nuscenes_info.slice_manifest, timestamp)
+    crash_in_last_frame(nuscenes_info.slice_manifest)
+
+    # 配置不变, 保留已有的文件, 只重新写入没有提交的帧
+    nuscenes_info = nuscenes_info_factory(sample_interval=5)
+    assert nuscenes_info.store_init()
+    manifest = nuscenes_info.slice_manifest
+    assert resume_frames(manifest, TIMESTAMP_LIST) == TIMESTAMP_LIST[2:]
+    manifest.mark_complete()
+
+    nuscenes_info = nuscenes_info_factory(sample_interval=5)
+    assert not nuscenes_info.store_init()
+
+
+def test_store_init_restarts_on_config_change(nuscenes_info_factory):
+    nuscenes_info = nuscenes_info_factory(sample_interval=5)
+    assert nuscenes_info.store_init()
+    for timestamp in TIMESTAMP_LIST:
+        write_frame(nuscenes_info.slice_manifest, timestamp)
+    nuscenes_info.slice_manifest.mark_complete()
+    old_checksum = nuscenes_info.get_config_checksum()
+
+    # 影响切片结果的配置变化后校验值变化, 清空场景重新切片
+    nuscenes_info = nuscenes_info_factory(sample_interval=10)
+    assert nuscenes_info.get_config_checksum() != old_checksum
+    assert nuscenes_info.store_init()
+    assert not os.path.exists(
+        os.path.join(nuscenes_info.nuscenes_folder_path, "samples", "lidar-fusion")
+    )
+    assert resume_frames(nuscenes_info.slice_manifest, TIMESTAMP_LIST) == TIMESTAMP_LIST
+    nuscenes_info.slice_manifest.mark_complete()
+
+    # 运行时参数不影响校验值
+    nuscenes_info = nuscenes_info_factory(sample_interval=10, writer_worker_num=1)
+    assert not nuscenes_info.store_init()
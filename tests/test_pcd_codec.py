@@ -0,0 +1,74 @@
+import sys
+
+import numpy as np
+import pytest
+
+from roscenes.common.pcd_codec import load_bin, load_point_cloud, save_pcd
+from roscenes.common.utils import get_points_num
+
+
+def build_points(point_num=100):
+    data = np.zeros((point_num, 5), dtype=np.float32)
+    data[:, 0] = np.linspace(-5, 5, point_num)
+    data[:, 1] = np.linspace(-1, 1, point_num)
+    data[:, 3] = np.arange(point_num)
+    return data
+
+
+@pytest.mark.parametrize("dims", [3, 4, 5])
+def test_load_bin(tmp_path, dims):
+    data = build_points()[:, :dims]
+    file_path = str(tmp_path / "lidar.pcd.bin")
+    np.ascontiguousarray(data).tofile(file_path)
+
+    pc = load_bin(file_path, dims)
+    assert list(pc.pc_data.dtype.names) == ["x", "y", "z", "intensity"][: min(dims, 4)]
+    for i, name in enumerate(pc.pc_data.dtype.names):
+        assert np.array_equal(pc.pc_data[name], data[:, i])
+
+
+def test_load_bin_wrong_dims(tmp_path):
+    file_path = str(tmp_path / "lidar.pcd.bin")
+    build_points(3)[:, :4].tofile(file_path)
+    with pytest.raises(ValueError):
+        load_bin(file_path, 5)
+
+
+@pytest.mark.parametrize(
+    "filename, compression",
+    [
+        ("lidar.pcd", "binary"),
+        ("lidar.pcd", "binary_compressed"),
+        ("lidar.pcd.zst", "zstd"),
+        ("lidar.pcd.bin", None),
+    ],
+)
+def test_get_points_num_for_every_lidar_format(tmp_path, filename, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    data = np.ascontiguousarray(build_points()[:, :4])
+    file_path = str(tmp_path / filename)
+    if compression is None:
+        data.tofile(file_path)
+    else:
+        bin_path = str(tmp_path / "source.pcd.bin")
+        data.tofile(bin_path)
+        save_pcd(load_bin(bin_path), file_path, compression)
+
+    pc = load_point_cloud(file_path)
+    assert np.array_equal(pc.to_array().reshape(-1, 4), data)
+    # x 在 [-1, 1] 内的点
+    expected = int(np.count_nonzero(np.abs(data[:, 0]) <= 1))
+    assert get_points_num(file_path, [2, 4, 2], [0, 0, 0], [1, 0, 0, 0]) == expected
+
+
+def test_data_config_requires_zstandard_for_zstd(monkeypatch):
+    from roscenes.common.data_config import DataConfig
+
+    # DataConfig 是单例, 直接调用 __init__ 检查参数校验
+    data_config = DataConfig.__new__(DataConfig)
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+    with pytest.raises(ImportError):
+        data_config.__init__(pcd_compression="zstd")
+    # 不保存为 pcd 时不需要 zstandard
+    data_config.__init__(lidar_file_format="bin", pcd_compression="zstd")
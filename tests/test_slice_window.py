@@ -0,0 +1,229 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+rosbag = pytest.importorskip("rosbag")
+genpy = pytest.importorskip("genpy")
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("sensor_msgs")
+pytest.importorskip("geometry_msgs")
+
+from geometry_msgs.msg import PoseStamped, TransformStamped  # noqa: E402
+from sensor_msgs.msg import CompressedImage, PointCloud2, PointField  # noqa: E402
+
+from roscenes.common.data_config import DataConfig  # noqa: E402
+from roscenes.nuscenes.nuscenes_info import NuscenesInfo  # noqa: E402
+
+START_SECS = 1700000000
+FRAME_NUM = 20
+FRAME_INTERVAL_NS = 100000000
+SCENE_NAME = "0001-0_YC200A01-N1-0001"
+LIDAR_TOPIC = "/lidar_points/top"
+CAMERA_TOPIC = "/cam_front_fisheye/compressed"
+SILENT_CAMERA_TOPIC = "/cam_back_fisheye/compressed"
+
+
+def to_ros_time(timestamp_ns):
+    return genpy.Time(0, timestamp_ns)
+
+
+def build_point_cloud(stamp, point_num=100):
+    points = np.zeros(
+        point_num,
+        dtype=[("x", "f4"), ("y", "f4"), ("z", "f4"), ("intensity", "f4")],
+    )
+    points["x"] = np.linspace(1, 10, point_num)
+    points["intensity"] = 1
+    msg = PointCloud2(
+        height=1,
+        width=point_num,
+        point_step=points.dtype.itemsize,
+        row_step=points.nbytes,
+        data=points.tobytes(),
+        is_dense=True,
+    )
+    msg.fields = [
+        PointField("x", 0, PointField.FLOAT32, 1),
+        PointField("y", 4, PointField.FLOAT32, 1),
+        PointField("z", 8, PointField.FLOAT32, 1),
+        PointField("intensity", 12, PointField.FLOAT32, 1),
+    ]
+    msg.header.stamp = stamp
+    return msg
+
+
+def build_image(stamp):
+    _, jpeg = cv2.imencode(".jpg", np.zeros((36, 64, 3), np.uint8))
+    msg = CompressedImage()
+    msg.format = "jpeg"
+    msg.data = jpeg.tobytes()
+    msg.header.stamp = stamp
+    return msg
+
+
+def write_bag(bag_path, silent_camera_frame_num):
+    """写入一个 FRAME_NUM 帧的 bag
+
+    SILENT_CAMERA_TOPIC 只在前 silent_camera_frame_num 帧有消息, 之后一直没有消息
+    """
+    start_ns = START_SECS * 10**9
+    bag = rosbag.Bag(bag_path, "w")
+    try:
+        transform = TransformStamped()
+        transform.child_frame_id = LIDAR_TOPIC
+        transform.transform.rotation.w = 1.0
+        bag.write("/tf_static", transform, to_ros_time(start_ns))
+        for frame_index in range(FRAME_NUM):
+            frame_ns = start_ns + (frame_index + 1) * FRAME_INTERVAL_NS
+            stamp = to_ros_time(frame_ns)
+            bag.write(LIDAR_TOPIC, build_point_cloud(stamp), stamp)
+            camera_stamp = to_ros_time(frame_ns + 5000000)
+            bag.write(CAMERA_TOPIC, build_image(camera_stamp), camera_stamp)
+            if frame_index < silent_camera_frame_num:
+                bag.write(
+                    SILENT_CAMERA_TOPIC, build_image(camera_stamp), camera_stamp
+                )
+        for pose_index in range(FRAME_NUM * 5 + 5):
+            pose_stamp = to_ros_time(start_ns + pose_index * FRAME_INTERVAL_NS // 5)
+            pose = PoseStamped()
+            pose.pose.position.x = pose_index * 0.1
+            pose.pose.orientation.w = 1.0
+            bag.write("/localization_result", pose, pose_stamp)
+    finally:
+        bag.close()
+
+
+def get_frame_us(frame_index):
+    return START_SECS * 10**6 + (frame_index + 1) * FRAME_INTERVAL_NS // 1000
+
+
+def load_sample_data(nuscenes_folder_path):
+    sample_data_path = os.path.join(
+        nuscenes_folder_path, "v1.0-all", "sample_data.json"
+    )
+    with open(sample_data_path, "r") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def data_config():
+    data_config = DataConfig()
+    saved = dict(vars(data_config))
+    data_config.sample_interval = 5
+    data_config.save_sweep_data_flag = True
+    data_config.writer_worker_num = 0
+    data_config.resume_flag = False
+    data_config.lidar_topic_channel_dict = {LIDAR_TOPIC: "lidar-top"}
+    data_config.camera_topic_channel_dict = {
+        CAMERA_TOPIC: "cam-front-fisheye",
+        SILENT_CAMERA_TOPIC: "cam-back-fisheye",
+    }
+    yield data_config
+    vars(data_config).clear()
+    vars(data_config).update(saved)
+
+
+def slice_window(data_config, bag_path, nuscenes_folder_path, start_time, end_time):
+    nuscenes_info = NuscenesInfo(
+        data_config,
+        SCENE_NAME,
+        bag_path,
+        nuscenes_folder_path,
+        "suzhou",
+        "2023-11-14",
+        "test",
+        start_time=start_time,
+        end_time=end_time,
+    )
+    nuscenes_info.slice()
+    return load_sample_data(nuscenes_folder_path)
+
+
+def test_camera_silent_in_window_uses_closest_message(tmp_path, data_config):
+    bag_path = str(tmp_path / "scene.bag")
+    write_bag(bag_path, silent_camera_frame_num=5)
+
+    # 窗口内 cam-back 没有消息, 与不指定窗口时一致, 匹配整个 bag 中最近的消息
+    sample_data_list = slice_window(
+        data_config,
+        bag_path,
+        str(tmp_path / "window"),
+        get_frame_us(10),
+        get_frame_us(19),
+    )
+    full_sample_data_list = slice_window(
+        data_config, bag_path, str(tmp_path / "full"), None, None
+    )
+
+    # 窗口内的每一帧与不指定窗口时的输出一致, 使用的是 bag 中真实的图片而不是注入的默认图片
+    full_sample_data_dict = {
+        sample_data["filename"]: sample_data for sample_data in full_sample_data_list
+    }
+    back_sample_data_list = [
+        sample_data
+        for sample_data in sample_data_list
+        if "cam-back-fisheye" in sample_data["filename"]
+    ]
+    assert len(back_sample_data_list) == 10
+    for sample_data in back_sample_data_list:
+        assert (sample_data["width"], sample_data["height"]) == (64, 36)
+        full_sample_data = full_sample_data_dict[sample_data["filename"]]
+        assert (full_sample_data["width"], full_sample_data["height"]) == (64, 36)
+
+
+def test_camera_without_messages_is_injected(tmp_path, data_config):
+    bag_path = str(tmp_path / "scene.bag")
+    write_bag(bag_path, silent_camera_frame_num=0)
+
+    sample_data_list = slice_window(
+        data_config,
+        bag_path,
+        str(tmp_path / "window"),
+        get_frame_us(10),
+        get_frame_us(19),
+    )
+    back_sample_data_list = [
+        sample_data
+        for sample_data in sample_data_list
+        if "cam-back-fisheye" in sample_data["filename"]
+    ]
+    assert len(back_sample_data_list) == 10
+    for sample_data in back_sample_data_list:
+        assert (sample_data["width"], sample_data["height"]) == (1280, 720)
+
+
+def test_camera_silent_in_one_shard(tmp_path, data_config):
+    from roscenes.slice.slice import Slice
+
+    bag_path = str(tmp_path / "scene.bag")
+    # cam-back 只在前 5 帧有消息, 第二个分片的时间范围内没有 cam-back 的消息
+    write_bag(bag_path, silent_camera_frame_num=5)
+
+    def slice_with_shards(output_path, shard_num):
+        data_info = {
+            "scene_name": SCENE_NAME,
+            "rosbag_file_path": bag_path,
+            "nuscenes_folder_path": output_path,
+        }
+        Slice(data_config, [data_info], max_workers=2, shard_num=shard_num).slice()
+        return load_sample_data(output_path)
+
+    sample_data_list = slice_with_shards(str(tmp_path / "shards"), 2)
+    full_sample_data_list = slice_with_shards(str(tmp_path / "full"), 1)
+
+    def get_sample_data_dict(sample_data_list):
+        return {
+            sample_data["filename"]: (sample_data["width"], sample_data["height"])
+            for sample_data in sample_data_list
+        }
+
+    sample_data_dict = get_sample_data_dict(sample_data_list)
+    assert sample_data_dict == get_sample_data_dict(full_sample_data_list)
+    back_size_set = {
+        size
+        for filename, size in sample_data_dict.items()
+        if "cam-back-fisheye" in filename
+    }
+    assert back_size_set == {(64, 36)}
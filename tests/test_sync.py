@@ -0,0 +1,132 @@
+import bisect
+import random
+
+import numpy as np
+import pytest
+
+from roscenes.nuscenes.sync import FrameSynchronizer
+
+
+def closest_timestamp(target_time, timestamps):
+    """原有的逐帧实现 (nuscenes/utils.closest_timestamp), 作为对比的基准"""
+    idx = bisect.bisect_left(timestamps, target_time)
+    if idx == 0:
+        return timestamps[0]
+    if idx == len(timestamps):
+        return timestamps[-1]
+    before = timestamps[idx - 1]
+    after = timestamps[idx]
+    if after - target_time < target_time - before:
+        return after
+    else:
+        return before
+
+
+def sync_frames(
+    main_timestamps,
+    timestamp_list_by_topic,
+    time_diff_threshold_us,
+    optional_topic_list,
+):
+    """原有 slice_bag_to_file 中的逐帧同步, 返回 [(timestamp, closest_time_dict)]"""
+    frame_list = []
+    for timestamp in main_timestamps:
+        all_topics_found = True
+        closest_time_dict = {}
+        for topic, timestamps in timestamp_list_by_topic.items():
+            if not timestamps:
+                if topic in optional_topic_list:
+                    continue
+                all_topics_found = False
+                break
+            closest_time = closest_timestamp(timestamp, timestamps)
+            if abs(closest_time - timestamp) > time_diff_threshold_us:
+                if topic in optional_topic_list:
+                    closest_time_dict[topic] = closest_time
+                    continue
+                all_topics_found = False
+                break
+            closest_time_dict[topic] = closest_time
+        if all_topics_found:
+            frame_list.append((timestamp, closest_time_dict))
+    return frame_list
+
+
+def random_timestamps(rng, num, start=1700000000000000, max_step=100000):
+    timestamp_set = set()
+    timestamp = start
+    while len(timestamp_set) < num:
+        timestamp += rng.randint(1, max_step)
+        timestamp_set.add(timestamp)
+    return sorted(timestamp_set)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_closest_timestamps_matches_bisect(seed):
+    rng = random.Random(seed)
+    timestamps = random_timestamps(rng, rng.randint(1, 50))
+    first, last = timestamps[0], timestamps[-1]
+
+    target_list = [rng.randint(first - 500000, last + 500000) for _ in range(200)]
+    # 第一个元素之前, 最后一个元素之后, 与元素相等
+    target_list += [first - 1, first - 1000000, first, last, last + 1, last + 1000000]
+    target_list += timestamps
+    # 与前后两个元素距离相同
+    for before, after in zip(timestamps[:-1], timestamps[1:]):
+        if (after - before) % 2 == 0:
+            target_list.append((before + after) // 2)
+
+    result = FrameSynchronizer.closest_timestamps(
+        np.asarray(target_list, dtype=np.int64), np.asarray(timestamps, dtype=np.int64)
+    )
+    assert result.tolist() == [closest_timestamp(t, timestamps) for t in target_list]
+
+
+def test_closest_timestamps_tie_takes_earlier():
+    timestamps = np.asarray([100, 200, 300], dtype=np.int64)
+    target = np.asarray([150, 250, 50, 350], dtype=np.int64)
+    result = FrameSynchronizer.closest_timestamps(target, timestamps)
+    assert result.tolist() == [100, 200, 100, 300]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_match_matches_frame_loop(seed):
+    rng = random.Random(seed)
+    main_timestamps = random_timestamps(rng, 40, max_step=100000)
+    timestamp_list_by_topic = {
+        "/lidar": main_timestamps,
+        "/pose": random_timestamps(rng, 400, max_step=10000),
+        "/camera_front": random_timestamps(rng, 60, max_step=80000),
+        "/camera_back": random_timestamps(rng, rng.choice([0, 30]), max_step=150000),
+    }
+    # 随机丢掉一段 pose, 使部分帧超过阈值
+    pose_list = timestamp_list_by_topic["/pose"]
+    drop_start = rng.randint(0, len(pose_list) - 50)
+    timestamp_list_by_topic["/pose"] = (
+        pose_list[:drop_start] + pose_list[drop_start + 50 :]
+    )
+    optional_topic_list = ["/camera_front", "/camera_back"]
+    time_diff_threshold_us = rng.choice([5000, 20000, 50000])
+
+    synchronizer = FrameSynchronizer(
+        timestamp_list_by_topic, time_diff_threshold_us, optional_topic_list
+    )
+    frame_list = list(synchronizer.match(main_timestamps).iter_frames())
+
+    assert frame_list == sync_frames(
+        main_timestamps,
+        timestamp_list_by_topic,
+        time_diff_threshold_us,
+        optional_topic_list,
+    )
+
+
+def test_missing_required_topic_drops_all_frames():
+    synchronizer = FrameSynchronizer(
+        {"/lidar": [100, 200], "/pose": [], "/camera_front": []},
+        10,
+        optional_topic_list=["/camera_front"],
+    )
+    result = synchronizer.match([100, 200])
+    assert len(result) == 0
+    assert synchronizer.drop_stats["/pose"]["missing"] == 2
@@ -0,0 +1,47 @@
+import threading
+import time
+
+import pytest
+
+from roscenes.nuscenes.writer import AsyncWriter
+
+
+def fail(message):
+    raise ValueError(message)
+
+
+def wait_for_error(writer):
+    while not writer.error_list:
+        time.sleep(0.01)
+
+
+def test_close_raises_worker_error():
+    writer = AsyncWriter(worker_num=2)
+    writer.submit("lidar", fail, "disk full")
+    with pytest.raises(RuntimeError) as exc_info:
+        writer.close()
+    assert isinstance(exc_info.value.__cause__, ValueError)
+
+
+def test_exit_keeps_propagating_exception(capsys):
+    done = threading.Event()
+    with pytest.raises(KeyError):
+        with AsyncWriter(worker_num=2) as writer:
+            writer.submit("lidar", fail, "disk full")
+            writer.submit("camera", done.set)
+            raise KeyError("frame loop failed")
+
+    # 原有的异常没有被写入线程的错误覆盖, 已提交的任务仍然执行完成
+    assert done.is_set()
+    assert "writer failed : disk full" in capsys.readouterr().out
+
+
+def test_exit_does_not_repeat_chained_worker_error(capsys):
+    with pytest.raises(RuntimeError) as exc_info:
+        with AsyncWriter(worker_num=2) as writer:
+            writer.submit("lidar", fail, "disk full")
+            wait_for_error(writer)
+            # 写入线程出错后, submit 抛出的异常以写入线程的错误为原因
+            writer.submit("camera", print, "unreachable")
+    assert isinstance(exc_info.value.__cause__, ValueError)
+    assert capsys.readouterr().out == ""